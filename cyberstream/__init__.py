@@ -0,0 +1,71 @@
+"""Cœur réutilisable de CYBER-STREAM Terminal (recherche, infos, téléchargement)"""
+
+from .core import (
+    FORMAT_MP4,
+    FORMAT_MP3,
+    FORMAT_LABELS,
+    MIME_TYPES,
+    CyberStreamError,
+    SearchError,
+    NotFoundError,
+    DownloadError,
+    DownloadCancelled,
+    DownloadTimeout,
+    DependencyError,
+    DEFAULT_DOWNLOAD_DEADLINE,
+    search_youtube,
+    get_video_info,
+    get_stream_url,
+    stream_selector,
+    iter_video_info,
+    get_video_formats,
+    resolve_format_selector,
+    download_media,
+)
+from .bulk import BulkPlan, BulkStats, plan_bulk_import, fetch_bulk
+from .cache import SearchCache, get_search_cache, search_cache_key
+from .extractors import (
+    Extractor,
+    YtDlpExtractor,
+    PytubefixExtractor,
+    ExtractorRouter,
+    get_extractor_router,
+    reset_extractor_router,
+)
+from .formats import (
+    POLICY_BEST,
+    POLICY_MAX_HEIGHT,
+    POLICY_MAX_SIZE,
+    MediaFormat,
+    FormatChoice,
+    build_choices,
+    select_format,
+    format_size,
+)
+from .history import HistoryStore, get_history_store, STATUS_DONE, STATUS_ERROR, STATUS_CANCELLED
+from .jobs import Job, JobManager, JOB_QUEUED, JOB_RUNNING, JOB_DONE, JOB_ERROR, JOB_CANCELLED
+from .shared import ArtifactStore, SQLiteBackend, RedisBackend, create_backend, get_shared_backend
+from .stream import stream_media
+from .store import VideoRecord, VideoStore, get_video_store
+from .system import (
+    get_system_info,
+    get_ffmpeg_path,
+    check_yt_dlp,
+    popen_process_group,
+    kill_process_tree,
+    get_cache_dir,
+    get_cache_status,
+    start_cache_warmup,
+    warm_up_cache,
+)
+from .utils import (
+    validate_youtube_url,
+    get_video_id,
+    extract_video_ids,
+    clean_youtube_url,
+    format_duration,
+    format_views,
+    parse_timestamp,
+    parse_section,
+    safe_search_query,
+)
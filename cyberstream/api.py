@@ -0,0 +1,344 @@
+import os
+import json
+import shutil
+import socket
+import struct
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, quote
+
+from .core import (
+    get_video_info, get_video_formats, resolve_format_selector,
+    CyberStreamError, NotFoundError, MIME_TYPES, FORMAT_MP3,
+)
+from .cache import get_search_cache
+from .extractors import get_extractor_router
+from .formats import select_format, is_valid_selector, POLICY_BEST, POLICY_MAX_HEIGHT, POLICY_MAX_SIZE
+from .history import get_history_store
+from .jobs import JobManager, JOB_DONE, DEFAULT_RETENTION
+from .shared import get_shared_backend
+from .store import get_video_store
+from .stream import stream_media
+from .system import get_cache_status, start_cache_warmup
+from .utils import validate_youtube_url, get_video_id, parse_section, safe_search_query
+
+# --- API HTTP JSON ---
+#
+#   GET  /status                         État du cache yt-dlp, de l'amorçage, des extracteurs
+#                                        et du cache de recherche
+#   GET  /search?q=<requête>&limit=<n>   Recherche YouTube
+#   GET  /info?url=<url>                 Métadonnées d'une vidéo
+#   GET  /formats?url=<url>&format=mp4&max_height=720&max_size_mb=50
+#                                        Formats, tailles estimées et choix retenu
+#   POST /jobs  {"url": ..., "format": "mp4"|"mp3", "start": "1:30", "end": "2:00",
+#                "max_height": 720, "max_size_mb": 50, "format_selector": "136+140",
+#                "deadline": 600}
+#   POST /jobs/<id>/cancel               Annule une tâche (processus tués, fichiers supprimés)
+#   GET  /stream?url=<url>&format=mp3&max_height=&start=&end=
+#                                        Flux direct yt-dlp -> FFmpeg -> client, sans disque
+#   GET  /jobs/<id>                      État d'une tâche
+#   GET  /history?limit=&before=&status=&format=&title=
+#   GET  /history/stats                  Débits p50/p95 par jour
+#   GET  /jobs/<id>/artifact             Fichier produit par la tâche
+
+def _optional_number(value):
+    """Convertit un paramètre numérique optionnel (None si absent)"""
+    if value in (None, ''):
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Nombre invalide: {value}")
+    if number <= 0:
+        raise ValueError(f"Nombre invalide: {value}")
+    return number
+
+class ApiHandler(BaseHTTPRequestHandler):
+    """Routeur minimal pour l'API JSON"""
+    server_version = "CyberStream/2.1"
+
+    @property
+    def jobs(self):
+        return self.server.jobs
+
+    def send_response(self, code, message=None):
+        self._responded = True
+        super().send_response(code, message)
+
+    def _guarded(self, route):
+        """Toute erreur inattendue devient une erreur JSON 500, si rien n'a encore été envoyé"""
+        self._responded = False
+        try:
+            route()
+        except Exception as e:
+            self.log_error("Erreur inattendue sur %s: %r", self.path, e)
+            if self._responded:
+                # Réponse déjà commencée : seule la fermeture reste possible
+                self.close_connection = True
+                return
+            self._send_error(500, f"Erreur interne: {e}")
+
+    def do_GET(self):
+        self._guarded(self._route_get)
+
+    def do_POST(self):
+        self._guarded(self._route_post)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status, message):
+        self._send_json(status, {'error': message})
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length))
+
+    def _route_get(self):
+        parsed = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+        parts = [part for part in parsed.path.split('/') if part]
+
+        try:
+            if parts == ['status']:
+                return self._send_json(200, {'cache': get_cache_status(),
+                                             'extractors': get_extractor_router().status(),
+                                             'search_cache': get_search_cache().stats()})
+            if parts == ['search']:
+                return self._handle_search(params)
+            if parts == ['info']:
+                return self._handle_info(params)
+            if parts == ['formats']:
+                return self._handle_formats(params)
+            if parts == ['stream']:
+                return self._handle_stream(params)
+            if parts == ['history']:
+                return self._handle_history(params)
+            if parts == ['history', 'stats']:
+                return self._send_json(200, get_history_store().throughput_percentiles())
+            if len(parts) == 2 and parts[0] == 'jobs':
+                return self._handle_job_status(parts[1])
+            if len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'artifact':
+                return self._handle_artifact(parts[1])
+        except CyberStreamError as e:
+            return self._send_error(502, str(e))
+        self._send_error(404, "Route inconnue")
+
+    def _route_post(self):
+        parts = [part for part in urlparse(self.path).path.split('/') if part]
+        if len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'cancel':
+            return self._handle_cancel(parts[1])
+        if parts != ['jobs']:
+            return self._send_error(404, "Route inconnue")
+        try:
+            payload = self._read_json()
+        except ValueError:
+            return self._send_error(400, "JSON invalide")
+        if not isinstance(payload, dict):
+            return self._send_error(400, "Objet JSON attendu")
+
+        url = payload.get('url')
+        format_key = payload.get('format', 'mp4')
+        if not validate_youtube_url(url):
+            return self._send_error(400, "URL YouTube invalide")
+        if format_key not in MIME_TYPES:
+            return self._send_error(400, f"Format inconnu: {format_key}")
+        try:
+            section = parse_section(payload.get('start'), payload.get('end'))
+            max_height = _optional_number(payload.get('max_height'))
+            max_size_mb = _optional_number(payload.get('max_size_mb'))
+            deadline = _optional_number(payload.get('deadline'))
+        except ValueError as e:
+            return self._send_error(400, str(e))
+
+        format_selector = payload.get('format_selector')
+        if format_selector and not is_valid_selector(format_selector):
+            return self._send_error(400, "Sélecteur de format invalide")
+        if not format_selector:
+            try:
+                format_selector = resolve_format_selector(url, format_key, max_height, max_size_mb)
+            except CyberStreamError as e:
+                return self._send_error(502, str(e))
+
+        job = self.jobs.submit(url, format_key, section=section, format_selector=format_selector,
+                               deadline=deadline)
+        self._send_json(202, job.to_dict())
+
+    def _handle_search(self, params):
+        query = safe_search_query(params.get('q', ''))
+        if not query:
+            return self._send_error(400, "Recherche vide")
+        try:
+            limit = max(1, min(50, int(params.get('limit', 15))))
+        except ValueError:
+            return self._send_error(400, "Paramètre limit invalide")
+        try:
+            records = get_search_cache().get(query, limit=limit)
+        except NotFoundError:
+            return self._send_json(200, {'results': []})
+        get_video_store().put_many(records)
+        self._send_json(200, {'results': [record.to_dict() for record in records]})
+
+    def _handle_info(self, params):
+        url = params.get('url')
+        if not validate_youtube_url(url):
+            return self._send_error(400, "URL YouTube invalide")
+        record = get_video_info(url)
+        if record is None:
+            return self._send_error(404, "Vidéo introuvable")
+        get_video_store().put(record)
+        self._send_json(200, record.to_dict())
+
+    def _handle_formats(self, params):
+        url = params.get('url')
+        if not validate_youtube_url(url):
+            return self._send_error(400, "URL YouTube invalide")
+        try:
+            max_height = _optional_number(params.get('max_height'))
+            max_size_mb = _optional_number(params.get('max_size_mb'))
+        except ValueError as e:
+            return self._send_error(400, str(e))
+
+        formats = get_video_formats(url)
+        if max_size_mb:
+            policy = POLICY_MAX_SIZE
+        elif max_height:
+            policy = POLICY_MAX_HEIGHT
+        else:
+            policy = POLICY_BEST
+        choice = select_format(
+            formats, policy=policy, max_height=max_height, max_size_mb=max_size_mb,
+            audio_only=(params.get('format') == FORMAT_MP3)
+        )
+        self._send_json(200, {
+            'formats': [media_format.to_dict() for media_format in formats],
+            'choice': choice.to_dict() if choice else None,
+        })
+
+    def _handle_stream(self, params):
+        url = params.get('url')
+        format_key = params.get('format', 'mp4')
+        if not validate_youtube_url(url):
+            return self._send_error(400, "URL YouTube invalide")
+        if format_key not in MIME_TYPES:
+            return self._send_error(400, f"Format inconnu: {format_key}")
+        try:
+            max_height = _optional_number(params.get('max_height'))
+            section = parse_section(params.get('start'), params.get('end'))
+        except ValueError as e:
+            return self._send_error(400, str(e))
+
+        chunks = stream_media(url, format_key, max_height=max_height, section=section)
+        # Le premier morceau est attendu avant l'envoi des en-têtes pour pouvoir
+        # encore répondre par une erreur JSON si yt-dlp ou FFmpeg échoue
+        try:
+            first_chunk = next(chunks)
+        except StopIteration:
+            return self._send_error(502, "Aucune donnée reçue")
+
+        record = get_video_store().get(get_video_id(url))
+        file_name = f"{record.title if record else get_video_id(url)}.{format_key}"
+        self.send_response(200)
+        self.send_header('Content-Type', MIME_TYPES[format_key])
+        self.send_header('Content-Disposition', f"attachment; filename*=UTF-8''{quote(file_name)}")
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        try:
+            self.wfile.write(first_chunk)
+            for chunk in chunks:
+                self.wfile.write(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        except CyberStreamError as e:
+            self.log_error("%s", e)
+            self._abort_connection()
+        finally:
+            chunks.close()
+
+    def _abort_connection(self):
+        """
+        Coupe la connexion par un RST : sans longueur annoncée, une fermeture
+        normale ferait passer un fichier tronqué pour complet
+        """
+        self.close_connection = True
+        try:
+            self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+            self.connection.close()
+        except OSError:
+            pass
+
+    def _handle_history(self, params):
+        try:
+            limit = max(1, min(200, int(params.get('limit', 20))))
+            before = int(params['before']) if params.get('before') else None
+        except ValueError:
+            return self._send_error(400, "Paramètres de pagination invalides")
+        rows = get_history_store().page(
+            limit=limit, before_id=before, status=params.get('status'),
+            format_key=params.get('format'), title=params.get('title')
+        )
+        self._send_json(200, {
+            'entries': rows,
+            'next_before': rows[-1]['id'] if len(rows) == limit else None,
+        })
+
+    def _handle_job_status(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return self._send_error(404, "Tâche inconnue")
+        self._send_json(200, job.to_dict())
+
+    def _handle_cancel(self, job_id):
+        job = self.jobs.cancel(job_id)
+        if job is None:
+            return self._send_error(404, "Tâche inconnue")
+        self._send_json(202, job.to_dict())
+
+    def _handle_artifact(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return self._send_error(404, "Tâche inconnue")
+        if job.status != JOB_DONE:
+            return self._send_error(409, f"Tâche non terminée ({job.status})")
+        if not job.file_path:
+            return self._send_error(410, "Fichier indisponible sur ce réplica")
+
+        with open(job.file_path, 'rb') as f:
+            self.send_response(200)
+            self.send_header('Content-Type', job.mime_type)
+            self.send_header('Content-Length', str(os.fstat(f.fileno()).st_size))
+            self.send_header('Content-Disposition', f'attachment; filename*=UTF-8\'\'{quote(job.file_name)}')
+            self.end_headers()
+            shutil.copyfileobj(f, self.wfile)
+
+class ApiServer(ThreadingHTTPServer):
+    """Serveur HTTP partageant un JobManager entre les requêtes"""
+    daemon_threads = True
+
+    def __init__(self, address, jobs=None):
+        super().__init__(address, ApiHandler)
+        self.jobs = jobs or JobManager()
+
+def serve(host="127.0.0.1", port=8765, workers=2, work_dir=None, retention=DEFAULT_RETENTION):
+    """Démarre l'API jusqu'à interruption (tâches et fichiers expirés après retention secondes)"""
+    # Avec CYBERSTREAM_BACKEND, la file et les fichiers sont partagés entre réplicas
+    jobs = JobManager(workers=workers, work_dir=work_dir, backend=get_shared_backend(),
+                      retention=retention)
+    server = ApiServer((host, port), jobs)
+    # Amorce le cache yt-dlp pendant que le serveur accepte déjà des requêtes
+    start_cache_warmup()
+    print(f"🦾 API CYBER-STREAM sur http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.jobs.shutdown(wait=False)
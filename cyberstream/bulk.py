@@ -0,0 +1,97 @@
+import time
+from contextlib import closing
+
+from .core import iter_video_info
+from .store import get_video_store
+from .utils import extract_video_ids
+
+# --- Import en masse ---
+
+class BulkPlan:
+    """Résultat de l'analyse d'un import : IDs à récupérer et doublons écartés"""
+    __slots__ = ('to_fetch', 'known', 'downloaded', 'duplicates', 'invalid')
+
+    def __init__(self, to_fetch, known, downloaded, duplicates, invalid):
+        self.to_fetch = to_fetch
+        self.known = known
+        self.downloaded = downloaded
+        self.duplicates = duplicates
+        self.invalid = invalid
+
+    @property
+    def video_ids(self):
+        """Tous les IDs valides retenus, dans l'ordre (déjà connus puis à récupérer)"""
+        return self.known + self.to_fetch
+
+    def to_dict(self):
+        return {
+            'to_fetch': len(self.to_fetch),
+            'known': len(self.known),
+            'downloaded': len(self.downloaded),
+            'duplicates': self.duplicates,
+            'invalid': len(self.invalid),
+        }
+
+class BulkStats:
+    """Bilan d'une récupération de métadonnées en masse"""
+    __slots__ = ('requested', 'fetched', 'elapsed')
+
+    def __init__(self, requested, fetched, elapsed):
+        self.requested = requested
+        self.fetched = fetched
+        self.elapsed = elapsed
+
+    @property
+    def failed(self):
+        return self.requested - self.fetched
+
+    @property
+    def items_per_second(self):
+        return self.fetched / self.elapsed if self.elapsed > 0 else 0.0
+
+    def to_dict(self):
+        return {
+            'requested': self.requested,
+            'fetched': self.fetched,
+            'failed': self.failed,
+            'elapsed': round(self.elapsed, 3),
+            'items_per_second': round(self.items_per_second, 2),
+        }
+
+def plan_bulk_import(text, downloaded_ids=(), store=None):
+    """
+    Analyse un texte (liste d'URLs, TXT ou CSV) et répartit les IDs valides :
+    déjà téléchargés (écartés), déjà en cache (aucune requête), ou à récupérer.
+    """
+    store = store or get_video_store()
+    downloaded_ids = set(downloaded_ids)
+    video_ids, duplicates, invalid = extract_video_ids(text)
+
+    to_fetch, known, downloaded = [], [], []
+    for video_id in video_ids:
+        if video_id in downloaded_ids:
+            downloaded.append(video_id)
+        elif store.get(video_id) is not None:
+            known.append(video_id)
+        else:
+            to_fetch.append(video_id)
+    return BulkPlan(to_fetch, known, downloaded, duplicates, invalid)
+
+def fetch_bulk(video_ids, progress=None, store=None, batch_size=25, workers=4):
+    """
+    Récupère les métadonnées des IDs et les place dans le stockage partagé.
+    progress(fetched, requested, items_per_second) est appelé à chaque vidéo.
+    Retourne (ids_récupérés, BulkStats).
+    """
+    store = store or get_video_store()
+    requested = len(video_ids)
+    fetched_ids = []
+    started = time.perf_counter()
+    # Fermé explicitement : si progress lève (rerun Streamlit), les yt-dlp sont tués aussitôt
+    with closing(iter_video_info(video_ids, batch_size=batch_size, workers=workers)) as records:
+        for record in records:
+            fetched_ids.append(store.put(record))
+            if progress:
+                elapsed = time.perf_counter() - started
+                progress(len(fetched_ids), requested, len(fetched_ids) / elapsed if elapsed > 0 else 0.0)
+    return fetched_ids, BulkStats(requested, len(fetched_ids), time.perf_counter() - started)
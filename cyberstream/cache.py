@@ -0,0 +1,185 @@
+import time
+import threading
+from collections import OrderedDict
+
+from .core import search_youtube, SearchError
+from .utils import safe_search_query
+
+# --- Cache des recherches ---
+#
+# Clé : requête normalisée ("Musique", "musique " et "musique!" partagent
+# l'entrée). Une entrée périmée est servie immédiatement pendant qu'un thread
+# la rafraîchit ; seule une entrée trop ancienne bloque l'appelant. Les échecs
+# ne sont gardés que brièvement, et des requêtes identiques simultanées
+# attendent une seule et même recherche.
+
+SEARCH_TTL = 3600
+# Au-delà, l'entrée n'est plus servie et l'appelant attend la nouvelle recherche
+SEARCH_MAX_STALE = 24 * 3600
+FAILURE_TTL = 60
+# Attente maximale d'une recherche partagée avant d'en lancer une directement
+COALESCE_WAIT = 90
+
+def search_cache_key(query, limit=15):
+    """Clé de cache : requête nettoyée, en minuscules, espaces réduits"""
+    return (" ".join(safe_search_query(query).lower().split()), int(limit))
+
+def _copy_error(error):
+    """Nouvelle instance de l'erreur : chaque appelant lève la sienne, sans la pile des autres"""
+    try:
+        return type(error)(*error.args)
+    except Exception:
+        return SearchError(str(error))
+
+class _Entry:
+    """Résultat (ou erreur) d'une recherche et son horodatage"""
+    __slots__ = ('records', 'error', 'stored_at', 'retry_at')
+
+    def __init__(self, records=None, error=None):
+        self.records = records
+        self.error = error
+        self.stored_at = time.monotonic()
+        # Rafraîchissement suivant autorisé (repoussé après un échec)
+        self.retry_at = 0.0
+
+class _Flight:
+    """Recherche en cours, partagée par tous les appelants de la même clé"""
+    __slots__ = ('done', 'records', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.records = None
+        self.error = None
+
+    @property
+    def interrupted(self):
+        """Le meneur a été interrompu (BaseException) : aucun résultat à partager"""
+        return self.error is not None and not isinstance(self.error, Exception)
+
+class SearchCache:
+    """Cache stale-while-revalidate des recherches, borné (LRU)"""
+
+    def __init__(self, fetch=None, ttl=SEARCH_TTL, max_stale=SEARCH_MAX_STALE,
+                 failure_ttl=FAILURE_TTL, max_entries=512, coalesce_wait=COALESCE_WAIT):
+        self.fetch = fetch or search_youtube
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.failure_ttl = failure_ttl
+        self.coalesce_wait = coalesce_wait
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'stale': 0, 'misses': 0, 'coalesced': 0,
+                       'refreshes': 0, 'failures': 0}
+
+    def get(self, query, limit=15, notify=None):
+        """
+        Retourne la liste de VideoRecord de la recherche.
+        Lève SearchError (ou l'erreur mémorisée) si la recherche échoue.
+        """
+        key = search_cache_key(query, limit)
+        if not key[0]:
+            raise SearchError("Recherche vide")
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                age = now - entry.stored_at
+                if entry.error is not None:
+                    if age < self.failure_ttl:
+                        self._stats['hits'] += 1
+                        raise _copy_error(entry.error)
+                elif age < self.ttl:
+                    self._stats['hits'] += 1
+                    return entry.records
+                elif age < self.max_stale:
+                    # Périmée mais utilisable : servie tout de suite, rafraîchie en arrière-plan
+                    self._stats['stale'] += 1
+                    if key not in self._flights and now >= entry.retry_at:
+                        self._flights[key] = _Flight()
+                        self._stats['refreshes'] += 1
+                        threading.Thread(target=self._refresh, args=(key,),
+                                         name="search-refresh", daemon=True).start()
+                    return entry.records
+
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self._stats['misses'] += 1
+            else:
+                self._stats['coalesced'] += 1
+
+        if leader:
+            self._run(key, flight, notify)
+            if flight.error is not None:
+                raise flight.error
+            return flight.records
+        if not flight.done.wait(self.coalesce_wait) or flight.interrupted:
+            # Meneur bloqué ou interrompu (rerun Streamlit, Ctrl+C) : recherche directe
+            return self.fetch(key[0], limit=key[1], notify=notify)
+        if flight.error is not None:
+            raise _copy_error(flight.error)
+        return flight.records
+
+    def _run(self, key, flight, notify=None):
+        """Exécute la recherche et publie son résultat aux appelants en attente"""
+        query, limit = key
+        try:
+            flight.records = self.fetch(query, limit=limit, notify=notify)
+        except Exception as e:
+            flight.error = e
+        except BaseException as e:
+            # Interruption propre à l'appelant : propagée, jamais mise en cache
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if not flight.interrupted:
+                    self._settle(key, flight)
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.done.set()
+
+    def _settle(self, key, flight):
+        """Enregistre le résultat d'une recherche terminée (verrou tenu)"""
+        previous = self._entries.get(key)
+        if flight.error is None:
+            self._store(key, _Entry(records=flight.records))
+            return
+        self._stats['failures'] += 1
+        if previous is not None and previous.error is None:
+            # On garde les anciens résultats et on patiente avant de réessayer
+            previous.retry_at = time.monotonic() + self.failure_ttl
+        else:
+            self._store(key, _Entry(error=_copy_error(flight.error)))
+
+    def _refresh(self, key):
+        with self._lock:
+            flight = self._flights[key]
+        self._run(key, flight)
+
+    def _store(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """Vide le cache (les recherches en cours se terminent normalement)"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Compteurs d'accès et nombre d'entrées"""
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries))
+
+_default_cache = SearchCache()
+
+def get_search_cache():
+    """Cache de recherche unique pour tout le processus"""
+    return _default_cache
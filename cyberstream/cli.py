@@ -0,0 +1,323 @@
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import threading
+
+from .core import (
+    search_youtube, get_video_info, get_video_formats, resolve_format_selector,
+    download_media, CyberStreamError, MIME_TYPES, FORMAT_MP3, DEFAULT_DOWNLOAD_DEADLINE,
+)
+from .bulk import plan_bulk_import, fetch_bulk
+from .formats import select_format, format_size, POLICY_BEST, POLICY_MAX_HEIGHT, POLICY_MAX_SIZE
+from .history import get_history_store
+from .jobs import JobManager
+from .resp import LocalRedisServer
+from .shared import get_shared_backend
+from .store import get_video_store
+from .stream import stream_media
+from .system import warm_up_cache, get_cache_status
+from .utils import validate_youtube_url, parse_section
+
+# --- Interface en ligne de commande ---
+
+def _print_json(payload):
+    print(json.dumps(payload, ensure_ascii=False, indent=2))
+
+def cmd_search(args):
+    records = search_youtube(args.query, limit=args.limit)
+    _print_json([record.to_dict() for record in records])
+    return 0
+
+def cmd_info(args):
+    if not validate_youtube_url(args.url):
+        print("❌ URL YouTube invalide", file=sys.stderr)
+        return 2
+    record = get_video_info(args.url)
+    if record is None:
+        print("❌ Vidéo introuvable", file=sys.stderr)
+        return 1
+    _print_json(record.to_dict())
+    return 0
+
+def cmd_formats(args):
+    if not validate_youtube_url(args.url):
+        print("❌ URL YouTube invalide", file=sys.stderr)
+        return 2
+    formats = get_video_formats(args.url)
+    if not formats:
+        print("❌ Aucun format disponible", file=sys.stderr)
+        return 1
+    for f in formats:
+        resolution = f"{f.height}p" if f.height else "audio"
+        estimate = "~" if f.size_estimated else ""
+        print(f"{f.format_id:>8}  {f.ext:<5} {resolution:>6}  {f.vcodec or '':<14} "
+              f"{f.acodec or '':<12} {int(f.tbr or 0):>6}k  {estimate}{format_size(f.filesize)}")
+
+    if args.max_size_mb:
+        policy = POLICY_MAX_SIZE
+    elif args.max_height:
+        policy = POLICY_MAX_HEIGHT
+    else:
+        policy = POLICY_BEST
+    choice = select_format(formats, policy=policy, max_height=args.max_height,
+                           max_size_mb=args.max_size_mb, audio_only=(args.format == FORMAT_MP3))
+    if choice:
+        print(f"\n👉 {choice.selector} ({choice.label}, {format_size(choice.filesize)})")
+    return 0
+
+def cmd_download(args):
+    if not validate_youtube_url(args.url):
+        print("❌ URL YouTube invalide", file=sys.stderr)
+        return 2
+    try:
+        section = parse_section(args.start, args.end)
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 2
+    os.makedirs(args.output, exist_ok=True)
+    format_selector = resolve_format_selector(
+        args.url, args.format, max_height=args.max_height, max_size_mb=args.max_size_mb
+    )
+
+    def on_progress(value):
+        print(f"\r📥 {value:6.1%}", end='', file=sys.stderr, flush=True)
+
+    file_path, file_name, mime_type = download_media(
+        args.url, args.format, args.output, progress=on_progress,
+        section=section, precise_cuts=args.precise_cuts, format_selector=format_selector,
+        deadline=args.deadline
+    )
+    print(file=sys.stderr)
+    _print_json({'file_path': file_path, 'file_name': file_name, 'mime_type': mime_type})
+    return 0
+
+def cmd_bulk(args):
+    if args.file == '-':
+        text = sys.stdin.read()
+    else:
+        with open(args.file, encoding='utf-8', errors='replace') as f:
+            text = f.read()
+    plan = plan_bulk_import(text)
+    print(f"🔎 {json.dumps(plan.to_dict())}", file=sys.stderr)
+
+    def on_progress(fetched, requested, rate):
+        print(f"\r📦 {fetched}/{requested} ({rate:.1f} vidéos/s)", end='', file=sys.stderr, flush=True)
+
+    fetched_ids, stats = fetch_bulk(plan.to_fetch, progress=on_progress, workers=args.workers)
+    print(file=sys.stderr)
+    for record in get_video_store().get_many(fetched_ids):
+        print(json.dumps(record.to_dict(), ensure_ascii=False))
+    print(f"✅ {json.dumps(stats.to_dict())}", file=sys.stderr)
+    return 0
+
+def cmd_stream(args):
+    if not validate_youtube_url(args.url):
+        print("❌ URL YouTube invalide", file=sys.stderr)
+        return 2
+    try:
+        section = parse_section(args.start, args.end)
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 2
+    output = sys.stdout.buffer
+    try:
+        for chunk in stream_media(args.url, args.format, max_height=args.max_height, section=section):
+            output.write(chunk)
+        output.flush()
+    except BrokenPipeError:
+        pass
+    return 0
+
+def cmd_history(args):
+    history = get_history_store()
+    if args.stats:
+        _print_json(history.throughput_percentiles())
+    else:
+        _print_json(history.page(limit=args.limit, before_id=args.before, status=args.status,
+                                 format_key=args.format, title=args.title))
+    return 0
+
+def cmd_warmup(args):
+    ok = warm_up_cache()
+    _print_json(get_cache_status())
+    return 0 if ok else 1
+
+def cmd_serve(args):
+    from .api import serve
+    serve(host=args.host, port=args.port, workers=args.workers, work_dir=args.work_dir,
+          retention=args.retention)
+    return 0
+
+def cmd_worker(args):
+    backend = get_shared_backend()
+    if backend is None:
+        print("❌ CYBERSTREAM_BACKEND n'est pas défini (ex: sqlite, redis://hôte:6379/0)", file=sys.stderr)
+        return 2
+    jobs = JobManager(workers=args.workers, work_dir=args.work_dir, backend=backend,
+                      retention=args.retention)
+    print(f"🦾 Worker {jobs.replica_id} ({args.workers} téléchargements simultanés)", file=sys.stderr)
+    # Arrêt du conteneur (SIGTERM) traité comme Ctrl+C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        # La purge des tâches expirées tourne dans le JobManager
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Les tâches en cours sont remises en file pour les autres réplicas
+        jobs.shutdown(wait=True)
+    return 0
+
+def cmd_redis_standin(args):
+    server = LocalRedisServer((args.host, args.port))
+    print(f"🧪 Serveur compatible Redis (en mémoire) sur redis://{args.host}:{args.port}/0", file=sys.stderr)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        thread.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        server.server_close()
+    return 0
+
+def _print_load_level(level):
+    latency = level['interaction_latency']
+    rss = level['rss_per_session']
+    processes = level['subprocesses']
+    print(f"👥 {level['sessions']:>3} sessions | {level['reruns_per_second'] or 0:6.2f} relances/s | "
+          f"interactions p50 {latency['p50'] or 0:.2f}s p95 {latency['p95'] or 0:.2f}s p99 {latency['p99'] or 0:.2f}s | "
+          f"RSS/session {format_size(rss) if rss and rss > 0 else 'N/A'} | "
+          f"sous-processus max {processes['peak'] if processes['peak'] is not None else 'N/A'} | "
+          f"erreurs {level['error_count']}", file=sys.stderr)
+
+def cmd_loadtest(args):
+    from .loadtest import run_load_test, FLOW_STEPS
+    try:
+        levels = [int(value) for value in args.sessions.split(',')]
+    except ValueError:
+        print("❌ --sessions attend une liste d'entiers (ex: 1,2,4,8)", file=sys.stderr)
+        return 2
+    flow = tuple(step for step in args.flow.split(',') if step in FLOW_STEPS)
+    report = run_load_test(
+        args.app, levels=levels, query=args.query, distinct_queries=args.distinct_queries,
+        flow=flow, latency=args.latency, slo=args.slo, timeout=args.timeout,
+        progress=_print_load_level
+    )
+    if report['saturation']:
+        print(f"🔥 Saturation à partir de {report['saturation']} sessions simultanées", file=sys.stderr)
+    else:
+        print("✅ Pas de saturation sur les paliers testés", file=sys.stderr)
+    if args.json:
+        _print_json(report)
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cyberstream", description="CYBER-STREAM Terminal (mode headless)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    search = subparsers.add_parser("search", help="Recherche YouTube")
+    search.add_argument("query")
+    search.add_argument("--limit", type=int, default=15)
+    search.set_defaults(func=cmd_search)
+
+    info = subparsers.add_parser("info", help="Métadonnées d'une vidéo")
+    info.add_argument("url")
+    info.set_defaults(func=cmd_info)
+
+    formats = subparsers.add_parser("formats", help="Formats disponibles et tailles estimées")
+    formats.add_argument("url")
+    formats.add_argument("--format", choices=sorted(MIME_TYPES), default="mp4")
+    formats.add_argument("--max-height", type=int, help="Résolution maximale (ex: 720)")
+    formats.add_argument("--max-size-mb", type=float, help="Taille maximale estimée en Mo")
+    formats.set_defaults(func=cmd_formats)
+
+    download = subparsers.add_parser("download", help="Télécharge une vidéo")
+    download.add_argument("url")
+    download.add_argument("--format", choices=sorted(MIME_TYPES), default="mp4")
+    download.add_argument("-o", "--output", default=".")
+    download.add_argument("--start", help="Début de l'extrait (ex: 1:30)")
+    download.add_argument("--end", help="Fin de l'extrait (ex: 2:00)")
+    download.add_argument("--precise-cuts", action="store_true",
+                          help="Ré-encode aux points de coupe pour une découpe exacte")
+    download.add_argument("--max-height", type=int, help="Résolution maximale (ex: 720)")
+    download.add_argument("--max-size-mb", type=float, help="Taille maximale estimée en Mo")
+    download.add_argument("--deadline", type=float, default=DEFAULT_DOWNLOAD_DEADLINE,
+                          help="Délai maximal en secondes (processus tués au-delà)")
+    download.set_defaults(func=cmd_download)
+
+    bulk = subparsers.add_parser("bulk", help="Import en masse d'URLs (TXT/CSV, '-' pour stdin)")
+    bulk.add_argument("file")
+    bulk.add_argument("--workers", type=int, default=4)
+    bulk.set_defaults(func=cmd_bulk)
+
+    stream = subparsers.add_parser("stream", help="Flux direct sur la sortie standard, sans disque")
+    stream.add_argument("url")
+    stream.add_argument("--format", choices=sorted(MIME_TYPES), default="mp4")
+    stream.add_argument("--max-height", type=int, help="Résolution maximale (ex: 720)")
+    stream.add_argument("--start", help="Début de l'extrait (ex: 1:30)")
+    stream.add_argument("--end", help="Fin de l'extrait (ex: 2:00)")
+    stream.set_defaults(func=cmd_stream)
+
+    history = subparsers.add_parser("history", help="Historique persistant des téléchargements")
+    history.add_argument("--limit", type=int, default=20)
+    history.add_argument("--before", type=int, help="Curseur : ID de la dernière entrée de la page précédente")
+    history.add_argument("--status", choices=["done", "error", "cancelled"])
+    history.add_argument("--format", choices=sorted(MIME_TYPES))
+    history.add_argument("--title", help="Filtre sur le titre")
+    history.add_argument("--stats", action="store_true", help="Débits p50/p95 par jour")
+    history.set_defaults(func=cmd_history)
+
+    warmup = subparsers.add_parser("warmup", help="Amorce le cache yt-dlp (JS du lecteur, signatures)")
+    warmup.set_defaults(func=cmd_warmup)
+
+    serve = subparsers.add_parser("serve", help="Démarre l'API HTTP JSON")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--workers", type=int, default=2)
+    serve.add_argument("--work-dir", default=None)
+    serve.add_argument("--retention", type=int, default=3600,
+                       help="Durée de conservation des tâches terminées et de leurs fichiers, en secondes")
+    serve.set_defaults(func=cmd_serve)
+
+    worker = subparsers.add_parser("worker", help="Traite la file partagée (CYBERSTREAM_BACKEND) sans API")
+    worker.add_argument("--workers", type=int, default=2)
+    worker.add_argument("--work-dir", default=None)
+    worker.add_argument("--retention", type=int, default=3600,
+                        help="Durée de conservation des fichiers produits, en secondes")
+    worker.set_defaults(func=cmd_worker)
+
+    standin = subparsers.add_parser("redis-standin", help="Serveur compatible Redis local, en mémoire (tests)")
+    standin.add_argument("--host", default="127.0.0.1")
+    standin.add_argument("--port", type=int, default=6379)
+    standin.set_defaults(func=cmd_redis_standin)
+
+    loadtest = subparsers.add_parser("loadtest", help="Test de charge de l'interface Streamlit (hors ligne)")
+    loadtest.add_argument("--app", default="dash.py")
+    loadtest.add_argument("--sessions", default="1,2,4,8", help="Paliers de sessions simultanées")
+    loadtest.add_argument("--flow", default="load,search,paginate,select,download",
+                          help="Étapes du parcours simulé")
+    loadtest.add_argument("--query", default="musique")
+    loadtest.add_argument("--distinct-queries", type=int, default=4,
+                          help="Nombre de recherches différentes entre sessions")
+    loadtest.add_argument("--latency", type=float, default=0.2,
+                          help="Latence simulée de YouTube par appel yt-dlp, en secondes")
+    loadtest.add_argument("--slo", type=float, default=2.0, help="p95 maximal acceptable des interactions (hors premier chargement), en secondes")
+    loadtest.add_argument("--timeout", type=float, default=120)
+    loadtest.add_argument("--json", action="store_true", help="Rapport complet en JSON")
+    loadtest.set_defaults(func=cmd_loadtest)
+
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except CyberStreamError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
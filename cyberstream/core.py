@@ -0,0 +1,573 @@
+import os
+import re
+import json
+import time
+import queue
+import shutil
+import tempfile
+import threading
+import subprocess
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from .formats import (
+    parse_formats, get_format_cache, is_valid_selector, select_format,
+    POLICY_MAX_HEIGHT, POLICY_MAX_SIZE,
+)
+from .store import VideoRecord
+from .system import get_ffmpeg_path, yt_dlp_command, popen_process_group, kill_process_tree
+from .utils import clean_youtube_url, get_video_id, safe_search_query
+
+# --- Formats ---
+FORMAT_MP4 = "mp4"
+FORMAT_MP3 = "mp3"
+
+# Libellés affichés dans l'interface -> format interne
+FORMAT_LABELS = {
+    "MP4 (Vidéo)": FORMAT_MP4,
+    "MP3 (Audio)": FORMAT_MP3,
+}
+
+MIME_TYPES = {
+    FORMAT_MP4: "video/mp4",
+    FORMAT_MP3: "audio/mpeg",
+}
+
+# Délai maximal par téléchargement, en secondes
+DEFAULT_DOWNLOAD_DEADLINE = int(os.environ.get("CYBERSTREAM_DOWNLOAD_DEADLINE", 1800))
+
+_PROGRESS_RE = re.compile(r'\[download\]\s+(\d+(?:\.\d+)?)%')
+# Un extrait est téléchargé par FFmpeg : pas de pourcentage, seulement sa position
+_DESTINATION_RE = re.compile(r'^\[download\] Destination:')
+_FFMPEG_TIME_RE = re.compile(r'\btime=(\d+):(\d{2}):(\d{2}(?:\.\d+)?)')
+# Lignes émises par les post-traitements FFmpeg de yt-dlp (fusion, extraction audio...)
+_POSTPROCESS_RE = re.compile(r'^\[(?:Merger|ExtractAudio|VideoConvertor|VideoRemuxer|Fixup\w*|FFmpeg\w*)\]')
+
+# --- Erreurs ---
+class CyberStreamError(Exception):
+    """Erreur de base du paquet"""
+
+class SearchError(CyberStreamError):
+    """La recherche YouTube a échoué"""
+
+class NotFoundError(SearchError):
+    """YouTube a répondu, sans résultat (ce n'est pas une panne de l'extracteur)"""
+
+class DownloadError(CyberStreamError):
+    """Le téléchargement a échoué"""
+
+class DownloadCancelled(DownloadError):
+    """Le téléchargement a été annulé"""
+
+class DownloadTimeout(DownloadError):
+    """Le téléchargement a dépassé son délai"""
+
+class DependencyError(CyberStreamError):
+    """Un programme externe requis (yt-dlp, FFmpeg) est introuvable"""
+
+def _notify(notify, level, message):
+    if notify:
+        notify(level, message)
+
+# --- Fonctions YouTube ---
+#
+# Recherche, infos et URL de flux passent par le routeur d'extracteurs
+# (extractors.py) : yt-dlp ou pytubefix, selon leur santé et leur latence.
+
+def search_youtube(query, limit=15, notify=None):
+    """
+    Recherche YouTube et retourne une liste de VideoRecord.
+    Lève SearchError si aucun extracteur ne trouve de résultat.
+    """
+    from .extractors import get_extractor_router
+    if not safe_search_query(query):
+        raise SearchError("Recherche vide")
+    # Les extracteurs tournent dans des threads : leurs messages sont rejoués ici
+    messages = []
+    collect = (lambda level, message: messages.append((level, message))) if notify else None
+    try:
+        videos, extractor = get_extractor_router().route('search', query, limit, collect)
+    finally:
+        for level, message in list(messages):
+            _notify(notify, level, message)
+    _notify(notify, 'debug', f"Recherche servie par {extractor}")
+    return videos
+
+def get_video_info(url):
+    """Récupère les informations détaillées d'une vidéo (None si indisponible)"""
+    from .extractors import get_extractor_router
+    try:
+        return get_extractor_router().route('info', url)[0]
+    except NotFoundError:
+        return None
+
+def get_stream_url(url, format_key, max_height=None):
+    """URL directe d'un flux progressif (MP4) ou audio, lisible par FFmpeg"""
+    from .extractors import get_extractor_router
+    return get_extractor_router().route('stream_url', url, format_key, max_height)[0]
+
+def stream_selector(format_key, max_height=None):
+    """Sélecteur yt-dlp d'un flux unique (la fusion vidéo+audio exige un fichier)"""
+    if format_key == FORMAT_MP4:
+        height = f"[height<={int(max_height)}]" if max_height else ""
+        return f"best{height}[ext=mp4]/best{height}/best"
+    if format_key == FORMAT_MP3:
+        return "bestaudio/best"
+    raise ValueError(f"Format inconnu: {format_key}")
+
+def _search_yt_dlp(query, limit=15, notify=None):
+    """
+    Recherche YouTube via yt-dlp et retourne une liste de VideoRecord.
+    Lève SearchError si la recherche échoue ou ne retourne rien.
+    """
+    clean_query = safe_search_query(query)
+    if not clean_query:
+        raise SearchError("Recherche vide")
+
+    # Correction de la commande de recherche
+    search_command = [
+        *yt_dlp_command(),
+        f'ytsearch{limit}:"{clean_query}"',  # Ajout de guillemets autour de la requête
+        '--dump-json',
+        '--no-download',  # Correction: --no-download au lieu de --no-download
+        '--no-warnings',
+        '--ignore-errors',
+        '--socket-timeout', '30',
+        '--retries', '3',
+        '--fragment-retries', '3'
+    ]
+    _notify(notify, 'debug', f"Commande de recherche: {' '.join(search_command)}")
+
+    try:
+        result = subprocess.run(
+            search_command,
+            capture_output=True,
+            text=True,
+            timeout=60
+        )
+    except FileNotFoundError:
+        raise DependencyError("yt-dlp n'est pas disponible. Installation requise.")
+    except subprocess.TimeoutExpired:
+        raise SearchError("Timeout lors de la recherche")
+
+    _notify(notify, 'debug', (
+        f"Code de retour: {result.returncode}\n"
+        f"Sortie standard: {result.stdout[:500] if result.stdout else 'Vide'}\n"
+        f"Erreur: {result.stderr[:500] if result.stderr else 'Vide'}"
+    ))
+
+    if result.returncode != 0:
+        raise SearchError(f"Erreur lors de la recherche: {result.stderr}")
+
+    videos = []
+    output_lines = result.stdout.splitlines()
+    _notify(notify, 'debug', f"Nombre de lignes retournées: {len(output_lines)}")
+
+    for line in output_lines:
+        if line.strip():
+            try:
+                video_data = json.loads(line)
+                videos.append(VideoRecord.from_yt_dlp(video_data, description_limit=200))
+                get_format_cache().put(video_data.get('id'), parse_formats(video_data))
+            except json.JSONDecodeError:
+                continue
+
+    if not videos:
+        raise NotFoundError("Aucun résultat trouvé")
+    return videos
+
+# Messages d'erreur yt-dlp signalant une vidéo réellement indisponible
+UNAVAILABLE_MARKERS = ('unavailable', 'private video', 'removed', 'does not exist', 'terminated')
+
+def _video_info_yt_dlp(url):
+    """
+    Informations d'une vidéo via yt-dlp (None si indisponible).
+    Lève CyberStreamError si yt-dlp échoue pour une autre raison.
+    """
+    clean_url = clean_youtube_url(url)
+
+    command = [
+        *yt_dlp_command(),
+        '--dump-json',
+        '--no-download',  # Correction: --no-download au lieu de --no-download
+        '--ignore-errors',
+        '--no-warnings',
+        '--quiet',
+        clean_url
+    ]
+
+    try:
+        result = subprocess.run(command, capture_output=True, text=True, timeout=30)
+    except FileNotFoundError:
+        raise DependencyError("yt-dlp n'est pas disponible. Installation requise.")
+    except subprocess.TimeoutExpired:
+        raise CyberStreamError("Timeout lors de la récupération des infos")
+
+    if result.returncode == 0 and result.stdout.strip():
+        video_data = json.loads(result.stdout)
+        get_format_cache().put(video_data.get('id'), parse_formats(video_data))
+        return VideoRecord.from_yt_dlp(
+            video_data, link=clean_url, default_title='Titre non disponible'
+        )
+    error = result.stderr.strip()
+    if result.returncode == 0 or any(marker in error.lower() for marker in UNAVAILABLE_MARKERS):
+        return None
+    # Vérification anti-robot, limitation, réseau... : panne de l'extracteur, pas vidéo absente
+    raise CyberStreamError(f"Erreur yt-dlp: {error[-300:] or f'code {result.returncode}'}")
+
+def _stream_url_yt_dlp(url, format_key, max_height=None):
+    """URL directe du flux choisi par yt-dlp (-g)"""
+    command = [
+        *yt_dlp_command(),
+        '-g',
+        '-f', stream_selector(format_key, max_height),
+        '--no-warnings',
+        clean_youtube_url(url)
+    ]
+    try:
+        result = subprocess.run(command, capture_output=True, text=True, timeout=30)
+    except FileNotFoundError:
+        raise DependencyError("yt-dlp n'est pas disponible. Installation requise.")
+    except subprocess.TimeoutExpired:
+        raise CyberStreamError("Timeout lors de la résolution du flux")
+    lines = result.stdout.split()
+    if result.returncode != 0 or not lines:
+        raise CyberStreamError(f"Flux introuvable: {result.stderr.strip()[-300:]}")
+    return lines[0]
+
+def _fetch_info_batch(video_ids, results, track=None):
+    """
+    Lance un seul yt-dlp pour un lot d'IDs et pousse chaque vidéo dès sa sortie.
+    track(process) enregistre le processus et retourne False s'il faut abandonner.
+    """
+    command = [
+        *yt_dlp_command(),
+        '--dump-json',
+        '--no-download',
+        '--ignore-errors',
+        '--no-warnings',
+        '--quiet',
+        *[f"https://www.youtube.com/watch?v={video_id}" for video_id in video_ids]
+    ]
+    try:
+        process = popen_process_group(command, stdout=subprocess.PIPE,
+                                      stderr=subprocess.DEVNULL, text=True)
+    except FileNotFoundError:
+        results.put(DependencyError("yt-dlp n'est pas disponible. Installation requise."))
+        return
+    if track is not None and not track(process):
+        kill_process_tree(process)
+        return
+    for line in process.stdout:
+        if not line.strip():
+            continue
+        try:
+            video_data = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        get_format_cache().put(video_data.get('id'), parse_formats(video_data))
+        results.put(VideoRecord.from_yt_dlp(video_data, description_limit=200))
+    process.wait()
+
+def iter_video_info(video_ids, batch_size=25, workers=4):
+    """
+    Récupère les métadonnées de nombreux IDs en pipeline : les IDs sont répartis
+    en lots traités chacun par un seul processus yt-dlp (le coût de démarrage est
+    payé une fois par lot), plusieurs lots tournent en parallèle, et chaque
+    VideoRecord est produit dès que yt-dlp l'émet. Les IDs introuvables sont ignorés.
+    """
+    video_ids = list(video_ids)
+    if not video_ids:
+        return
+    batches = [video_ids[i:i + batch_size] for i in range(0, len(video_ids), batch_size)]
+    results = queue.Queue()
+    done = object()
+    processes = set()
+    processes_lock = threading.Lock()
+    stopped = threading.Event()
+
+    def track(process):
+        with processes_lock:
+            if stopped.is_set():
+                return False
+            processes.add(process)
+            return True
+
+    def run(batch):
+        try:
+            _fetch_info_batch(batch, results, track)
+        finally:
+            results.put(done)
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="info")
+    try:
+        for batch in batches:
+            executor.submit(run, batch)
+        remaining = len(batches)
+        while remaining:
+            item = results.get()
+            if item is done:
+                remaining -= 1
+            elif isinstance(item, CyberStreamError):
+                raise item
+            else:
+                yield item
+    finally:
+        # Générateur fermé avant la fin (rerun Streamlit, erreur) : lots en attente
+        # annulés et yt-dlp en cours tués, sans attendre leur fin
+        with processes_lock:
+            stopped.set()
+            running = list(processes)
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in running:
+            kill_process_tree(process)
+
+def get_video_formats(url):
+    """
+    Retourne les formats d'une vidéo depuis le cache (rempli par la recherche
+    et get_video_info), ou les récupère avec yt-dlp. Tuple vide si indisponible
+    ou si un échec récent est mémorisé.
+    """
+    video_id = get_video_id(url)
+    cache = get_format_cache()
+    formats = cache.get(video_id)
+    if formats is None:
+        # Seul yt-dlp décrit les formats : pas de routage ici
+        try:
+            _video_info_yt_dlp(url)
+        finally:
+            formats = cache.get(video_id)
+            if formats is None:
+                # Échec mémorisé brièvement : pas de nouvel appel à chaque relance
+                cache.put_failure(video_id)
+    return formats or ()
+
+def resolve_format_selector(url, format_key, max_height=None, max_size_mb=None):
+    """
+    Traduit une contrainte (hauteur max, taille max en Mo) en sélecteur yt-dlp
+    à partir des formats de la vidéo. None si aucune contrainte ou aucun format.
+    """
+    if not max_height and not max_size_mb:
+        return None
+    policy = POLICY_MAX_SIZE if max_size_mb else POLICY_MAX_HEIGHT
+    choice = select_format(
+        get_video_formats(url), policy=policy, max_height=max_height,
+        max_size_mb=max_size_mb, audio_only=(format_key == FORMAT_MP3)
+    )
+    return choice.selector if choice else None
+
+# --- Fonctions de Téléchargement ---
+def _section_arguments(section, precise_cuts=False):
+    """
+    Options yt-dlp pour ne récupérer qu'un extrait (début, fin) en secondes.
+    Seuls les fragments couvrant l'extrait sont téléchargés ; la découpe se fait
+    en copie de flux, sauf si precise_cuts force un ré-encodage aux points de coupe.
+    """
+    if not section:
+        return []
+    start, end = section
+    end_text = f"{end:g}" if end is not None else "inf"
+    arguments = ['--download-sections', f"*{start:g}-{end_text}"]
+    if precise_cuts:
+        arguments.append('--force-keyframes-at-cuts')
+    return arguments
+
+def build_download_command(url, format_key, output_dir, ffmpeg_path,
+                           section=None, precise_cuts=False, format_selector=None):
+    """
+    Construit la commande yt-dlp pour le format demandé.
+    format_selector remplace la sélection par défaut (voir formats.select_format).
+    """
+    if format_selector and not is_valid_selector(format_selector):
+        raise ValueError(f"Sélecteur de format invalide: {format_selector}")
+
+    if section:
+        output_template = os.path.join(
+            output_dir, "%(title).90s_%(section_start)d-%(section_end)d.%(ext)s"
+        )
+    else:
+        output_template = os.path.join(output_dir, "%(title).100s.%(ext)s")
+
+    if format_key == FORMAT_MP4:
+        default_selector = 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best'
+        format_arguments = [
+            '-f', f"{format_selector}/{default_selector}" if format_selector else default_selector,
+            '--merge-output-format', 'mp4',
+        ]
+    elif format_key == FORMAT_MP3:
+        format_arguments = [
+            *(['-f', f"{format_selector}/bestaudio/best"] if format_selector else []),
+            '-x', '--audio-format', 'mp3',
+            '--audio-quality', '192K',
+        ]
+    else:
+        raise ValueError(f"Format inconnu: {format_key}")
+
+    return [
+        *yt_dlp_command(),
+        *format_arguments,
+        *_section_arguments(section, precise_cuts),
+        '--ignore-errors',
+        '--no-warnings',
+        '--newline',
+        '-o', output_template,
+        '--ffmpeg-location', ffmpeg_path,
+        url
+    ]
+
+def _find_downloaded_file(output_dir, format_key, notify=None):
+    """Repère le fichier produit par yt-dlp et normalise son extension"""
+    for file in os.listdir(output_dir):
+        file_lower = file.lower()
+        downloaded_file = os.path.join(output_dir, file)
+        if format_key == FORMAT_MP4:
+            if file_lower.endswith(('.mp4', '.webm', '.mkv')):
+                if not downloaded_file.endswith('.mp4'):
+                    new_file = os.path.splitext(downloaded_file)[0] + '.mp4'
+                    os.rename(downloaded_file, new_file)
+                    downloaded_file = new_file
+                return downloaded_file
+        else:  # MP3
+            if file_lower.endswith('.mp3'):
+                _notify(notify, 'success', "🎵 Fichier MP3 converti avec succès!")
+                return downloaded_file
+            elif file_lower.endswith(('.m4a', '.ogg', '.opus', '.wav')):
+                new_file = os.path.splitext(downloaded_file)[0] + '.mp3'
+                os.rename(downloaded_file, new_file)
+                _notify(notify, 'warning', "🔸 Fichier audio natif renommé.")
+                return new_file
+    return None
+
+def _fill_timings(timings, started, download_started, postprocess_started):
+    """Découpe le temps écoulé en phases extraction / téléchargement / post-traitement"""
+    finished = time.perf_counter()
+    download_started = download_started or finished
+    postprocess_started = postprocess_started or finished
+    timings['extract'] = download_started - started
+    timings['download'] = max(0.0, postprocess_started - download_started)
+    timings['postprocess'] = finished - postprocess_started if postprocess_started < finished else 0.0
+    timings['total'] = finished - started
+
+def _watch_process(process, cancel_event, deadline_at, outcome):
+    """Tue l'arbre de processus à l'annulation ou à l'échéance du délai"""
+    waiter = cancel_event or threading.Event()
+    while process.poll() is None:
+        if cancel_event is not None and cancel_event.is_set():
+            outcome['reason'] = 'cancelled'
+        elif deadline_at is not None and time.monotonic() >= deadline_at:
+            outcome['reason'] = 'timeout'
+        else:
+            waiter.wait(0.25)
+            continue
+        kill_process_tree(process)
+        return
+
+def download_media(url, format_key, output_dir, progress=None, notify=None,
+                   section=None, precise_cuts=False, format_selector=None, timings=None,
+                   deadline=None, cancel_event=None):
+    """
+    Télécharge une vidéo dans output_dir avec yt-dlp et FFmpeg.
+
+    section limite le téléchargement à un extrait (début, fin) en secondes,
+    tel que retourné par parse_section. format_selector restreint les flux
+    récupérés (ex: '136+140' pour du 720p), voir formats.select_format.
+
+    progress est appelé avec une fraction entre 0 et 1 au fil du téléchargement.
+    Si timings est un dict, il reçoit la durée de chaque phase en secondes
+    ('extract', 'download', 'postprocess', 'total'), même en cas d'échec.
+
+    deadline (secondes) et cancel_event (threading.Event) arrêtent yt-dlp et
+    ses FFmpeg ; DownloadTimeout ou DownloadCancelled est alors levée. Toute
+    exception du processus appelant termine aussi l'arbre de processus. Les
+    fichiers partiels restent dans un dossier temporaire supprimé dans tous les cas.
+    Retourne (chemin, nom_de_fichier, type_mime) ou lève DownloadError.
+    """
+    clean_url = clean_youtube_url(url)
+    started = time.perf_counter()
+    download_started = postprocess_started = None
+
+    ffmpeg_path = get_ffmpeg_path()
+    if not ffmpeg_path:
+        raise DependencyError("FFmpeg introuvable.")
+
+    # yt-dlp travaille dans un dossier temporaire : .part, .ytdl et fragments
+    # disparaissent avec lui, et seul le fichier final rejoint output_dir
+    staging_dir = tempfile.mkdtemp(prefix=".cyberstream-", dir=output_dir)
+    try:
+        command = build_download_command(
+            clean_url, format_key, staging_dir, ffmpeg_path,
+            section=section, precise_cuts=precise_cuts, format_selector=format_selector
+        )
+
+        try:
+            process = popen_process_group(
+                command,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True
+            )
+        except FileNotFoundError:
+            raise DependencyError("yt-dlp n'est pas disponible. Installation requise.")
+        spawned = time.perf_counter()
+        # Durée attendue d'un extrait borné, pour suivre la progression d'FFmpeg
+        section_length = section[1] - section[0] if section and section[1] is not None else None
+
+        outcome = {}
+        deadline_at = time.monotonic() + deadline if deadline else None
+        watcher = threading.Thread(target=_watch_process, name="download-watchdog",
+                                   args=(process, cancel_event, deadline_at, outcome), daemon=True)
+        watcher.start()
+
+        # stderr est fusionné dans stdout pour éviter un blocage sur un tube plein
+        output_tail = deque(maxlen=20)
+        try:
+            for line in process.stdout:
+                output_tail.append(line.rstrip())
+                if postprocess_started is None and _POSTPROCESS_RE.match(line):
+                    postprocess_started = time.perf_counter()
+                match = _PROGRESS_RE.search(line)
+                if match:
+                    if download_started is None:
+                        download_started = time.perf_counter()
+                    if progress:
+                        progress(min(0.99, float(match.group(1)) / 100))
+                elif download_started is None and _DESTINATION_RE.match(line):
+                    download_started = time.perf_counter()
+                elif progress and section_length:
+                    match = _FFMPEG_TIME_RE.search(line)
+                    if match:
+                        hours, minutes, seconds = match.groups()
+                        position = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+                        progress(min(0.99, position / section_length))
+            process.wait()
+        except BaseException:
+            # Appelant interrompu (rerun Streamlit, Ctrl+C...) : rien ne doit survivre
+            kill_process_tree(process)
+            raise
+        finally:
+            process.stdout.close()
+            if download_started is None and process.returncode == 0:
+                # Aucune ligne de progression (extrait via FFmpeg) : durée du processus
+                download_started = spawned
+            if timings is not None:
+                _fill_timings(timings, started, download_started, postprocess_started)
+
+        if outcome.get('reason') == 'cancelled':
+            raise DownloadCancelled("Téléchargement annulé")
+        if outcome.get('reason') == 'timeout':
+            raise DownloadTimeout(f"Délai de {deadline:g}s dépassé")
+        if process.returncode != 0:
+            raise DownloadError(f"Échec du téléchargement: {chr(10).join(output_tail)}")
+
+        downloaded_file = _find_downloaded_file(staging_dir, format_key, notify)
+        if not downloaded_file:
+            raise DownloadError("Aucun fichier trouvé après téléchargement")
+        file_name = os.path.basename(downloaded_file)
+        final_file = os.path.join(output_dir, file_name)
+        os.replace(downloaded_file, final_file)
+
+        if progress:
+            progress(1.0)
+        return final_file, file_name, MIME_TYPES[format_key]
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
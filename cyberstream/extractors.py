@@ -0,0 +1,350 @@
+import os
+import re
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from .core import (
+    _search_yt_dlp, _video_info_yt_dlp, _stream_url_yt_dlp, _notify,
+    FORMAT_MP4, FORMAT_MP3, CyberStreamError, SearchError, NotFoundError, DependencyError,
+)
+from .store import VideoRecord
+from .utils import clean_youtube_url, safe_search_query, parse_timestamp
+
+# --- Extracteurs interchangeables ---
+#
+# Chaque opération (search, info, stream_url) est confiée à l'extracteur sain
+# le plus rapide. Une erreur bascule aussitôt sur le suivant ; une réponse lente
+# déclenche une requête de secours en parallèle (la première réponse gagne).
+# Après plusieurs échecs consécutifs, un extracteur est écarté pendant un délai
+# qui double à chaque nouvel échec.
+
+OPERATIONS = ('search', 'info', 'stream_url')
+
+# Latence supposée tant qu'un extracteur n'a pas été mesuré, en secondes
+DEFAULT_LATENCY = {'search': 4.0, 'info': 2.5, 'stream_url': 2.5}
+# Délai minimal avant la requête de secours
+MIN_HEDGE_DELAY = 0.5
+# Délai maximal tant que la latence repose sur moins de WARM_SAMPLES mesures :
+# un réplica qui démarre doit aussi pouvoir basculer vite
+COLD_HEDGE_DELAY = 2.0
+WARM_SAMPLES = 3
+
+FAILURE_THRESHOLD = 3
+BASE_COOLDOWN = 30
+MAX_COOLDOWN = 600
+
+class Extractor:
+    """Interface commune : chaque méthode lève une CyberStreamError en cas d'échec"""
+    name = None
+
+    def search(self, query, limit, notify=None):
+        raise NotImplementedError
+
+    def info(self, url):
+        raise NotImplementedError
+
+    def stream_url(self, url, format_key, max_height=None):
+        raise NotImplementedError
+
+class YtDlpExtractor(Extractor):
+    """yt-dlp en ligne de commande (remplit aussi le cache des formats)"""
+    name = "yt-dlp"
+
+    def search(self, query, limit, notify=None):
+        return _search_yt_dlp(query, limit, notify)
+
+    def info(self, url):
+        record = _video_info_yt_dlp(url)
+        if record is None:
+            raise NotFoundError("Vidéo introuvable")
+        return record
+
+    def stream_url(self, url, format_key, max_height=None):
+        return _stream_url_yt_dlp(url, format_key, max_height)
+
+class PytubefixExtractor(Extractor):
+    """pytubefix, dans le processus : pas de démarrage de sous-processus"""
+    name = "pytubefix"
+
+    def _module(self):
+        try:
+            import pytubefix
+        except ImportError:
+            raise DependencyError("pytubefix n'est pas installé.")
+        return pytubefix
+
+    @staticmethod
+    def _record(video, description_limit=None):
+        publish_date = getattr(video, 'publish_date', None)
+        description = video.description or ""
+        if description_limit and len(description) > description_limit:
+            description = description[:description_limit] + "..."
+        return VideoRecord(
+            id=video.video_id,
+            title=video.title or 'Sans titre',
+            link=video.watch_url,
+            channel=video.author,
+            duration=video.length,
+            view_count=video.views,
+            thumbnail=video.thumbnail_url,
+            upload_date=publish_date.strftime('%Y%m%d') if publish_date else None,
+            description=description
+        )
+
+    @staticmethod
+    def _text(field):
+        """Texte d'un champ innertube ({'simpleText': ...} ou {'runs': [...]})"""
+        if not field:
+            return ''
+        return field.get('simpleText') or ''.join(run.get('text', '') for run in field.get('runs', ()))
+
+    @classmethod
+    def _renderer_record(cls, renderer):
+        """VideoRecord construit depuis un videoRenderer de la page de résultats"""
+        video_id = renderer['videoId']
+        try:
+            duration = int(parse_timestamp(cls._text(renderer.get('lengthText'))) or 0) or None
+        except ValueError:
+            duration = None
+        views = re.sub(r'\D', '', cls._text(renderer.get('viewCountText')))
+        snippets = renderer.get('detailedMetadataSnippets') or [{}]
+        description = cls._text(snippets[0].get('snippetText'))
+        thumbnails = (renderer.get('thumbnail') or {}).get('thumbnails') or [{}]
+        return VideoRecord(
+            id=video_id,
+            title=cls._text(renderer.get('title')) or 'Sans titre',
+            link=f"https://www.youtube.com/watch?v={video_id}",
+            channel=cls._text(renderer.get('ownerText') or renderer.get('longBylineText')) or 'Chaîne inconnue',
+            duration=duration,
+            view_count=int(views) if views else 0,
+            thumbnail=thumbnails[-1].get('url'),
+            upload_date='',
+            description=description[:200] + '...' if len(description) > 200 else description
+        )
+
+    def search(self, query, limit, notify=None):
+        pytubefix = self._module()
+        try:
+            # Une seule requête : les objets YouTube de Search.videos interrogeraient
+            # YouTube vidéo par vidéo à la lecture de chaque attribut
+            search = pytubefix.Search(safe_search_query(query))
+            raw = search.fetch_query()
+            sections = raw['contents']['twoColumnSearchResultsRenderer'][
+                'primaryContents']['sectionListRenderer']['contents']
+            renderers = [item['videoRenderer']
+                         for section in sections
+                         for item in section.get('itemSectionRenderer', {}).get('contents', ())
+                         if 'videoRenderer' in item]
+            records = [self._renderer_record(renderer) for renderer in renderers[:limit]]
+        except Exception as e:
+            raise SearchError(f"Erreur pytubefix: {e}")
+        _notify(notify, 'debug', f"pytubefix: {len(renderers)} vidéos dans la page de résultats")
+        if not records:
+            raise NotFoundError("Aucun résultat trouvé")
+        return records
+
+    def info(self, url):
+        pytubefix = self._module()
+        from pytubefix.exceptions import VideoUnavailable
+        try:
+            return self._record(pytubefix.YouTube(clean_youtube_url(url)))
+        except VideoUnavailable as e:
+            raise NotFoundError(f"Vidéo introuvable: {e}")
+        except Exception as e:
+            raise SearchError(f"Erreur pytubefix: {e}")
+
+    def stream_url(self, url, format_key, max_height=None):
+        pytubefix = self._module()
+        try:
+            streams = pytubefix.YouTube(clean_youtube_url(url)).streams
+            if format_key == FORMAT_MP3:
+                stream = streams.get_audio_only()
+            elif format_key == FORMAT_MP4:
+                candidates = streams.filter(progressive=True, file_extension='mp4').order_by('resolution').desc()
+                stream = next((s for s in candidates
+                               if not max_height or int((s.resolution or '0p')[:-1]) <= max_height), None)
+            else:
+                raise ValueError(f"Format inconnu: {format_key}")
+        except ValueError:
+            raise
+        except Exception as e:
+            raise CyberStreamError(f"Erreur pytubefix: {e}")
+        if stream is None:
+            raise CyberStreamError("Aucun flux compatible")
+        return stream.url
+
+# --- Santé des extracteurs ---
+class ExtractorHealth:
+    """Latence lissée et disjoncteur d'un extracteur pour une opération"""
+    __slots__ = ('latency', 'successes', 'failures', 'consecutive_failures',
+                 'open_until', 'last_error', '_lock')
+
+    def __init__(self):
+        self.latency = None
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.last_error = None
+        self._lock = threading.Lock()
+
+    @property
+    def available(self):
+        return time.time() >= self.open_until
+
+    def record_success(self, elapsed):
+        with self._lock:
+            # Moyenne mobile exponentielle : suit les ralentissements sans sur-réagir
+            self.latency = elapsed if self.latency is None else 0.7 * self.latency + 0.3 * elapsed
+            self.successes += 1
+            self.consecutive_failures = 0
+            self.open_until = 0.0
+
+    def record_failure(self, error, permanent=False):
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_error = str(error)[:300]
+            if permanent:
+                self.open_until = time.time() + MAX_COOLDOWN
+            elif self.consecutive_failures >= FAILURE_THRESHOLD:
+                exponent = self.consecutive_failures - FAILURE_THRESHOLD
+                self.open_until = time.time() + min(MAX_COOLDOWN, BASE_COOLDOWN * 2 ** exponent)
+
+    def to_dict(self):
+        return {
+            'available': self.available,
+            'latency': self.latency,
+            'successes': self.successes,
+            'failures': self.failures,
+            'consecutive_failures': self.consecutive_failures,
+            'retry_in': max(0.0, self.open_until - time.time()) or None,
+            'last_error': self.last_error,
+        }
+
+class ExtractorRouter:
+    """Route chaque opération vers l'extracteur sain le plus rapide"""
+
+    def __init__(self, extractors, max_workers=8):
+        self.extractors = list(extractors)
+        self._health = {(extractor.name, operation): ExtractorHealth()
+                        for extractor in self.extractors for operation in OPERATIONS}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="extractor")
+
+    def health(self, extractor, operation):
+        return self._health[(extractor.name, operation)]
+
+    def _candidates(self, operation):
+        """Disponibles d'abord, par latence mesurée ; à défaut, l'ordre configuré"""
+        def key(item):
+            rank, extractor = item
+            health = self.health(extractor, operation)
+            latency = health.latency if health.latency is not None else DEFAULT_LATENCY[operation]
+            return (not health.available, latency, rank)
+        return [extractor for _, extractor in sorted(enumerate(self.extractors), key=key)]
+
+    def _hedge_delay(self, extractor, operation):
+        health = self.health(extractor, operation)
+        latency = health.latency if health.latency is not None else DEFAULT_LATENCY[operation]
+        delay = 2 * latency
+        if health.successes < WARM_SAMPLES:
+            delay = min(COLD_HEDGE_DELAY, delay)
+        return max(MIN_HEDGE_DELAY, delay)
+
+    def _timed(self, extractor, operation, args):
+        health = self.health(extractor, operation)
+        started = time.perf_counter()
+        try:
+            result = getattr(extractor, operation)(*args)
+        except NotFoundError:
+            # L'extracteur fonctionne : l'absence de résultat n'est pas une panne
+            health.record_success(time.perf_counter() - started)
+            raise
+        except DependencyError as e:
+            health.record_failure(e, permanent=True)
+            raise
+        except Exception as e:
+            health.record_failure(e)
+            raise
+        # Enregistré même si une requête de secours a déjà répondu
+        health.record_success(time.perf_counter() - started)
+        return result
+
+    def route(self, operation, *args):
+        """Exécute l'opération et retourne (résultat, nom de l'extracteur)"""
+        candidates = self._candidates(operation)
+        if not candidates:
+            raise DependencyError("Aucun extracteur configuré.")
+        pending, errors = {}, []
+        remaining = list(reversed(candidates))
+
+        def launch():
+            extractor = remaining.pop()
+            pending[self._executor.submit(self._timed, extractor, operation, args)] = extractor
+            return extractor
+
+        last = launch()
+        while pending:
+            hedge = self._hedge_delay(last, operation) if remaining else None
+            done, _ = wait(pending, timeout=hedge, return_when=FIRST_COMPLETED)
+            if not done:
+                # Réponse lente : le suivant est lancé en parallèle
+                last = launch()
+                continue
+            for future in done:
+                extractor = pending.pop(future)
+                try:
+                    return future.result(), extractor.name
+                except NotFoundError:
+                    raise
+                except Exception as e:
+                    errors.append(e)
+            if not pending and remaining:
+                last = launch()
+
+        # Une erreur métier est plus parlante qu'une dépendance absente
+        raise next((e for e in errors if not isinstance(e, DependencyError)), errors[0])
+
+    def search(self, query, limit=15, notify=None):
+        return self.route('search', query, limit, notify)[0]
+
+    def info(self, url):
+        return self.route('info', url)[0]
+
+    def stream_url(self, url, format_key, max_height=None):
+        return self.route('stream_url', url, format_key, max_height)[0]
+
+    def status(self):
+        """Santé de chaque extracteur, par opération"""
+        return {
+            extractor.name: {operation: self.health(extractor, operation).to_dict()
+                             for operation in OPERATIONS}
+            for extractor in self.extractors
+        }
+
+AVAILABLE_EXTRACTORS = {
+    YtDlpExtractor.name: YtDlpExtractor,
+    PytubefixExtractor.name: PytubefixExtractor,
+}
+
+_default_router = None
+_default_lock = threading.Lock()
+
+def get_extractor_router():
+    """Routeur unique du processus ; CYBERSTREAM_EXTRACTORS fixe l'ordre de préférence"""
+    global _default_router
+    with _default_lock:
+        if _default_router is None:
+            names = os.environ.get("CYBERSTREAM_EXTRACTORS", "yt-dlp,pytubefix").split(',')
+            _default_router = ExtractorRouter(
+                AVAILABLE_EXTRACTORS[name.strip()]() for name in names
+                if name.strip() in AVAILABLE_EXTRACTORS
+            )
+        return _default_router
+
+def reset_extractor_router():
+    """Oublie le routeur du processus : le suivant relit CYBERSTREAM_EXTRACTORS"""
+    global _default_router
+    with _default_lock:
+        _default_router = None
@@ -0,0 +1,234 @@
+import re
+import time
+import threading
+from collections import OrderedDict
+
+# --- Formats disponibles ---
+
+# Politiques de sélection
+POLICY_BEST = "best"
+POLICY_MAX_HEIGHT = "max_height"
+POLICY_MAX_SIZE = "max_size"
+
+_SELECTOR_RE = re.compile(r'^[\w+/\[\]<>=!*.:-]+$')
+
+class MediaFormat:
+    """Description compacte d'un format proposé par YouTube"""
+    __slots__ = ('format_id', 'ext', 'height', 'fps', 'vcodec', 'acodec',
+                 'tbr', 'filesize', 'size_estimated')
+
+    def __init__(self, format_id, ext, height=None, fps=None, vcodec=None,
+                 acodec=None, tbr=None, filesize=None, size_estimated=False):
+        self.format_id = format_id
+        self.ext = ext
+        self.height = height
+        self.fps = fps
+        self.vcodec = vcodec
+        self.acodec = acodec
+        self.tbr = tbr
+        self.filesize = filesize
+        self.size_estimated = size_estimated
+
+    @property
+    def has_video(self):
+        return bool(self.vcodec) and self.vcodec != 'none'
+
+    @property
+    def has_audio(self):
+        return bool(self.acodec) and self.acodec != 'none'
+
+    @classmethod
+    def from_yt_dlp(cls, format_data, duration=None):
+        """Construit un format depuis la sortie JSON de yt-dlp, avec taille estimée"""
+        tbr = format_data.get('tbr')
+        filesize = format_data.get('filesize')
+        size_estimated = False
+        if not filesize:
+            filesize = format_data.get('filesize_approx')
+            size_estimated = True
+        if not filesize and tbr and duration:
+            # tbr est en kbit/s
+            filesize = int(tbr * 1000 / 8 * duration)
+        return cls(
+            format_id=format_data.get('format_id'),
+            ext=format_data.get('ext'),
+            height=format_data.get('height'),
+            fps=format_data.get('fps'),
+            vcodec=format_data.get('vcodec'),
+            acodec=format_data.get('acodec'),
+            tbr=tbr,
+            filesize=filesize or None,
+            size_estimated=size_estimated
+        )
+
+    def to_dict(self):
+        """Représentation JSON du format"""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+def parse_formats(video_data):
+    """Extrait les formats téléchargeables d'une sortie JSON de yt-dlp"""
+    duration = video_data.get('duration')
+    formats = []
+    for format_data in video_data.get('formats') or []:
+        # Les storyboards et manifestes ne sont pas des médias téléchargeables
+        if format_data.get('format_note') == 'storyboard' or format_data.get('ext') == 'mhtml':
+            continue
+        media_format = MediaFormat.from_yt_dlp(format_data, duration)
+        if media_format.has_video or media_format.has_audio:
+            formats.append(media_format)
+    return formats
+
+class FormatChoice:
+    """Combinaison de formats retenue pour un téléchargement"""
+    __slots__ = ('selector', 'height', 'filesize', 'tbr', 'label')
+
+    def __init__(self, selector, height, filesize, tbr, label):
+        self.selector = selector
+        self.height = height
+        self.filesize = filesize
+        self.tbr = tbr
+        self.label = label
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+def _best_audio(formats, prefer_ext=None):
+    audio = [f for f in formats if f.has_audio and not f.has_video]
+    if prefer_ext:
+        preferred = [f for f in audio if f.ext == prefer_ext]
+        audio = preferred or audio
+    return max(audio, key=lambda f: f.tbr or 0, default=None)
+
+def _add_sizes(*sizes):
+    if any(size is None for size in sizes):
+        return None
+    return sum(sizes)
+
+def build_choices(formats, audio_only=False):
+    """Liste les combinaisons possibles (vidéo + audio, progressif, ou audio seul)"""
+    choices = []
+    if audio_only:
+        for f in formats:
+            if f.has_audio and not f.has_video:
+                choices.append(FormatChoice(f.format_id, None, f.filesize, f.tbr,
+                                            f"{f.ext} {int(f.tbr or 0)}k"))
+        return choices
+
+    audio = _best_audio(formats, prefer_ext='m4a')
+    for f in formats:
+        if not f.has_video:
+            continue
+        if f.has_audio:
+            choices.append(FormatChoice(f.format_id, f.height, f.filesize, f.tbr,
+                                        f"{f.height}p {f.ext} (progressif)"))
+        elif audio:
+            choices.append(FormatChoice(
+                f"{f.format_id}+{audio.format_id}", f.height,
+                _add_sizes(f.filesize, audio.filesize),
+                (f.tbr or 0) + (audio.tbr or 0),
+                f"{f.height}p {f.ext} {f.vcodec} + {audio.ext}"
+            ))
+    return choices
+
+def select_format(formats, policy=POLICY_BEST, max_height=None, max_size_mb=None,
+                  audio_only=False):
+    """
+    Choisit une combinaison selon la politique demandée :
+      - best : meilleure qualité disponible
+      - max_height : meilleure qualité dont la hauteur ne dépasse pas max_height
+      - max_size : meilleure qualité dont la taille estimée tient sous max_size_mb,
+        à défaut la plus petite combinaison connue
+    Retourne None si aucune combinaison ne convient (yt-dlp choisira seul).
+    """
+    choices = build_choices(formats, audio_only=audio_only)
+    if not choices:
+        return None
+
+    def quality(choice):
+        return (choice.height or 0, choice.tbr or 0)
+
+    if policy == POLICY_MAX_HEIGHT and max_height and not audio_only:
+        candidates = [c for c in choices if c.height and c.height <= max_height]
+    elif policy == POLICY_MAX_SIZE and max_size_mb:
+        budget = max_size_mb * 1024 * 1024
+        sized = [c for c in choices if c.filesize]
+        candidates = [c for c in sized if c.filesize <= budget]
+        if not candidates and sized:
+            return min(sized, key=lambda c: c.filesize)
+    else:
+        candidates = choices
+
+    return max(candidates, key=quality, default=None)
+
+def is_valid_selector(selector):
+    """Vérifie qu'un sélecteur de format yt-dlp ne contient que des caractères attendus"""
+    return bool(selector) and len(selector) <= 200 and _SELECTOR_RE.match(selector) is not None
+
+def format_size(size):
+    """Formate une taille en octets"""
+    if not size:
+        return "N/A"
+    for unit in ("o", "Ko", "Mo", "Go"):
+        if size < 1024 or unit == "Go":
+            return f"{size:.1f} {unit}" if unit != "o" else f"{int(size)} {unit}"
+        size /= 1024
+
+# --- Cache des formats ---
+# Durée pendant laquelle un échec de récupération des formats est mémorisé
+FORMAT_FAILURE_TTL = 60
+
+class FormatCache:
+    """
+    Cache LRU des formats par ID vidéo, partagé dans le processus. Un échec
+    est mémorisé brièvement (tuple vide) pour ne pas relancer yt-dlp à chaque relance.
+    """
+
+    def __init__(self, max_videos=500, failure_ttl=FORMAT_FAILURE_TTL):
+        self.max_videos = max_videos
+        self.failure_ttl = failure_ttl
+        self._formats = OrderedDict()
+        self._failures = {}
+        self._lock = threading.Lock()
+
+    def put(self, video_id, formats):
+        if not video_id or not formats:
+            return
+        with self._lock:
+            self._failures.pop(video_id, None)
+            self._formats[video_id] = tuple(formats)
+            self._formats.move_to_end(video_id)
+            while len(self._formats) > self.max_videos:
+                self._formats.popitem(last=False)
+
+    def put_failure(self, video_id):
+        """Mémorise un échec : get retourne () jusqu'à expiration"""
+        if not video_id:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if video_id in self._formats:
+                return
+            self._failures[video_id] = now + self.failure_ttl
+            # Les échecs expirés sont purgés au passage : la table reste petite
+            if len(self._failures) > self.max_videos:
+                self._failures = {key: expires for key, expires in self._failures.items() if expires > now}
+
+    def get(self, video_id):
+        """Formats connus, () après un échec récent, None s'il faut les récupérer"""
+        with self._lock:
+            formats = self._formats.get(video_id)
+            if formats is not None:
+                self._formats.move_to_end(video_id)
+                return formats
+            expires = self._failures.get(video_id)
+            if expires is not None:
+                if expires > time.monotonic():
+                    return ()
+                del self._failures[video_id]
+            return None
+
+_default_cache = FormatCache()
+
+def get_format_cache():
+    """Cache de formats unique pour tout le processus"""
+    return _default_cache
@@ -0,0 +1,201 @@
+import os
+import math
+import time
+import sqlite3
+import threading
+
+# --- Historique persistant des téléchargements ---
+
+STATUS_DONE = "done"
+STATUS_ERROR = "error"
+STATUS_CANCELLED = "cancelled"
+
+DEFAULT_HISTORY_PATH = os.path.join(os.path.expanduser("~"), ".cyberstream", "history.db")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS downloads (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    video_id TEXT,
+    title TEXT,
+    format TEXT NOT NULL,
+    section TEXT,
+    status TEXT NOT NULL,
+    error TEXT,
+    file_name TEXT,
+    bytes INTEGER,
+    started_at REAL NOT NULL,
+    extract_seconds REAL,
+    download_seconds REAL,
+    postprocess_seconds REAL,
+    total_seconds REAL,
+    throughput REAL,
+    job_id TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_downloads_started ON downloads (started_at);
+CREATE INDEX IF NOT EXISTS idx_downloads_status ON downloads (status, id);
+CREATE INDEX IF NOT EXISTS idx_downloads_format ON downloads (format, id);
+CREATE INDEX IF NOT EXISTS idx_downloads_video ON downloads (video_id);
+"""
+# Créé après la migration : les bases antérieures n'ont pas la colonne job_id
+_JOB_INDEX = "CREATE INDEX IF NOT EXISTS idx_downloads_job ON downloads (job_id)"
+
+_COLUMNS = ('id', 'video_id', 'title', 'format', 'section', 'status', 'error',
+            'file_name', 'bytes', 'started_at', 'extract_seconds',
+            'download_seconds', 'postprocess_seconds', 'total_seconds', 'throughput', 'job_id')
+
+def percentile(sorted_values, fraction):
+    """Percentile (rang le plus proche) d'une liste déjà triée"""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+class HistoryStore:
+    """Historique SQLite indexé : une ligne par tâche, avec durées par phase"""
+
+    def __init__(self, path=None):
+        self.path = path or os.environ.get("CYBERSTREAM_HISTORY_DB", DEFAULT_HISTORY_PATH)
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.executescript(_SCHEMA)
+            columns = {row[1] for row in self._connection.execute("PRAGMA table_info(downloads)")}
+            if 'job_id' not in columns:
+                self._connection.execute("ALTER TABLE downloads ADD COLUMN job_id TEXT")
+            self._connection.execute(_JOB_INDEX)
+
+    def record(self, video_id, title, format_key, status, started_at, timings=None,
+               file_path=None, file_name=None, error=None, section=None, job_id=None):
+        """Enregistre une tâche terminée (réussie ou non) et retourne son ID"""
+        timings = timings or {}
+        size = os.path.getsize(file_path) if file_path and os.path.exists(file_path) else None
+        download_seconds = timings.get('download')
+        throughput = size / download_seconds if size and download_seconds else None
+        section_text = None
+        if section:
+            start, end = section
+            section_text = f"{start:g}-{end:g}" if end is not None else f"{start:g}-"
+
+        with self._lock, self._connection:
+            cursor = self._connection.execute(
+                "INSERT INTO downloads (video_id, title, format, section, status, error,"
+                " file_name, bytes, started_at, extract_seconds, download_seconds,"
+                " postprocess_seconds, total_seconds, throughput, job_id)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (video_id, title, format_key, section_text, status, error, file_name,
+                 size, started_at, timings.get('extract'), download_seconds,
+                 timings.get('postprocess'), timings.get('total'), throughput, job_id)
+            )
+            return cursor.lastrowid
+
+    @staticmethod
+    def _filters(status=None, format_key=None, title=None, job_ids=None):
+        clauses, params = [], []
+        if job_ids is not None:
+            # Restreint aux tâches d'une session (aucune tâche : aucune ligne)
+            job_ids = list(job_ids)
+            clauses.append(f"job_id IN ({', '.join('?' * len(job_ids))})" if job_ids else "0")
+            params.extend(job_ids)
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if format_key:
+            clauses.append("format = ?")
+            params.append(format_key)
+        if title:
+            clauses.append("title LIKE ? ESCAPE '\\'")
+            escaped = title.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            params.append(f"%{escaped}%")
+        return clauses, params
+
+    def page(self, limit=10, before_id=None, status=None, format_key=None, title=None, job_ids=None):
+        """
+        Retourne une page d'entrées, de la plus récente à la plus ancienne.
+        Pagination par curseur : passer l'ID de la dernière entrée reçue dans before_id
+        (reste rapide quelle que soit la profondeur de la page).
+        job_ids limite l'historique aux tâches données (celles d'une session).
+        """
+        clauses, params = self._filters(status, format_key, title, job_ids)
+        if before_id is not None:
+            clauses.append("id < ?")
+            params.append(before_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM downloads {where} ORDER BY id DESC LIMIT ?",
+                (*params, limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def count(self, status=None, format_key=None, title=None, job_ids=None):
+        clauses, params = self._filters(status, format_key, title, job_ids)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            return self._connection.execute(
+                f"SELECT COUNT(*) FROM downloads {where}", params
+            ).fetchone()[0]
+
+    def downloaded_video_ids(self, job_ids=None):
+        """IDs des vidéos déjà téléchargées avec succès (par les tâches job_ids si fourni)"""
+        clauses, params = self._filters(STATUS_DONE, job_ids=job_ids)
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT DISTINCT video_id FROM downloads WHERE {' AND '.join(clauses)}"
+                " AND video_id IS NOT NULL",
+                params
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def throughput_percentiles(self, since=None, bucket_seconds=86400):
+        """
+        p50/p95 du débit (octets/s) et du temps de post-traitement par période.
+        Retourne une liste de dicts triés par période.
+        """
+        since = since if since is not None else time.time() - 30 * 86400
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT CAST(started_at / ? AS INTEGER) AS bucket, throughput, postprocess_seconds"
+                " FROM downloads WHERE status = ? AND started_at >= ? AND throughput IS NOT NULL"
+                " ORDER BY bucket",
+                (bucket_seconds, STATUS_DONE, since)
+            ).fetchall()
+
+        buckets = {}
+        for bucket, throughput, postprocess in rows:
+            values = buckets.setdefault(bucket, ([], []))
+            values[0].append(throughput)
+            if postprocess is not None:
+                values[1].append(postprocess)
+
+        series = []
+        for bucket, (throughputs, postprocess) in buckets.items():
+            throughputs.sort()
+            postprocess.sort()
+            series.append({
+                'period_start': bucket * bucket_seconds,
+                'count': len(throughputs),
+                'throughput_p50': percentile(throughputs, 0.50),
+                'throughput_p95': percentile(throughputs, 0.95),
+                'postprocess_p50': percentile(postprocess, 0.50),
+                'postprocess_p95': percentile(postprocess, 0.95),
+            })
+        return series
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+_default_store = None
+_default_lock = threading.Lock()
+
+def get_history_store():
+    """Historique unique pour tout le processus (ouvert à la première utilisation)"""
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = HistoryStore()
+        return _default_store
@@ -0,0 +1,386 @@
+import os
+import time
+import logging
+import uuid
+import socket
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .core import download_media, CyberStreamError, DownloadCancelled, DEFAULT_DOWNLOAD_DEADLINE
+from .history import get_history_store, STATUS_DONE, STATUS_ERROR, STATUS_CANCELLED
+from .store import get_video_store
+from .utils import get_video_id
+
+logger = logging.getLogger(__name__)
+
+# Durée de conservation des tâches terminées et de leurs fichiers, en secondes
+DEFAULT_RETENTION = 3600
+PURGE_INTERVAL = 60
+
+# --- États des tâches ---
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_ERROR = "error"
+JOB_CANCELLED = "cancelled"
+
+_HISTORY_STATUS = {
+    JOB_DONE: STATUS_DONE,
+    JOB_ERROR: STATUS_ERROR,
+    JOB_CANCELLED: STATUS_CANCELLED,
+}
+
+class Job:
+    """Tâche de téléchargement suivie par le JobManager"""
+    __slots__ = ('id', 'url', 'format', 'section', 'format_selector', 'status',
+                 'progress', 'file_path', 'file_name', 'mime_type', 'error',
+                 'created_at', 'started_at', 'finished_at', 'deadline', 'cancel_event',
+                 'reused', 'precise_cuts', 'notices')
+
+    def __init__(self, url, format_key, section=None, format_selector=None, deadline=None,
+                 precise_cuts=False):
+        self.id = uuid.uuid4().hex
+        self.url = url
+        self.format = format_key
+        self.section = section
+        self.format_selector = format_selector
+        self.status = JOB_QUEUED
+        self.progress = 0.0
+        self.file_path = None
+        self.file_name = None
+        self.mime_type = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.deadline = deadline
+        self.cancel_event = threading.Event()
+        # Tâche identique déjà lancée par un autre réplica ou une autre session
+        self.reused = False
+        # Découpe réencodée à l'image près : file locale uniquement
+        self.precise_cuts = precise_cuts
+        # Messages (niveau, texte) du téléchargement, relayés par l'interface
+        self.notices = []
+
+    @property
+    def dedupe_key(self):
+        """Deux tâches de même clé produisent le même fichier"""
+        section = f"{self.section[0]:g}-{self.section[1]}" if self.section else ""
+        return f"{get_video_id(self.url) or self.url}|{self.format}|{section}|{self.format_selector or ''}"
+
+    def to_record(self):
+        """Représentation stockée dans le backend partagé"""
+        return {
+            'id': self.id,
+            'dedupe_key': self.dedupe_key,
+            'url': self.url,
+            'format': self.format,
+            'section': list(self.section) if self.section else None,
+            'format_selector': self.format_selector,
+            'deadline': self.deadline,
+            'status': self.status,
+            'progress': self.progress,
+            'worker': None,
+            'lease_until': None,
+            'cancel_requested': self.cancel_event.is_set(),
+            'file_name': self.file_name,
+            'mime_type': self.mime_type,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+    @classmethod
+    def from_record(cls, record):
+        job = cls(record['url'], record['format'],
+                  tuple(record['section']) if record['section'] else None,
+                  record['format_selector'], deadline=record['deadline'])
+        job.id = record['id']
+        for name in ('status', 'progress', 'file_name', 'mime_type', 'error',
+                     'created_at', 'started_at', 'finished_at'):
+            setattr(job, name, record[name])
+        if record['cancel_requested']:
+            job.cancel_event.set()
+        return job
+
+    @property
+    def finished(self):
+        return self.status in (JOB_DONE, JOB_ERROR, JOB_CANCELLED)
+
+    def to_dict(self):
+        """Représentation JSON (sans chemin local)"""
+        return {
+            'id': self.id,
+            'url': self.url,
+            'format': self.format,
+            'section': list(self.section) if self.section else None,
+            'format_selector': self.format_selector,
+            'status': self.status,
+            'progress': round(self.progress, 3),
+            'file_name': self.file_name,
+            'mime_type': self.mime_type,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'deadline': self.deadline,
+            'reused': self.reused,
+        }
+
+class JobManager:
+    """
+    File de téléchargements exécutée par un pool de workers.
+
+    Avec un backend partagé (voir shared.py), la file est commune à tous les
+    réplicas : les workers réservent les tâches dans le backend, renouvellent
+    leur bail et publient les fichiers dans l'ArtifactStore.
+    """
+
+    def __init__(self, workers=2, work_dir=None, history=None, deadline=DEFAULT_DOWNLOAD_DEADLINE,
+                 backend=None, artifacts=None, lease=30, poll_interval=0.5, retention=DEFAULT_RETENTION):
+        self.history = history or get_history_store()
+        self.deadline = deadline
+        self.retention = retention
+        self.work_dir = work_dir or tempfile.mkdtemp(prefix="cyberstream-")
+        os.makedirs(self.work_dir, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="download")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+        self.backend = backend
+        self._stopping = threading.Event()
+        if backend is not None:
+            from .shared import ArtifactStore
+            self.artifacts = artifacts or ArtifactStore()
+            self.replica_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+            self.lease = lease
+            self.poll_interval = poll_interval
+            self._wakeup = threading.Event()
+            for _ in range(workers):
+                self._executor.submit(self._poll_loop)
+            threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True).start()
+        if retention:
+            threading.Thread(target=self._purge_loop, name="job-purge", daemon=True).start()
+
+    def submit(self, url, format_key, section=None, format_selector=None, deadline=None,
+               precise_cuts=False):
+        """Met un téléchargement en file et retourne la tâche (délai en secondes)"""
+        job = Job(url, format_key, section, format_selector, deadline=deadline or self.deadline,
+                  precise_cuts=precise_cuts)
+        if self.backend is not None:
+            record, created = self.backend.submit(job.to_record())
+            if not created and record['status'] == JOB_DONE and \
+                    self.artifacts.path(record['id'], record['file_name']) is None:
+                # Fichier purgé ou volume perdu : la tâche terminée n'est plus réutilisable
+                self.backend.delete(record['id'])
+                record, created = self.backend.submit(job.to_record())
+            self._wakeup.set()
+            job = self._from_record(record)
+            job.reused = not created
+            return job
+        with self._lock:
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job)
+        return job
+
+    def _from_record(self, record):
+        job = Job.from_record(record)
+        if job.status == JOB_DONE:
+            job.file_path = self.artifacts.path(job.id, job.file_name)
+        return job
+
+    def get(self, job_id):
+        if self.backend is not None:
+            record = self.backend.get(job_id)
+            return self._from_record(record) if record else None
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self):
+        if self.backend is not None:
+            return [self._from_record(record) for record in self.backend.list()]
+        with self._lock:
+            return list(self._jobs.values())
+
+    def _poll_loop(self):
+        """Worker du mode partagé : réserve et exécute les tâches de la file commune"""
+        while not self._stopping.is_set():
+            try:
+                record = self.backend.claim(self.replica_id, self.lease)
+            except Exception:
+                record = None
+            if record is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            job = Job.from_record(record)
+            with self._lock:
+                self._jobs[job.id] = job
+            try:
+                self._run(job)
+            except Exception:
+                # Backend injoignable à la fin de la tâche : le bail expirera et
+                # un autre réplica la reprendra ; ce worker continue
+                logger.exception("Tâche %s : finalisation impossible", job.id)
+            finally:
+                with self._lock:
+                    self._jobs.pop(job.id, None)
+
+    def _purge_loop(self):
+        """Expire régulièrement les tâches terminées et leurs fichiers"""
+        while not self._stopping.wait(PURGE_INTERVAL):
+            try:
+                self.purge(max_age=self.retention)
+            except Exception:
+                logger.exception("Purge des tâches impossible")
+
+    def _heartbeat_loop(self):
+        """Renouvelle les baux, publie la progression et relaie les annulations"""
+        interval = min(1.0, self.lease / 3)
+        while not self._stopping.wait(interval):
+            with self._lock:
+                running = list(self._jobs.values())
+            for job in running:
+                try:
+                    if not self.backend.heartbeat(job.id, self.replica_id, self.lease, job.progress):
+                        job.cancel_event.set()
+                except Exception:
+                    # Backend momentanément injoignable : le bail couvre la coupure
+                    pass
+
+    def cancel(self, job_id):
+        """
+        Annule une tâche : retirée de la file si elle n'a pas démarré, sinon
+        yt-dlp et ses FFmpeg sont tués et le répertoire de travail supprimé.
+        """
+        if self.backend is not None:
+            self.backend.cancel(job_id)
+            with self._lock:
+                local = self._jobs.get(job_id)
+            if local:
+                local.cancel_event.set()
+            return self.get(job_id)
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return job
+        job.cancel_event.set()
+        return job
+
+    def _run(self, job):
+        if job.cancel_event.is_set():
+            job.status = JOB_CANCELLED
+            job.error = "Téléchargement annulé"
+            job.finished_at = time.time()
+            if self.backend is not None:
+                self._complete_shared(job, {})
+            else:
+                self._record_history(job, {})
+            return
+        job.status = JOB_RUNNING
+        job.started_at = time.time()
+        job_dir = os.path.join(self.work_dir, job.id)
+        os.makedirs(job_dir, exist_ok=True)
+
+        def on_progress(value):
+            job.progress = value
+
+        def on_notice(level, message):
+            job.notices.append((level, message))
+
+        timings = {}
+        try:
+            job.file_path, job.file_name, job.mime_type = download_media(
+                job.url, job.format, job_dir, progress=on_progress, notify=on_notice,
+                section=job.section, precise_cuts=job.precise_cuts, format_selector=job.format_selector,
+                timings=timings, deadline=job.deadline, cancel_event=job.cancel_event
+            )
+            job.status = JOB_DONE
+        except DownloadCancelled as e:
+            job.error = str(e)
+            job.status = JOB_CANCELLED
+        except CyberStreamError as e:
+            job.error = str(e)
+            job.status = JOB_ERROR
+        except Exception as e:
+            job.error = f"Erreur inattendue: {e}"
+            job.status = JOB_ERROR
+        finally:
+            job.finished_at = time.time()
+            try:
+                if self.backend is not None:
+                    self._complete_shared(job, timings)
+                else:
+                    self._record_history(job, timings)
+            finally:
+                # En mode partagé, le fichier a été déplacé dans le magasin commun
+                if self.backend is not None or job.status != JOB_DONE:
+                    shutil.rmtree(job_dir, ignore_errors=True)
+
+    def _complete_shared(self, job, timings):
+        if job.status == JOB_CANCELLED and self._stopping.is_set():
+            # Interrompue par l'arrêt du réplica : un autre la reprendra
+            self.backend.release(job.id, self.replica_id)
+            return
+        if job.status == JOB_DONE:
+            try:
+                job.file_path = self.artifacts.publish(job.id, job.file_path, job.file_name)
+            except OSError as e:
+                job.status = JOB_ERROR
+                job.error = f"Publication impossible: {e}"
+        self._record_history(job, timings)
+        self.backend.finish(job.id, self.replica_id, job.status, file_name=job.file_name,
+                            mime_type=job.mime_type, error=job.error)
+
+    def _record_history(self, job, timings):
+        video_id = get_video_id(job.url)
+        record = get_video_store().get(video_id)
+        try:
+            self.history.record(
+                video_id, record.title if record else None, job.format,
+                _HISTORY_STATUS.get(job.status, STATUS_ERROR),
+                job.started_at or job.created_at, timings=timings, file_path=job.file_path,
+                file_name=job.file_name, error=job.error, section=job.section, job_id=job.id
+            )
+        except Exception:
+            # L'historique ne doit jamais faire échouer un téléchargement
+            pass
+
+    def remove(self, job_id):
+        """Oublie une tâche et supprime ses fichiers"""
+        if self.backend is not None:
+            job = self.get(job_id)
+            self.backend.delete(job_id)
+            self.artifacts.remove(job_id)
+            return job
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+        if job:
+            job.cancel_event.set()
+            shutil.rmtree(os.path.join(self.work_dir, job.id), ignore_errors=True)
+        return job
+
+    def purge(self, max_age=3600):
+        """Supprime les tâches terminées depuis plus de max_age secondes"""
+        if self.backend is not None:
+            for job_id in self.backend.purge(max_age):
+                self.artifacts.remove(job_id)
+            return
+        limit = time.time() - max_age
+        for job in self.list():
+            if job.finished_at and job.finished_at < limit:
+                self.remove(job.id)
+
+    def shutdown(self, wait=True):
+        """Arrête les workers en annulant les tâches en cours ou en attente"""
+        self._stopping.set()
+        if self.backend is not None:
+            self._wakeup.set()
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            if not job.finished:
+                job.cancel_event.set()
+        self._executor.shutdown(wait=wait)
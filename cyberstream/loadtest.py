@@ -0,0 +1,399 @@
+import os
+import gc
+import importlib
+import sys
+import time
+import logging
+import stat
+import shutil
+import tempfile
+import threading
+
+from .cache import get_search_cache
+from .extractors import reset_extractor_router
+from .history import percentile
+
+# --- Test de charge de l'interface Streamlit ---
+#
+# N sessions simulées parcourent l'application avec AppTest (Streamlit headless,
+# dans ce processus) : recherche, pagination, sélection, téléchargement. YouTube
+# est remplacé par un yt-dlp/FFmpeg factice hors ligne, avec une latence
+# réglable, pour que seuls le coût de l'application et de ses sous-processus
+# soient mesurés. Le nombre de sessions augmente par paliers jusqu'à saturation.
+
+FLOW_STEPS = ("load", "search", "paginate", "select", "download")
+# Le premier chargement inclut l'animation du titre (2 s) : le SLO ne porte que sur les interactions
+INTERACTION_STEPS = ("search", "paginate", "select", "download")
+
+# Amorçage : paliers non mesurés jusqu'à stabilisation de la RSS
+WARMUP_MAX_ROUNDS = 3
+WARMUP_RSS_TOLERANCE = 8 * 1024 * 1024
+
+# yt-dlp hors ligne : même interface, réponses déterministes
+_STANDIN_YT_DLP = r'''#!{python}
+import os, sys, json, time, hashlib
+
+LATENCY = float(os.environ.get("CYBERSTREAM_STANDIN_LATENCY", "0.2"))
+SIZE = int(os.environ.get("CYBERSTREAM_STANDIN_BYTES", str(2 * 1024 * 1024)))
+ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_"
+
+def video_id(seed):
+    digest = hashlib.sha256(seed.encode()).digest()
+    return "".join(ALPHABET[b % 64] for b in digest[:11])
+
+def video(vid, title):
+    return {{
+        "id": vid, "title": title, "channel": "Chaîne hors ligne", "duration": 212,
+        "view_count": 1000 + sum(map(ord, vid)), "upload_date": "20240101",
+        "description": "Vidéo factice du test de charge", "thumbnail": None,
+        "webpage_url": f"https://www.youtube.com/watch?v={{vid}}",
+        "formats": [
+            {{"format_id": "18", "ext": "mp4", "height": 360, "vcodec": "avc1", "acodec": "mp4a", "tbr": 600}},
+            {{"format_id": "136", "ext": "mp4", "height": 720, "vcodec": "avc1", "acodec": "none", "tbr": 1500}},
+            {{"format_id": "140", "ext": "m4a", "vcodec": "none", "acodec": "mp4a", "tbr": 128}},
+        ],
+    }}
+
+args = sys.argv[1:]
+if "--version" in args:
+    print("2099.01.01-offline")
+    sys.exit(0)
+time.sleep(LATENCY)
+if "--simulate" in args:
+    sys.exit(0)
+targets = [a for a in args if a.startswith(("ytsearch", "http"))]
+if "--dump-json" in args:
+    for target in targets:
+        if target.startswith("ytsearch"):
+            count, query = target[len("ytsearch"):].split(":", 1)
+            for i in range(int(count or 1)):
+                print(json.dumps(video(video_id(f"{{query}}/{{i}}"), f"{{query.strip(chr(34))}} #{{i + 1}}")))
+        else:
+            vid = target.rsplit("=", 1)[-1].rsplit("/", 1)[-1]
+            print(json.dumps(video(vid, f"Vidéo {{vid}}")))
+    sys.exit(0)
+if "-g" in args:
+    for target in targets:
+        print(f"http://127.0.0.1:9/offline/{{video_id(target)}}.mp4")
+    sys.exit(0)
+
+output = args[args.index("-o") + 1]
+ext = "mp3" if "-x" in args else "mp4"
+chunk = b"\0" * 65536
+if output == "-":
+    for _ in range(SIZE // len(chunk)):
+        sys.stdout.buffer.write(chunk)
+    sys.exit(0)
+path = (output.replace("%(title).100s", "offline").replace("%(title).90s", "offline")
+        .replace("%(section_start)d", "0").replace("%(section_end)d", "0").replace("%(ext)s", ext))
+with open(path, "wb") as f:
+    written = 0
+    while written < SIZE:
+        f.write(chunk)
+        written += len(chunk)
+        print(f"[download] {{100 * written / SIZE:5.1f}}% of {{SIZE}}B", flush=True)
+        time.sleep(LATENCY / 10)
+'''
+
+_STANDIN_FFMPEG = r'''#!{python}
+import sys, shutil
+if "-version" in sys.argv:
+    print("ffmpeg version offline")
+elif "pipe:1" in sys.argv:
+    shutil.copyfileobj(sys.stdin.buffer, sys.stdout.buffer)
+'''
+
+def write_offline_standin(directory):
+    """Écrit yt-dlp et ffmpeg factices dans directory (à placer en tête du PATH)"""
+    os.makedirs(directory, exist_ok=True)
+    for name, source in (("yt-dlp", _STANDIN_YT_DLP), ("ffmpeg", _STANDIN_FFMPEG)):
+        path = os.path.join(directory, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(source.format(python=sys.executable))
+        os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return directory
+
+# --- Mesures du processus ---
+def current_rss():
+    """Mémoire résidente du processus en octets (None si non mesurable)"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Octets sous macOS, kilo-octets ailleurs (valeur de pic, pas instantanée)
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        return None
+
+def descendant_pids(root_pid=None):
+    """PIDs des sous-processus (enfants et petits-enfants) ; None hors Linux"""
+    root_pid = root_pid or os.getpid()
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return None
+    children = {}
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # Le nom du processus peut contenir des espaces : on repart de la dernière ')'
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        children.setdefault(int(fields[1]), []).append(int(entry))
+    found, pending = set(), [root_pid]
+    while pending:
+        for pid in children.get(pending.pop(), ()):
+            if pid not in found:
+                found.add(pid)
+                pending.append(pid)
+    return found
+
+class SubprocessSampler:
+    """Échantillonne en continu les sous-processus du processus courant"""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.samples = []
+        self.seen = set()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="subprocess-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            pids = descendant_pids()
+            if pids is None:
+                return
+            self.samples.append(len(pids))
+            self.seen.update(pids)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def to_dict(self):
+        if not self.samples:
+            return {'peak': None, 'mean': None, 'spawned': None}
+        return {
+            'peak': max(self.samples),
+            'mean': sum(self.samples) / len(self.samples),
+            # Approximation : un processus plus court que l'intervalle peut échapper au comptage
+            'spawned': len(self.seen),
+        }
+
+# --- Sessions simulées ---
+class SessionResult:
+    """Latences d'une session, par étape du parcours"""
+    __slots__ = ('index', 'latencies', 'errors', 'app')
+
+    def __init__(self, index):
+        self.index = index
+        self.latencies = {}
+        self.errors = []
+        self.app = None
+
+def _find_button(app, label=None, key_prefix=None):
+    for button in app.button:
+        if label is not None and button.label == label:
+            return button
+        if key_prefix is not None and (button.key or "").startswith(key_prefix):
+            return button
+    return None
+
+def run_session(app_path, index, query, flow=FLOW_STEPS, timeout=120):
+    """Parcours complet d'une session ; chaque interaction est une relance du script"""
+    from streamlit.testing.v1 import AppTest
+
+    result = SessionResult(index)
+    app = AppTest.from_file(app_path, default_timeout=timeout)
+    result.app = app
+
+    def step(name, action):
+        if name not in flow:
+            return
+        started = time.perf_counter()
+        try:
+            action()
+        except Exception as e:
+            result.errors.append(f"{name}: {e}")
+            return
+        result.latencies[name] = time.perf_counter() - started
+        if app.exception:
+            result.errors.append(f"{name}: {app.exception[0].message}")
+
+    def click(label=None, key_prefix=None):
+        button = _find_button(app, label=label, key_prefix=key_prefix)
+        if button is None:
+            raise LookupError(f"Bouton introuvable: {label or key_prefix}")
+        button.click().run()
+
+    def search():
+        app.text_input(key="search_input").set_value(query)
+        click(label="🚀 Lancer la recherche")
+
+    step("load", app.run)
+    step("search", search)
+    step("paginate", lambda: click(label="Suivant ➡️"))
+    step("select", lambda: click(key_prefix="select_"))
+    step("download", lambda: click(label="⬇️ Télécharger"))
+    return result
+
+def run_level(app_path, sessions, query, distinct_queries, flow, timeout):
+    """Lance `sessions` parcours simultanés et agrège leurs mesures"""
+    import streamlit as st
+
+    # Chaque palier part de caches vides pour rester comparable aux autres
+    st.cache_data.clear()
+    get_search_cache().clear()
+    gc.collect()
+    rss_before = current_rss()
+    results = [None] * sessions
+
+    def worker(index):
+        session_query = f"{query} {index % distinct_queries}" if distinct_queries > 1 else query
+        try:
+            results[index] = run_session(app_path, index, session_query, flow, timeout)
+        except Exception as e:
+            results[index] = SessionResult(index)
+            results[index].errors.append(str(e))
+
+    started = time.perf_counter()
+    with SubprocessSampler() as sampler:
+        threads = [threading.Thread(target=worker, args=(i,), name=f"session-{i}") for i in range(sessions)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    elapsed = time.perf_counter() - started
+    # Les sessions sont encore en mémoire : l'écart de RSS leur est imputable
+    rss_after = current_rss()
+
+    latencies = {name: sorted(r.latencies[name] for r in results if name in r.latencies) for name in flow}
+    all_latencies = sorted(value for values in latencies.values() for value in values)
+    interactions = sorted(value for name, values in latencies.items()
+                          if name in INTERACTION_STEPS for value in values)
+    errors = [error for r in results for error in r.errors]
+    reruns = len(all_latencies)
+    report = {
+        'sessions': sessions,
+        'elapsed': elapsed,
+        'reruns': reruns,
+        'reruns_per_second': reruns / elapsed if elapsed else None,
+        'latency': {
+            'p50': percentile(all_latencies, 0.50),
+            'p95': percentile(all_latencies, 0.95),
+            'p99': percentile(all_latencies, 0.99),
+            'max': all_latencies[-1] if all_latencies else None,
+        },
+        'interaction_latency': {
+            'p50': percentile(interactions, 0.50),
+            'p95': percentile(interactions, 0.95),
+            'p99': percentile(interactions, 0.99),
+        },
+        'steps': {
+            name: {'p50': percentile(values, 0.50), 'p95': percentile(values, 0.95)}
+            for name, values in latencies.items()
+        },
+        'rss_per_session': (rss_after - rss_before) / sessions if rss_before and rss_after else None,
+        'rss_total': rss_after,
+        'subprocesses': sampler.to_dict(),
+        'errors': errors[:20],
+        'error_count': len(errors),
+    }
+    for r in results:
+        r.app = None
+    return report
+
+def find_saturation(levels, slo=2.0, min_gain=0.1):
+    """
+    Premier palier saturé : p95 des interactions (hors premier chargement)
+    au-dessus du SLO, erreurs, ou débit de relances qui progresse de moins de
+    min_gain alors que les sessions augmentent.
+    """
+    previous = None
+    for level in levels:
+        p95 = level['interaction_latency']['p95']
+        if p95 is None:
+            # Parcours réduit au seul chargement
+            p95 = level['latency']['p95']
+        if level['error_count'] or (p95 is not None and p95 > slo):
+            return level['sessions']
+        if previous and previous['reruns_per_second'] and level['reruns_per_second'] is not None:
+            if level['reruns_per_second'] < previous['reruns_per_second'] * (1 + min_gain):
+                return level['sessions']
+        previous = level
+    return None
+
+def run_load_test(app_path, levels=(1, 2, 4, 8), query="musique", distinct_queries=4,
+                  flow=FLOW_STEPS, latency=0.2, slo=2.0, timeout=120, progress=None):
+    """
+    Exécute les paliers de charge contre le yt-dlp hors ligne et retourne le
+    rapport (latences par palier, RSS par session, sous-processus, saturation).
+    """
+    try:
+        importlib.import_module("streamlit.testing.v1")
+    except ImportError:
+        from .core import DependencyError
+        raise DependencyError("streamlit (avec streamlit.testing) est requis pour le test de charge.")
+
+    workspace = tempfile.mkdtemp(prefix="cyberstream-load-")
+    standin_dir = write_offline_standin(os.path.join(workspace, "bin"))
+    saved_environ = dict(os.environ)
+    os.environ.update({
+        'PATH': standin_dir + os.pathsep + os.environ.get('PATH', ''),
+        'CYBERSTREAM_STANDIN_LATENCY': str(latency),
+        'CYBERSTREAM_CACHE_DIR': os.path.join(workspace, "cache"),
+        'CYBERSTREAM_HISTORY_DB': os.path.join(workspace, "history.db"),
+        # yt-dlp seul : un repli sur pytubefix interrogerait le vrai YouTube
+        'CYBERSTREAM_EXTRACTORS': 'yt-dlp',
+    })
+    # Les sessions utilisent le même processus : pas de file partagée entre réplicas
+    os.environ.pop('CYBERSTREAM_BACKEND', None)
+    reset_extractor_router()
+    reports = []
+    # Les avertissements Streamlit émis à chaque relance noieraient le rapport
+    logging.disable(logging.WARNING)
+    try:
+        # Paliers d'amorçage non mesurés, par le même chemin (threads compris) :
+        # imports, compilation du script, caches de ressources et arènes mémoire
+        # ne doivent pas être imputés au premier palier
+        for _ in range(WARMUP_MAX_ROUNDS):
+            rss_before = current_rss()
+            run_level(os.path.abspath(app_path), 1, query, distinct_queries, flow, timeout)
+            rss_after = current_rss()
+            if not rss_before or not rss_after or rss_after - rss_before < WARMUP_RSS_TOLERANCE:
+                break
+        for sessions in levels:
+            report = run_level(os.path.abspath(app_path), sessions, query, distinct_queries,
+                               flow, timeout)
+            reports.append(report)
+            if progress:
+                progress(report)
+    finally:
+        logging.disable(logging.NOTSET)
+        os.environ.clear()
+        os.environ.update(saved_environ)
+        reset_extractor_router()
+        shutil.rmtree(workspace, ignore_errors=True)
+
+    return {
+        'app': app_path,
+        'flow': list(flow),
+        'standin_latency': latency,
+        'slo': slo,
+        'levels': reports,
+        'saturation': find_saturation(reports, slo=slo),
+    }
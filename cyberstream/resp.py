@@ -0,0 +1,288 @@
+import socket
+import threading
+import socketserver
+from collections import deque
+from urllib.parse import urlparse
+
+# --- Protocole Redis (RESP) ---
+#
+# Client minimal pour un serveur compatible Redis (Redis, Valkey, KeyDB...) et
+# serveur de remplacement local, en mémoire, qui implémente uniquement les
+# commandes utilisées par la file partagée. Aucune dépendance externe.
+
+class RespError(Exception):
+    """Erreur renvoyée par le serveur"""
+
+def _encode(arguments):
+    parts = [f"*{len(arguments)}\r\n".encode()]
+    for argument in arguments:
+        if isinstance(argument, bytes):
+            data = argument
+        else:
+            data = str(argument).encode('utf-8')
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+def _read_reply(stream):
+    line = stream.readline()
+    if not line:
+        raise ConnectionError("Connexion fermée par le serveur")
+    kind, payload = line[:1], line[1:-2]
+    if kind == b'+':
+        return payload.decode('utf-8')
+    if kind == b'-':
+        raise RespError(payload.decode('utf-8'))
+    if kind == b':':
+        return int(payload)
+    if kind == b'$':
+        length = int(payload)
+        if length < 0:
+            return None
+        data = stream.read(length + 2)[:-2]
+        return data.decode('utf-8')
+    if kind == b'*':
+        count = int(payload)
+        if count < 0:
+            return None
+        return [_read_reply(stream) for _ in range(count)]
+    raise RespError(f"Réponse inattendue: {line!r}")
+
+class RespClient:
+    """Connexion unique, partagée entre threads, vers un serveur compatible Redis"""
+
+    def __init__(self, host="127.0.0.1", port=6379, db=0, password=None, timeout=10):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self._socket = None
+        self._stream = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_url(cls, url, timeout=10):
+        """redis://[:motdepasse@]hôte:port/base"""
+        parsed = urlparse(url)
+        db = parsed.path.strip('/')
+        return cls(parsed.hostname or "127.0.0.1", parsed.port or 6379,
+                   db=int(db) if db else 0, password=parsed.password, timeout=timeout)
+
+    def _connect(self):
+        self._socket = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._stream = self._socket.makefile('rb')
+        if self.password:
+            self._call(('AUTH', self.password))
+        if self.db:
+            self._call(('SELECT', self.db))
+
+    def _call(self, arguments):
+        self._socket.sendall(_encode(arguments))
+        return _read_reply(self._stream)
+
+    def execute(self, *arguments):
+        """Envoie une commande et retourne la réponse décodée"""
+        with self._lock:
+            # Une seule reconnexion : le serveur a pu fermer une connexion inactive
+            for attempt in range(2):
+                try:
+                    if self._socket is None:
+                        self._connect()
+                    return self._call(arguments)
+                except (ConnectionError, OSError):
+                    self._close()
+                    if attempt:
+                        raise
+
+    def _close(self):
+        if self._socket is not None:
+            try:
+                self._socket.close()
+            except OSError:
+                pass
+        self._socket = self._stream = None
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+# --- Serveur de remplacement local ---
+
+class _Database:
+    """Données du serveur : chaînes, hash, listes et ensembles triés"""
+
+    def __init__(self):
+        self.keys = {}
+        self.lock = threading.Lock()
+
+    def _typed(self, key, kind):
+        value = self.keys.get(key)
+        if value is None:
+            value = kind()
+            self.keys[key] = value
+        elif not isinstance(value, kind):
+            raise RespError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        return value
+
+    def _drop_empty(self, key):
+        if not self.keys.get(key, True):
+            del self.keys[key]
+
+    def execute(self, name, arguments):
+        handler = getattr(self, f"cmd_{name.lower()}", None)
+        if handler is None:
+            raise RespError(f"ERR unknown command '{name}'")
+        with self.lock:
+            return handler(*arguments)
+
+    def cmd_ping(self, *arguments):
+        return arguments[0] if arguments else "PONG"
+
+    def cmd_select(self, db):
+        return "OK"
+
+    def cmd_auth(self, *arguments):
+        return "OK"
+
+    def cmd_flushdb(self):
+        self.keys.clear()
+        return "OK"
+
+    def cmd_get(self, key):
+        value = self.keys.get(key)
+        if value is not None and not isinstance(value, str):
+            raise RespError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        return value
+
+    def cmd_set(self, key, value, *options):
+        if 'NX' in (option.upper() for option in options) and key in self.keys:
+            return None
+        self.keys[key] = value
+        return "OK"
+
+    def cmd_del(self, *keys):
+        return sum(self.keys.pop(key, None) is not None for key in keys)
+
+    def cmd_hset(self, key, *pairs):
+        values = self._typed(key, dict)
+        added = 0
+        for field, value in zip(pairs[::2], pairs[1::2]):
+            added += field not in values
+            values[field] = value
+        return added
+
+    def cmd_hget(self, key, field):
+        return self._typed(key, dict).get(field) if key in self.keys else None
+
+    def cmd_hgetall(self, key):
+        if key not in self.keys:
+            return []
+        return [item for pair in self._typed(key, dict).items() for item in pair]
+
+    def cmd_lpush(self, key, *values):
+        items = self._typed(key, deque)
+        items.extendleft(values)
+        return len(items)
+
+    def cmd_rpush(self, key, *values):
+        items = self._typed(key, deque)
+        items.extend(values)
+        return len(items)
+
+    def cmd_rpop(self, key):
+        if key not in self.keys:
+            return None
+        value = self._typed(key, deque).pop()
+        self._drop_empty(key)
+        return value
+
+    def cmd_lrem(self, key, count, value):
+        if key not in self.keys:
+            return 0
+        items = self._typed(key, deque)
+        kept = deque(item for item in items if item != value)
+        removed = len(items) - len(kept)
+        self.keys[key] = kept
+        self._drop_empty(key)
+        return removed
+
+    def cmd_zadd(self, key, *pairs):
+        scores = self._typed(key, _SortedSet)
+        added = 0
+        for score, member in zip(pairs[::2], pairs[1::2]):
+            added += member not in scores
+            scores[member] = float(score)
+        return added
+
+    def cmd_zrem(self, key, *members):
+        if key not in self.keys:
+            return 0
+        scores = self._typed(key, _SortedSet)
+        removed = sum(scores.pop(member, None) is not None for member in members)
+        self._drop_empty(key)
+        return removed
+
+    def cmd_zrangebyscore(self, key, low, high):
+        if key not in self.keys:
+            return []
+        # float() accepte aussi "-inf" et "+inf"
+        low, high = float(low), float(high)
+        return [member for member, score in self._typed(key, _SortedSet).ordered()
+                if low <= score <= high]
+
+    def cmd_zrevrange(self, key, start, stop):
+        if key not in self.keys:
+            return []
+        members = [member for member, _ in reversed(self._typed(key, _SortedSet).ordered())]
+        start, stop = int(start), int(stop)
+        return members[start:(stop + 1) or None]
+
+class _SortedSet(dict):
+    """Membre -> score ; le tri est fait à la lecture"""
+
+    def ordered(self):
+        return sorted(self.items(), key=lambda item: (item[1], item[0]))
+
+class _RespHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        database = self.server.database
+        while True:
+            try:
+                request = _read_reply(self.rfile)
+            except (ConnectionError, OSError, ValueError):
+                return
+            if not isinstance(request, list) or not request:
+                return
+            try:
+                reply = database.execute(request[0], request[1:])
+            except RespError as e:
+                self.wfile.write(f"-{e}\r\n".encode('utf-8'))
+                continue
+            except TypeError:
+                self.wfile.write(f"-ERR wrong number of arguments for '{request[0]}'\r\n".encode())
+                continue
+            self.wfile.write(_encode_reply(reply))
+
+def _encode_reply(reply):
+    if reply is None:
+        return b"$-1\r\n"
+    if reply == "OK" or reply == "PONG":
+        return f"+{reply}\r\n".encode()
+    if isinstance(reply, int):
+        return f":{reply}\r\n".encode()
+    if isinstance(reply, list):
+        return b"*%d\r\n" % len(reply) + b"".join(_encode_reply(item) for item in reply)
+    data = str(reply).encode('utf-8')
+    return b"$%d\r\n%s\r\n" % (len(data), data)
+
+class LocalRedisServer(socketserver.ThreadingTCPServer):
+    """
+    Remplaçant local d'un serveur Redis, en mémoire, pour développer et tester
+    le mode multi-réplicas sans installer Redis. Les données sont perdues à l'arrêt.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address=("127.0.0.1", 6379)):
+        super().__init__(address, _RespHandler)
+        self.database = _Database()
@@ -0,0 +1,399 @@
+import os
+import json
+import time
+import shutil
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from .jobs import JOB_QUEUED, JOB_RUNNING, JOB_DONE, JOB_CANCELLED
+from .resp import RespClient
+
+# --- Coordination entre réplicas ---
+#
+# Plusieurs réplicas (Streamlit ou API) partagent une file de tâches : une
+# tâche identique déjà en file, en cours ou terminée n'est pas relancée, et un
+# réplica libre prend le travail en attente des autres. Chaque tâche réservée
+# porte un bail renouvelé par son réplica ; un bail expiré (réplica arrêté)
+# remet la tâche en file. Les fichiers produits sont publiés dans un répertoire
+# commun (ArtifactStore), lisible par tous les réplicas.
+#
+#   CYBERSTREAM_BACKEND=sqlite                    (un seul hôte, ~/.cyberstream/queue.db)
+#   CYBERSTREAM_BACKEND=sqlite:////chemin/queue.db
+#   CYBERSTREAM_BACKEND=redis://hôte:6379/0       (plusieurs hôtes, serveur compatible Redis)
+
+DEFAULT_QUEUE_PATH = os.path.join(os.path.expanduser("~"), ".cyberstream", "queue.db")
+DEFAULT_ARTIFACT_DIR = os.path.join(os.path.expanduser("~"), ".cyberstream", "artifacts")
+
+# Statuts pour lesquels une tâche identique est réutilisée plutôt que relancée
+_REUSABLE = (JOB_QUEUED, JOB_RUNNING, JOB_DONE)
+
+_FIELDS = ('id', 'dedupe_key', 'url', 'format', 'section', 'format_selector', 'deadline',
+           'status', 'progress', 'worker', 'lease_until', 'cancel_requested',
+           'file_name', 'mime_type', 'error', 'created_at', 'started_at', 'finished_at')
+
+# --- Fichiers produits ---
+class ArtifactStore:
+    """Répertoire commun des fichiers produits, un sous-répertoire par tâche"""
+
+    def __init__(self, root=None):
+        self.root = root or os.environ.get("CYBERSTREAM_ARTIFACT_DIR", DEFAULT_ARTIFACT_DIR)
+        os.makedirs(self.root, exist_ok=True)
+
+    def publish(self, job_id, file_path, file_name):
+        """Déplace le fichier dans le magasin ; il n'apparaît qu'une fois complet"""
+        job_dir = os.path.join(self.root, job_id)
+        os.makedirs(job_dir, exist_ok=True)
+        final_path = os.path.join(job_dir, file_name)
+        partial_path = os.path.join(job_dir, f".{file_name}.partial")
+        shutil.move(file_path, partial_path)
+        os.replace(partial_path, final_path)
+        return final_path
+
+    def path(self, job_id, file_name):
+        if not file_name:
+            return None
+        file_path = os.path.join(self.root, job_id, file_name)
+        return file_path if os.path.exists(file_path) else None
+
+    def remove(self, job_id):
+        shutil.rmtree(os.path.join(self.root, job_id), ignore_errors=True)
+
+# --- Un seul hôte : SQLite ---
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    dedupe_key TEXT NOT NULL,
+    url TEXT NOT NULL,
+    format TEXT NOT NULL,
+    section TEXT,
+    format_selector TEXT,
+    deadline REAL,
+    status TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_until REAL,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    file_name TEXT,
+    mime_type TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_dedupe ON jobs (dedupe_key, status);
+CREATE INDEX IF NOT EXISTS idx_jobs_finished ON jobs (finished_at);
+"""
+
+class SQLiteBackend:
+    """
+    File partagée par les processus d'un même hôte. BEGIN IMMEDIATE prend le
+    verrou d'écriture du fichier : réservation et déduplication sont atomiques
+    entre processus.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or DEFAULT_QUEUE_PATH
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, timeout=30, isolation_level=None,
+                                           check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.executescript(_SCHEMA)
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._connection
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+
+    @staticmethod
+    def _decode(row):
+        if row is None:
+            return None
+        record = dict(row)
+        record['section'] = json.loads(record['section']) if record['section'] else None
+        record['cancel_requested'] = bool(record['cancel_requested'])
+        return record
+
+    def _select(self, connection, job_id):
+        return self._decode(connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def submit(self, record):
+        """Ajoute la tâche, ou retourne une tâche identique existante. -> (tâche, créée)"""
+        with self._transaction() as db:
+            row = db.execute(
+                f"SELECT * FROM jobs WHERE dedupe_key = ? AND status IN ({', '.join('?' * len(_REUSABLE))})"
+                " ORDER BY created_at DESC LIMIT 1",
+                (record['dedupe_key'], *_REUSABLE)
+            ).fetchone()
+            if row is not None:
+                return self._decode(row), False
+            values = dict(record, section=json.dumps(record['section']) if record['section'] else None)
+            db.execute(
+                f"INSERT INTO jobs ({', '.join(_FIELDS)}) VALUES ({', '.join('?' * len(_FIELDS))})",
+                tuple(values.get(field) for field in _FIELDS)
+            )
+        return record, True
+
+    def claim(self, worker, lease):
+        """Réserve la plus ancienne tâche en file (ou abandonnée) pour ce worker"""
+        now = time.time()
+        with self._transaction() as db:
+            # Bail expiré : le réplica qui la traitait a disparu
+            db.execute("UPDATE jobs SET status = ?, worker = NULL, lease_until = NULL"
+                       " WHERE status = ? AND lease_until < ?", (JOB_QUEUED, JOB_RUNNING, now))
+            row = db.execute("SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1",
+                             (JOB_QUEUED,)).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE jobs SET status = ?, worker = ?, lease_until = ?,"
+                       " started_at = COALESCE(started_at, ?) WHERE id = ?",
+                       (JOB_RUNNING, worker, now + lease, now, row['id']))
+            return self._select(db, row['id'])
+
+    def heartbeat(self, job_id, worker, lease, progress):
+        """Renouvelle le bail. Retourne False si la tâche doit s'arrêter (annulée ou reprise)"""
+        with self._transaction() as db:
+            cursor = db.execute("UPDATE jobs SET lease_until = ?, progress = ?"
+                                " WHERE id = ? AND worker = ? AND status = ?",
+                                (time.time() + lease, progress, job_id, worker, JOB_RUNNING))
+            if not cursor.rowcount:
+                return False
+            row = db.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            return not row['cancel_requested']
+
+    def finish(self, job_id, worker, status, file_name=None, mime_type=None, error=None):
+        with self._transaction() as db:
+            db.execute("UPDATE jobs SET status = ?, file_name = ?, mime_type = ?, error = ?,"
+                       " finished_at = ?, lease_until = NULL,"
+                       " progress = CASE WHEN ? = ? THEN 1.0 ELSE progress END"
+                       " WHERE id = ? AND worker = ?",
+                       (status, file_name, mime_type, error, time.time(),
+                        status, JOB_DONE, job_id, worker))
+
+    def release(self, job_id, worker):
+        """Remet en file une tâche interrompue par l'arrêt du réplica"""
+        with self._transaction() as db:
+            db.execute("UPDATE jobs SET status = CASE WHEN cancel_requested THEN ? ELSE ? END,"
+                       " worker = NULL, lease_until = NULL WHERE id = ? AND worker = ?",
+                       (JOB_CANCELLED, JOB_QUEUED, job_id, worker))
+
+    def cancel(self, job_id):
+        with self._transaction() as db:
+            db.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status IN (?, ?)",
+                       (job_id, JOB_QUEUED, JOB_RUNNING))
+            # Pas encore réservée : annulée immédiatement
+            db.execute("UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ? AND status = ?",
+                       (JOB_CANCELLED, "Téléchargement annulé", time.time(), job_id, JOB_QUEUED))
+            return self._select(db, job_id)
+
+    def get(self, job_id):
+        with self._lock:
+            return self._select(self._connection, job_id)
+
+    def list(self, limit=100):
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [self._decode(row) for row in rows]
+
+    def delete(self, job_id):
+        with self._transaction() as db:
+            db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def purge(self, max_age):
+        """Supprime les tâches terminées depuis plus de max_age secondes et retourne leurs IDs"""
+        with self._transaction() as db:
+            rows = db.execute("SELECT id FROM jobs WHERE finished_at < ?",
+                              (time.time() - max_age,)).fetchall()
+            db.executemany("DELETE FROM jobs WHERE id = ?", [(row['id'],) for row in rows])
+        return [row['id'] for row in rows]
+
+# --- Plusieurs hôtes : serveur compatible Redis ---
+class RedisBackend:
+    """
+    File partagée via un serveur compatible Redis :
+      job:<id>        hash de la tâche (valeurs JSON)
+      dedupe:<clé>    ID de la tâche de référence (SET NX)
+      queue           liste des IDs en attente (LPUSH / RPOP)
+      running         baux en cours (ensemble trié par échéance)
+      jobs            toutes les tâches (ensemble trié par date de création)
+    """
+
+    def __init__(self, client, prefix="cyberstream:"):
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, *parts):
+        return self.prefix + ":".join(parts)
+
+    def _save(self, job_id, **values):
+        pairs = [item for field, value in values.items() for item in (field, json.dumps(value))]
+        self.client.execute('HSET', self._key('job', job_id), *pairs)
+
+    def get(self, job_id):
+        if not job_id:
+            return None
+        items = self.client.execute('HGETALL', self._key('job', job_id))
+        if not items:
+            return None
+        record = {field: json.loads(value) for field, value in zip(items[::2], items[1::2])}
+        return {field: record.get(field) for field in _FIELDS}
+
+    def submit(self, record):
+        dedupe = self._key('dedupe', record['dedupe_key'])
+        # Le hash est écrit avant de se déclarer tâche de référence : un concurrent
+        # qui lit la clé de déduplication trouve toujours une tâche complète
+        self._save(record['id'], **record)
+        for _ in range(3):
+            if self.client.execute('SET', dedupe, record['id'], 'NX'):
+                self.client.execute('ZADD', self._key('jobs'), record['created_at'], record['id'])
+                self.client.execute('LPUSH', self._key('queue'), record['id'])
+                return record, True
+            existing = self.get(self.client.execute('GET', dedupe))
+            if existing and existing['status'] in _REUSABLE:
+                self.client.execute('DEL', self._key('job', record['id']))
+                return existing, False
+            # Tâche de référence terminée en erreur ou disparue
+            self.client.execute('DEL', dedupe)
+        self.client.execute('ZADD', self._key('jobs'), record['created_at'], record['id'])
+        self.client.execute('LPUSH', self._key('queue'), record['id'])
+        return record, True
+
+    def _requeue_expired(self):
+        for job_id in self.client.execute('ZRANGEBYSCORE', self._key('running'), '-inf', time.time()):
+            # ZREM n'aboutit que pour un seul réplica : la tâche n'est remise en file qu'une fois
+            if self.client.execute('ZREM', self._key('running'), job_id):
+                self._save(job_id, status=JOB_QUEUED, worker=None, lease_until=None)
+                self.client.execute('RPUSH', self._key('queue'), job_id)
+
+    def claim(self, worker, lease):
+        self._requeue_expired()
+        while True:
+            job_id = self.client.execute('RPOP', self._key('queue'))
+            if job_id is None:
+                return None
+            record = self.get(job_id)
+            if record is None or record['status'] != JOB_QUEUED:
+                continue
+            if record['cancel_requested']:
+                self._end(job_id, status=JOB_CANCELLED, error="Téléchargement annulé",
+                          finished_at=time.time())
+                continue
+            now = time.time()
+            record.update(status=JOB_RUNNING, worker=worker, lease_until=now + lease,
+                          started_at=record['started_at'] or now)
+            self._save(job_id, status=record['status'], worker=worker,
+                       lease_until=record['lease_until'], started_at=record['started_at'])
+            self.client.execute('ZADD', self._key('running'), record['lease_until'], job_id)
+            return record
+
+    def heartbeat(self, job_id, worker, lease, progress):
+        record = self.get(job_id)
+        if record is None or record['worker'] != worker or record['status'] != JOB_RUNNING:
+            return False
+        lease_until = time.time() + lease
+        self._save(job_id, lease_until=lease_until, progress=progress)
+        self.client.execute('ZADD', self._key('running'), lease_until, job_id)
+        return not record['cancel_requested']
+
+    def _end(self, job_id, **values):
+        self._save(job_id, lease_until=None, **values)
+        self.client.execute('ZREM', self._key('running'), job_id)
+        record = self.get(job_id)
+        if record and values.get('status') != JOB_DONE:
+            dedupe = self._key('dedupe', record['dedupe_key'])
+            if self.client.execute('GET', dedupe) == job_id:
+                self.client.execute('DEL', dedupe)
+
+    def finish(self, job_id, worker, status, file_name=None, mime_type=None, error=None):
+        record = self.get(job_id)
+        if record is None or record['worker'] != worker:
+            return
+        values = dict(status=status, file_name=file_name, mime_type=mime_type,
+                      error=error, finished_at=time.time())
+        if status == JOB_DONE:
+            values['progress'] = 1.0
+        self._end(job_id, **values)
+
+    def release(self, job_id, worker):
+        record = self.get(job_id)
+        if record is None or record['worker'] != worker:
+            return
+        if record['cancel_requested']:
+            self._end(job_id, status=JOB_CANCELLED, worker=None, finished_at=time.time())
+            return
+        self._save(job_id, status=JOB_QUEUED, worker=None, lease_until=None)
+        self.client.execute('ZREM', self._key('running'), job_id)
+        self.client.execute('RPUSH', self._key('queue'), job_id)
+
+    def cancel(self, job_id):
+        record = self.get(job_id)
+        if record is None or record['status'] not in (JOB_QUEUED, JOB_RUNNING):
+            return record
+        self._save(job_id, cancel_requested=True)
+        if record['status'] == JOB_QUEUED:
+            self.client.execute('LREM', self._key('queue'), 0, job_id)
+            self._end(job_id, status=JOB_CANCELLED, error="Téléchargement annulé",
+                      finished_at=time.time())
+        return self.get(job_id)
+
+    def list(self, limit=100):
+        job_ids = self.client.execute('ZREVRANGE', self._key('jobs'), 0, limit - 1)
+        return [record for record in map(self.get, job_ids) if record]
+
+    def delete(self, job_id):
+        record = self.get(job_id)
+        if record:
+            dedupe = self._key('dedupe', record['dedupe_key'])
+            if self.client.execute('GET', dedupe) == job_id:
+                self.client.execute('DEL', dedupe)
+        self.client.execute('LREM', self._key('queue'), 0, job_id)
+        self.client.execute('ZREM', self._key('running'), job_id)
+        self.client.execute('ZREM', self._key('jobs'), job_id)
+        self.client.execute('DEL', self._key('job', job_id))
+
+    def purge(self, max_age):
+        limit = time.time() - max_age
+        removed = []
+        for job_id in self.client.execute('ZRANGEBYSCORE', self._key('jobs'), '-inf', limit):
+            record = self.get(job_id)
+            if record is None or (record['finished_at'] and record['finished_at'] < limit):
+                self.delete(job_id)
+                removed.append(job_id)
+        return removed
+
+# --- Backend du processus ---
+_default_backend = None
+_default_lock = threading.Lock()
+
+def create_backend(spec):
+    """Construit un backend depuis sa description (voir CYBERSTREAM_BACKEND)"""
+    if spec == "sqlite":
+        return SQLiteBackend()
+    if spec.startswith("sqlite:///"):
+        return SQLiteBackend(spec[len("sqlite:///"):])
+    if spec.startswith("redis://"):
+        return RedisBackend(RespClient.from_url(spec))
+    raise ValueError(f"Backend partagé inconnu: {spec}")
+
+def get_shared_backend():
+    """Backend configuré par CYBERSTREAM_BACKEND, ou None (réplica isolé)"""
+    global _default_backend
+    spec = os.environ.get("CYBERSTREAM_BACKEND", "").strip()
+    if not spec:
+        return None
+    with _default_lock:
+        if _default_backend is None:
+            _default_backend = create_backend(spec)
+        return _default_backend
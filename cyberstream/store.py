@@ -0,0 +1,88 @@
+import sys
+import threading
+from collections import OrderedDict
+
+# --- Stockage des Vidéos ---
+class VideoRecord:
+    """Enregistrement compact d'une vidéo, partagé entre toutes les sessions"""
+    __slots__ = ('id', 'title', 'link', 'channel', 'duration', 'view_count',
+                 'thumbnail', 'upload_date', 'description')
+
+    def __init__(self, id, title, link, channel, duration=None, view_count=0,
+                 thumbnail=None, upload_date='', description=''):
+        self.id = id
+        self.title = title
+        self.link = link
+        # Les noms de chaîne reviennent souvent : on les interne
+        self.channel = sys.intern(channel) if channel else channel
+        self.duration = duration
+        self.view_count = view_count
+        self.thumbnail = thumbnail
+        self.upload_date = upload_date
+        self.description = description
+
+    @classmethod
+    def from_yt_dlp(cls, video_data, link=None, description_limit=None,
+                    default_title='Sans titre'):
+        """Construit un enregistrement depuis la sortie JSON de yt-dlp"""
+        description = video_data.get('description') or ''
+        if description_limit and description:
+            description = description[:description_limit] + '...'
+        return cls(
+            id=video_data.get('id'),
+            title=video_data.get('title', default_title),
+            link=link or video_data.get('webpage_url'),
+            channel=video_data.get('uploader', 'Chaîne inconnue'),
+            duration=video_data.get('duration'),
+            view_count=video_data.get('view_count') or 0,
+            thumbnail=video_data.get('thumbnail'),
+            upload_date=video_data.get('upload_date', ''),
+            description=description
+        )
+
+    def to_dict(self):
+        """Représentation JSON de l'enregistrement"""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+class VideoStore:
+    """Stockage global des vidéos, dédupliqué par ID (LRU borné)"""
+
+    def __init__(self, max_records=10000):
+        self.max_records = max_records
+        self._records = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, record):
+        """Ajoute ou remplace un enregistrement et retourne son ID"""
+        with self._lock:
+            self._records[record.id] = record
+            self._records.move_to_end(record.id)
+            while len(self._records) > self.max_records:
+                self._records.popitem(last=False)
+        return record.id
+
+    def put_many(self, records):
+        """Ajoute plusieurs enregistrements et retourne la liste de leurs IDs"""
+        return [self.put(record) for record in records]
+
+    def get(self, video_id):
+        """Retourne l'enregistrement d'une vidéo, ou None s'il a été évincé"""
+        with self._lock:
+            record = self._records.get(video_id)
+            if record is not None:
+                self._records.move_to_end(video_id)
+            return record
+
+    def get_many(self, video_ids):
+        """Retourne les enregistrements disponibles, dans l'ordre des IDs"""
+        records = (self.get(video_id) for video_id in video_ids)
+        return [record for record in records if record is not None]
+
+    def __len__(self):
+        return len(self._records)
+
+_default_store = VideoStore()
+
+def get_video_store():
+    """Stockage unique pour tout le processus"""
+    return _default_store
@@ -0,0 +1,154 @@
+import threading
+import subprocess
+from collections import deque
+
+from .core import FORMAT_MP4, CyberStreamError, DependencyError, DownloadError, get_stream_url, stream_selector
+from .system import get_ffmpeg_path, yt_dlp_command, popen_process_group, kill_process_tree
+from .utils import clean_youtube_url
+
+# --- Flux direct (sans disque) ---
+#
+# L'URL du flux est résolue par le routeur d'extracteurs (yt-dlp ou pytubefix)
+# et FFmpeg la lit directement. À défaut, yt-dlp écrit le média sur sa sortie
+# standard et FFmpeg le lit depuis ce tube. FFmpeg produit un conteneur
+# diffusable (MP4 fragmenté ou MP3) sur sa sortie, relayé par morceaux :
+# mémoire constante, aucun fichier temporaire.
+
+CHUNK_SIZE = 64 * 1024
+
+def build_stream_commands(url, format_key, ffmpeg_path, max_height=None, section=None, media_url=None):
+    """
+    Construit les commandes yt-dlp (source) et FFmpeg (remux/transcodage).
+    Avec media_url (URL directe déjà résolue), FFmpeg lit le flux lui-même et source vaut None.
+    """
+    cut = []
+    if section:
+        start, end = section
+        if start:
+            cut += ['-ss', f"{start:g}"]
+        if end is not None:
+            cut += ['-to', f"{end:g}"]
+
+    if media_url:
+        source = None
+        reconnect = []
+        if media_url.startswith(('http://', 'https://')):
+            reconnect = ['-reconnect', '1', '-reconnect_streamed', '1', '-reconnect_delay_max', '5']
+        # Extrait en option d'entrée : FFmpeg saute à la position par requêtes Range
+        inputs = [*reconnect, *cut, '-i', media_url]
+    else:
+        source = [
+            *yt_dlp_command(),
+            '-f', stream_selector(format_key, max_height),
+            '--no-part',
+            '--quiet',
+            '--no-warnings',
+            '-o', '-',
+            url
+        ]
+        inputs = ['-i', 'pipe:0', *cut]
+
+    if format_key == FORMAT_MP4:
+        output = ['-c', 'copy', '-movflags', 'frag_keyframe+empty_moov+default_base_moof', '-f', 'mp4']
+    else:
+        output = ['-vn', '-codec:a', 'libmp3lame', '-b:a', '192k', '-f', 'mp3']
+
+    transcode = [
+        ffmpeg_path,
+        '-hide_banner', '-loglevel', 'error',
+        *inputs,
+        *output,
+        'pipe:1'
+    ]
+    return source, transcode
+
+def _relay(source_command, transcode_command, chunk_size, errors, bounded=False):
+    """
+    Lance les processus et relaie la sortie d'FFmpeg ; retourne le nombre d'octets envoyés.
+    Lève DownloadError si la source ou FFmpeg échoue après le premier octet.
+    bounded : l'extrait a une fin, FFmpeg s'arrête avant la source (qui est alors tuée).
+    """
+    source = None
+    if source_command:
+        try:
+            source = popen_process_group(source_command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        except FileNotFoundError:
+            raise DependencyError("yt-dlp n'est pas disponible. Installation requise.")
+    try:
+        transcode = popen_process_group(transcode_command,
+                                        stdin=source.stdout if source else subprocess.DEVNULL,
+                                        stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except Exception:
+        if source:
+            kill_process_tree(source)
+        raise
+    if source:
+        # Seul FFmpeg doit garder le tube ouvert, pour que yt-dlp reçoive SIGPIPE s'il s'arrête
+        source.stdout.close()
+    # stderr est vidé en continu pour qu'FFmpeg ne bloque jamais dessus
+    drain = threading.Thread(target=errors.extend, args=(transcode.stderr,), daemon=True)
+    drain.start()
+
+    sent = 0
+    try:
+        while True:
+            chunk = transcode.stdout.read1(chunk_size)
+            if not chunk:
+                break
+            sent += len(chunk)
+            yield chunk
+        transcode.wait()
+        if not sent:
+            drain.join(timeout=1)
+            return sent
+        # Sans fin d'extrait, FFmpeg ne termine qu'après la fermeture du tube :
+        # yt-dlp a donc déjà fini, et son code dit si le flux est complet
+        source_failed = False
+        if source and not bounded:
+            try:
+                source_failed = source.wait(timeout=5) != 0
+            except subprocess.TimeoutExpired:
+                source_failed = True
+        if transcode.returncode != 0 or source_failed:
+            drain.join(timeout=1)
+            error = b"".join(errors).decode('utf-8', errors='replace').strip()
+            culprit = "FFmpeg" if transcode.returncode != 0 else "yt-dlp"
+            raise DownloadError(f"Flux interrompu ({culprit}) après {sent} octets: {error or 'erreur inconnue'}")
+        return sent
+    finally:
+        kill_process_tree(transcode)
+        if source:
+            kill_process_tree(source)
+
+def stream_media(url, format_key, max_height=None, section=None, chunk_size=CHUNK_SIZE):
+    """
+    Générateur d'octets du média final, produit à la volée.
+
+    Les premiers octets sont disponibles dès que la source a commencé à recevoir
+    le flux. Si le consommateur s'arrête (client déconnecté), les processus sont
+    tués immédiatement. Lève DownloadError si rien n'est produit, ou si la source
+    ou FFmpeg échoue en cours de route (le flux envoyé est alors tronqué).
+    """
+    ffmpeg_path = get_ffmpeg_path()
+    if not ffmpeg_path:
+        raise DependencyError("FFmpeg introuvable.")
+    clean_url = clean_youtube_url(url)
+    errors = deque(maxlen=20)
+    bounded = bool(section and section[1] is not None)
+
+    try:
+        media_url = get_stream_url(clean_url, format_key, max_height)
+    except CyberStreamError:
+        media_url = None
+    if media_url:
+        commands = build_stream_commands(clean_url, format_key, ffmpeg_path, max_height=max_height,
+                                         section=section, media_url=media_url)
+        if (yield from _relay(*commands, chunk_size, errors, bounded)):
+            return
+        # URL refusée (expirée, bloquée...) avant le premier octet : repli sur le tube yt-dlp
+        errors.clear()
+
+    commands = build_stream_commands(clean_url, format_key, ffmpeg_path, max_height=max_height, section=section)
+    if not (yield from _relay(*commands, chunk_size, errors, bounded)):
+        error = b"".join(errors).decode('utf-8', errors='replace').strip()
+        raise DownloadError(f"Échec du flux: {error or 'aucune donnée reçue'}")
@@ -0,0 +1,184 @@
+import os
+import sys
+import time
+import signal
+import platform
+import shutil
+import threading
+import subprocess
+
+# --- Système et Dépendances ---
+
+def get_system_info():
+    """Récupère les informations système"""
+    return {
+        "platform": platform.system(),
+        "python_version": platform.python_version(),
+        "architecture": platform.architecture()[0]
+    }
+
+def get_ffmpeg_path():
+    """
+    Tente de trouver le chemin de l'exécutable FFmpeg requis par yt-dlp.
+    """
+    # Méthode 1: Chercher dans le PATH du système
+    ffmpeg_path = shutil.which('ffmpeg')
+    if ffmpeg_path and os.path.exists(ffmpeg_path):
+        return ffmpeg_path
+
+    # Méthode 2: Utiliser imageio-ffmpeg
+    try:
+        import imageio_ffmpeg
+        ffmpeg_path = imageio_ffmpeg.get_ffmpeg_exe()
+        if ffmpeg_path and os.path.exists(ffmpeg_path):
+            return ffmpeg_path
+    except ImportError:
+        pass
+    except Exception:
+        pass
+
+    return None
+
+def check_yt_dlp():
+    """Vérifie yt-dlp"""
+    try:
+        result = subprocess.run(yt_dlp_command('--version'), capture_output=True, text=True, timeout=10)
+        if result.returncode == 0:
+            return True, result.stdout.strip()
+        return False, "Erreur"
+    except:
+        return False, "Non disponible"
+
+# --- Processus ---
+
+def popen_process_group(command, **kwargs):
+    """
+    Lance une commande dans son propre groupe de processus, pour pouvoir
+    terminer d'un coup yt-dlp et les FFmpeg qu'il lance.
+    """
+    if sys.platform == "win32":
+        kwargs.setdefault('creationflags', subprocess.CREATE_NEW_PROCESS_GROUP)
+    else:
+        kwargs.setdefault('start_new_session', True)
+    return subprocess.Popen(command, **kwargs)
+
+def kill_process_tree(process, grace_period=2.0):
+    """Termine un processus lancé par popen_process_group et tous ses enfants"""
+    if process.poll() is not None:
+        return
+    if sys.platform == "win32":
+        subprocess.run(['taskkill', '/T', '/F', '/PID', str(process.pid)],
+                       capture_output=True)
+    else:
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+        except (ProcessLookupError, PermissionError):
+            pass
+        try:
+            process.wait(timeout=grace_period)
+        except subprocess.TimeoutExpired:
+            pass
+        try:
+            # Les enfants peuvent survivre au parent : on vide tout le groupe
+            os.killpg(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+    process.wait()
+
+# --- Cache de l'extracteur yt-dlp ---
+#
+# yt-dlp met en cache le JS du lecteur YouTube et les fonctions de signature
+# résolues. Sans répertoire commun, chaque conteneur et chaque nouveau processus
+# les retélécharge et les réanalyse. Le répertoire peut être un volume partagé
+# entre workers (CYBERSTREAM_CACHE_DIR).
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cyberstream", "yt-dlp-cache")
+
+# Vidéo publique stable utilisée pour amorcer le cache
+WARMUP_VIDEO_URL = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+
+_warmup_state = {
+    'running': False,
+    'last_run': None,
+    'duration': None,
+    'ok': None,
+    'error': None,
+}
+_warmup_lock = threading.Lock()
+
+def get_cache_dir():
+    """Répertoire de cache yt-dlp géré (créé au besoin)"""
+    cache_dir = os.environ.get("CYBERSTREAM_CACHE_DIR", DEFAULT_CACHE_DIR)
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+def yt_dlp_command(*arguments):
+    """Commande yt-dlp utilisant le cache partagé"""
+    return ['yt-dlp', '--cache-dir', get_cache_dir(), *arguments]
+
+def warm_up_cache(timeout=90):
+    """
+    Amorce le cache : une extraction simulée télécharge le JS du lecteur et
+    résout les signatures, que les requêtes suivantes retrouveront sur disque.
+    """
+    with _warmup_lock:
+        if _warmup_state['running']:
+            return False
+        _warmup_state['running'] = True
+    return _run_warmup(timeout)
+
+def _run_warmup(timeout):
+    started = time.perf_counter()
+    ok, error = False, None
+    try:
+        result = subprocess.run(
+            yt_dlp_command('--simulate', '--quiet', '--no-warnings', WARMUP_VIDEO_URL),
+            capture_output=True, text=True, timeout=timeout
+        )
+        ok = result.returncode == 0
+        if not ok:
+            error = (result.stderr or "").strip()[-300:] or f"Code de retour {result.returncode}"
+    except FileNotFoundError:
+        error = "yt-dlp non disponible"
+    except subprocess.TimeoutExpired:
+        error = "Timeout"
+    finally:
+        with _warmup_lock:
+            _warmup_state.update(
+                running=False, last_run=time.time(),
+                duration=time.perf_counter() - started, ok=ok, error=error
+            )
+    return ok
+
+def start_cache_warmup():
+    """Lance l'amorçage en arrière-plan (une seule fois par processus)"""
+    with _warmup_lock:
+        if _warmup_state['running'] or _warmup_state['last_run'] is not None:
+            return False
+        _warmup_state['running'] = True
+    threading.Thread(target=_run_warmup, args=(90,), name="cache-warmup", daemon=True).start()
+    return True
+
+def get_cache_status():
+    """État du cache : taille, fraîcheur et résultat du dernier amorçage"""
+    cache_dir = get_cache_dir()
+    files, size, newest = 0, 0, None
+    for root, _, names in os.walk(cache_dir):
+        for name in names:
+            try:
+                stat = os.stat(os.path.join(root, name))
+            except OSError:
+                continue
+            files += 1
+            size += stat.st_size
+            newest = stat.st_mtime if newest is None else max(newest, stat.st_mtime)
+
+    with _warmup_lock:
+        warmup = dict(_warmup_state)
+    return {
+        'path': cache_dir,
+        'files': files,
+        'bytes': size,
+        'age': time.time() - newest if newest else None,
+        'warmup': warmup,
+    }
@@ -0,0 +1,156 @@
+import re
+import math
+
+# --- Fonctions Utilitaires ---
+
+# Compilées une seule fois : ces fonctions sont appelées sur des milliers de liens
+# en import en masse. Couvre watch, youtu.be, embed, v, shorts, live, ainsi que
+# m.youtube.com, music.youtube.com et youtube-nocookie.com. L'hôte doit commencer
+# le lien : « notyoutube.com » ou « evil.com/youtube.com/... » ne sont pas reconnus.
+_URL_PATTERN = (
+    r'(?<![\w./-])(?:(?:https?:)?//)?(?:(?:www|m|music)\.)?'
+    r'(?:youtube(?:-nocookie)?\.com/'
+    r'(?:watch\?(?:[^#\s]*?&)?v=|embed/|v/|e/|shorts/|live/)'
+    r'|youtu\.be/)'
+    r'([A-Za-z0-9_-]{11})(?![A-Za-z0-9_-])'
+)
+_URL_RE = re.compile(_URL_PATTERN, re.IGNORECASE)
+_BARE_ID_RE = re.compile(r'^[A-Za-z0-9_-]{11}$')
+
+def validate_youtube_url(url):
+    """Validation améliorée des URLs YouTube"""
+    if not url:
+        return False
+    return _URL_RE.match(url.strip()) is not None
+
+def get_video_id(url):
+    """Extrait l'ID vidéo d'une URL YouTube (ou d'un ID seul)"""
+    if not url:
+        return None
+    url = url.strip()
+    match = _URL_RE.search(url)
+    if match:
+        return match.group(1)
+    if _BARE_ID_RE.match(url):
+        return url
+    return None
+
+def _is_bare_id(cell):
+    """
+    ID seul plausible : 11 caractères autorisés, dont au moins un chiffre ou une
+    majuscule (écarte les mots comme « description » ou « hello_world »)
+    """
+    return bool(_BARE_ID_RE.match(cell)) and any(c.isdigit() or c.isupper() for c in cell)
+
+def extract_video_ids(text):
+    """
+    Extrait les IDs vidéo d'un texte libre (une URL ou un ID par ligne, CSV...).
+    Retourne (ids_uniques_dans_l_ordre, nombre_de_doublons, lignes_invalides).
+    Si le texte contient des URLs, seules les URLs sont retenues.
+    """
+    video_ids = {}
+    duplicates = 0
+    invalid = []
+    # Une liste d'URLs ne doit pas voir ses autres colonnes prises pour des IDs
+    accept_bare = _URL_RE.search(text) is None
+    first_line = True
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        is_first, first_line = first_line, False
+        found = _URL_RE.findall(line)
+        if not found and accept_bare:
+            # ID seul sur la ligne ou dans sa propre cellule CSV
+            found = [cell for cell in (c.strip().strip('"\'') for c in line.split(','))
+                     if _is_bare_id(cell)]
+        if not found:
+            if not (is_first and (',' in line or re.fullmatch(r'[^\W\d]+', line))):
+                # Première ligne sans ID (CSV ou simple mot) : en-tête, pas une erreur
+                invalid.append(line)
+            continue
+        for video_id in found:
+            if video_id in video_ids:
+                duplicates += 1
+            else:
+                video_ids[video_id] = None
+    return list(video_ids), duplicates, invalid
+
+def clean_youtube_url(url):
+    """Nettoie et standardise une URL YouTube"""
+    video_id = get_video_id(url)
+    if video_id:
+        return f"https://www.youtube.com/watch?v={video_id}"  # Correction: ajout de https:
+    return url
+
+def format_duration(seconds):
+    """Formate la durée en secondes vers un format lisible"""
+    try:
+        seconds = int(seconds)
+        hours = seconds // 3600
+        minutes = (seconds % 3600) // 60
+        secs = seconds % 60
+        if hours > 0:
+            return f"{hours:02d}:{minutes:02d}:{secs:02d}"
+        else:
+            return f"{minutes:02d}:{secs:02d}"
+    except:
+        return "N/A"
+
+def format_views(view_count):
+    """Formate le nombre de vues"""
+    try:
+        count = int(view_count)
+        if count >= 1000000:
+            return f"{count/1000000:.1f}M"
+        elif count >= 1000:
+            return f"{count/1000:.1f}K"
+        else:
+            return f"{count:,}"
+    except:
+        return "N/A"
+
+def parse_timestamp(value):
+    """Convertit '90', '1:30' ou '01:02:03' en secondes (None si vide)"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        seconds = float(value)
+    else:
+        value = value.strip()
+        if not value:
+            return None
+        seconds = 0.0
+        try:
+            for part in value.split(':'):
+                seconds = seconds * 60 + float(part)
+        except ValueError:
+            raise ValueError(f"Horodatage invalide: {value}")
+        if value.count(':') > 2:
+            raise ValueError(f"Horodatage invalide: {value}")
+    if not math.isfinite(seconds):
+        raise ValueError(f"Horodatage invalide: {value}")
+    if seconds < 0:
+        raise ValueError("Un horodatage ne peut pas être négatif")
+    return seconds
+
+def parse_section(start, end):
+    """
+    Valide un extrait (début, fin) et retourne (début, fin) en secondes,
+    ou None si aucun des deux n'est renseigné. La fin peut rester ouverte.
+    """
+    start_seconds = parse_timestamp(start)
+    end_seconds = parse_timestamp(end)
+    if start_seconds is None and end_seconds is None:
+        return None
+    start_seconds = start_seconds or 0.0
+    if end_seconds is not None and end_seconds <= start_seconds:
+        raise ValueError("La fin de l'extrait doit être après le début")
+    return start_seconds, end_seconds
+
+def safe_search_query(query):
+    """Nettoie et sécurise la requête de recherche"""
+    if not query:
+        return ""
+    cleaned = re.sub(r'[^\w\s\-]', '', query)
+    return cleaned.strip()[:100]
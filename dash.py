@@ -1,17 +1,59 @@
 import streamlit as st
 import os
-import tempfile
 import subprocess
 import time
 import math
-import json
-import re
 import sys
-import platform
-import shutil
 from datetime import datetime
+from urllib.parse import urlencode
+
+from cyberstream import (
+    FORMAT_LABELS,
+    CyberStreamError,
+    SearchError,
+    DependencyError,
+    VideoRecord,
+    get_video_store,
+    get_system_info,
+    get_ffmpeg_path,
+    check_yt_dlp,
+    validate_youtube_url,
+    get_video_id,
+    format_duration,
+    format_views,
+    parse_section,
+    safe_search_query,
+    plan_bulk_import,
+    fetch_bulk,
+    select_format,
+    build_choices,
+    format_size,
+    POLICY_BEST,
+    POLICY_MAX_HEIGHT,
+    POLICY_MAX_SIZE,
+    STATUS_DONE,
+    STATUS_ERROR,
+    STATUS_CANCELLED,
+    get_history_store,
+    get_cache_status,
+    start_cache_warmup,
+    warm_up_cache,
+    JobManager,
+    JOB_QUEUED,
+    JOB_DONE,
+    JOB_CANCELLED,
+    get_shared_backend,
+    get_extractor_router,
+    get_search_cache,
+)
+from cyberstream import core
 
 # --- Configuration ---
+# API headless (python -m cyberstream serve) utilisée pour le flux direct
+API_URL = os.environ.get("CYBERSTREAM_API_URL", "").rstrip("/")
+# Au-delà, le JS du lecteur a probablement changé côté YouTube
+CACHE_STALE_AFTER = 24 * 3600
+
 st.set_page_config(
     page_title="CYBER-STREAM Terminal",
     page_icon="🦾",
@@ -24,14 +66,23 @@ session_defaults = {
     'title_typed': False,
     'search_results': None,
     'selected_video_url': None,
-    'selected_video_data': None,
+    'selected_video_id': None,
     'current_page': 1,
     'total_pages': 0,
     'ffmpeg_available': False,
     'ffmpeg_source': None,
     'ffmpeg_path': None,
     'ffmpeg_installation_tried': False,
-    'download_history': [],
+    'history_cursors': [],
+    'history_filters': None,
+    'bulk_stats': None,
+    'download_cancelled': False,
+    # Résultats de démonstration : propres à la session, jamais dans le stockage partagé
+    'demo_records': {},
+    # IDs évincés du stockage partagé puis introuvables : pas de nouvel essai à chaque relance
+    'unavailable_ids': set(),
+    # Tâches lancées par cette session : l'historique partagé est filtré dessus
+    'job_ids': [],
     'dependencies_checked': False,
     'debug_mode': False
 }
@@ -42,36 +93,6 @@ for key, value in session_defaults.items():
 
 # --- Système et Dépendances ---
 
-def get_system_info():
-    """Récupère les informations système"""
-    return {
-        "platform": platform.system(),
-        "python_version": platform.python_version(),
-        "architecture": platform.architecture()[0]
-    }
-
-def get_ffmpeg_path():
-    """
-    Tente de trouver le chemin de l'exécutable FFmpeg requis par yt-dlp.
-    """
-    # Méthode 1: Chercher dans le PATH du système
-    ffmpeg_path = shutil.which('ffmpeg')
-    if ffmpeg_path and os.path.exists(ffmpeg_path):
-        return ffmpeg_path
-
-    # Méthode 2: Utiliser imageio-ffmpeg
-    try:
-        import imageio_ffmpeg
-        ffmpeg_path = imageio_ffmpeg.get_ffmpeg_exe()
-        if ffmpeg_path and os.path.exists(ffmpeg_path):
-            return ffmpeg_path
-    except ImportError:
-        pass
-    except Exception:
-        pass
-
-    return None
-
 def check_ffmpeg_status():
     """Vérifie l'état de FFmpeg pour yt-dlp"""
     ffmpeg_path = get_ffmpeg_path()
@@ -138,16 +159,6 @@ def install_ffmpeg_complete():
     st.session_state.ffmpeg_installation_tried = True
     return False
 
-def check_yt_dlp():
-    """Vérifie yt-dlp"""
-    try:
-        result = subprocess.run(['yt-dlp', '--version'], capture_output=True, text=True, timeout=10)
-        if result.returncode == 0:
-            return True, result.stdout.strip()
-        return False, "Erreur"
-    except:
-        return False, "Non disponible"
-
 # --- CSS et Style ---
 def load_css(theme_name):
     """Charge le CSS selon le thème"""
@@ -278,399 +289,246 @@ def load_css(theme_name):
         """
         st.markdown(cyberpunk_css, unsafe_allow_html=True)
 
-# --- Fonctions Utilitaires ---
-def validate_youtube_url(url):
-    """Validation améliorée des URLs YouTube"""
-    if not url:
-        return False
-    
-    # Correction de l'expression régulière
-    youtube_regex = r'(https?://)?(www\.)?(youtube|youtu|youtube-nocookie)\.(com|be)/(watch\?v=|embed/|v/|.+\?v=)?([^&=%?]{11})'
-    return re.match(youtube_regex, url) is not None
-
-def get_video_id(url):
-    """Extrait l'ID vidéo d'une URL YouTube"""
-    if not url:
-        return None
-    # Correction des patterns
-    patterns = [
-        r'(?:youtube\.com/watch\?v=|youtu\.be/|youtube\.com/embed/)([^&=%?]{11})',
-        r'^([^&=%?]{11})$'
-    ]
-    for pattern in patterns:
-        match = re.search(pattern, url)
-        if match:
-            return match.group(1)
-    return None
-
-def clean_youtube_url(url):
-    """Nettoie et standardise une URL YouTube"""
-    video_id = get_video_id(url)
-    if video_id:
-        return f"https://www.youtube.com/watch?v={video_id}"  # Correction: ajout de https:
-    return url
-
-def format_duration(seconds):
-    """Formate la durée en secondes vers un format lisible"""
-    try:
-        seconds = int(seconds)
-        hours = seconds // 3600
-        minutes = (seconds % 3600) // 60
-        secs = seconds % 60
-        if hours > 0:
-            return f"{hours:02d}:{minutes:02d}:{secs:02d}"
-        else:
-            return f"{minutes:02d}:{secs:02d}"
-    except:
-        return "N/A"
-
-def format_views(view_count):
-    """Formate le nombre de vues"""
-    try:
-        count = int(view_count)
-        if count >= 1000000:
-            return f"{count/1000000:.1f}M"
-        elif count >= 1000:
-            return f"{count/1000:.1f}K"
-        else:
-            return f"{count:,}"
-    except:
-        return "N/A"
-
-def safe_search_query(query):
-    """Nettoie et sécurise la requête de recherche"""
-    if not query:
-        return ""
-    cleaned = re.sub(r'[^\w\s\-]', '', query)
-    return cleaned.strip()[:100]
-
 # --- Fonctions YouTube ---
-@st.cache_data(ttl=3600, show_spinner="Recherche en cours...")
+def show_debug(level, message):
+    """Affiche les traces du cœur en mode débogage"""
+    if level == 'debug' and st.session_state.debug_mode:
+        st.markdown(f"""
+        <div class='debug-box'>
+        {message}
+        </div>
+        """, unsafe_allow_html=True)
+
 def search_youtube(query, limit=15):
-    """Recherche YouTube avec gestion d'erreurs améliorée"""
+    """Recherche YouTube avec gestion d'erreurs améliorée (cache partagé, requête normalisée)"""
     try:
-        clean_query = safe_search_query(query)
-        if not clean_query:
+        if not safe_search_query(query):
             st.warning("⚠️ Recherche vide, utilisation des résultats de démonstration")
             return get_demo_results("exemple")
         
-        yt_dlp_available, yt_dlp_version = check_yt_dlp()
-        if not yt_dlp_available:
-            st.error("❌ yt-dlp n'est pas disponible. Installation requise.")
-            return get_demo_results(query)
-        
-        # Correction de la commande de recherche
-        search_command = [
-            'yt-dlp',
-            f'ytsearch{limit}:"{clean_query}"',  # Ajout de guillemets autour de la requête
-            '--dump-json',
-            '--no-download',  # Correction: --no-download au lieu de --no-download
-            '--no-warnings',
-            '--ignore-errors',
-            '--socket-timeout', '30',
-            '--retries', '3',
-            '--fragment-retries', '3'
-        ]
-        
-        if st.session_state.debug_mode:
-            st.markdown(f"""
-            <div class='debug-box'>
-            Commande de recherche: {' '.join(search_command)}
-            </div>
-            """, unsafe_allow_html=True)
-        
-        result = subprocess.run(
-            search_command, 
-            capture_output=True, 
-            text=True, 
-            timeout=60
-        )
-        
-        if st.session_state.debug_mode:
-            st.markdown(f"""
-            <div class='debug-box'>
-            Code de retour: {result.returncode}
-            Sortie standard: {result.stdout[:500] if result.stdout else "Vide"}
-            Erreur: {result.stderr[:500] if result.stderr else "Vide"}
-            </div>
-            """, unsafe_allow_html=True)
-        
-        if result.returncode != 0:
-            st.error(f"❌ Erreur lors de la recherche: {result.stderr}")
-            return get_demo_results(query)
-        
-        videos = []
-        output_lines = result.stdout.splitlines()
-        
-        if st.session_state.debug_mode:
-            st.markdown(f"""
-            <div class='debug-box'>
-            Nombre de lignes retournées: {len(output_lines)}
-            </div>
-            """, unsafe_allow_html=True)
-        
-        for line in output_lines:
-            if line.strip():
-                try:
-                    video_data = json.loads(line)
-                    duration = video_data.get('duration')
-                    duration_text = format_duration(duration) if duration else 'N/A'
-                    view_count = video_data.get('view_count', 0)
-                    
-                    videos.append({
-                        'id': video_data.get('id'),
-                        'title': video_data.get('title', 'Sans titre'),
-                        'link': video_data.get('webpage_url'),
-                        'channel': {'name': video_data.get('uploader', 'Chaîne inconnue')},
-                        'duration': {'text': duration_text},
-                        'viewCount': {'text': format_views(view_count)},
-                        'viewCount_raw': view_count,
-                        'thumbnail': [{'url': video_data.get('thumbnail')}],
-                        'upload_date': video_data.get('upload_date', ''),
-                        'description': video_data.get('description', '')[:200] + '...' if video_data.get('description') else ''
-                    })
-                except json.JSONDecodeError:
-                    continue
+        # Les résultats de démonstration ne sont jamais mis en cache : seul l'échec l'est, brièvement
+        videos = get_search_cache().get(query, limit=limit, notify=show_debug)
+        return get_video_store().put_many(videos)
         
-        if videos:
-            return videos
-        else:
-            st.warning("⚠️ Aucun résultat trouvé, utilisation des résultats de démonstration")
-            return get_demo_results(query)
-        
-    except subprocess.TimeoutExpired:
-        st.error("⏱️ Timeout lors de la recherche")
+    except DependencyError as e:
+        st.error(f"❌ {e}")
+        return get_demo_results(query)
+    except SearchError as e:
+        st.warning(f"⚠️ {e}, utilisation des résultats de démonstration")
         return get_demo_results(query)
     except Exception as e:
         st.error(f"❌ Erreur inattendue lors de la recherche: {str(e)}")
         return get_demo_results(query)
 
 def get_demo_results(query):
-    """Résultats de démonstration"""
-    return [
-        {
-            'id': 'dQw4w9WgXcQ',
-            'title': f'Demo: {query} - Résultat 1',
-            'link': 'https://www.youtube.com/watch?v=dQw4w9WgXcQ',  # Correction: ajout de https:
-            'channel': {'name': 'Chaîne Démo'},
-            'duration': {'text': '3:45'},
-            'viewCount': {'text': '1.2M'},
-            'viewCount_raw': 1234567,
-            'thumbnail': [{'url': 'https://i.ytimg.com/vi/dQw4w9WgXcQ/hqdefault.jpg'}],
-            'upload_date': '20220101',
-            'description': 'Ceci est une vidéo de démonstration...'
-        },
-        {
-            'id': 'kJQP7kiw5Fk', 
-            'title': f'Demo: {query} - Résultat 2',
-            'link': 'https://www.youtube.com/watch?v=kJQP7kiw5Fk',  # Correction: ajout de https:
-            'channel': {'name': 'Chaîne Test'},
-            'duration': {'text': '4:20'},
-            'viewCount': {'text': '987K'},
-            'viewCount_raw': 987654,
-            'thumbnail': [{'url': 'https://i.ytimg.com/vi/kJQP7kiw5Fk/hqdefault.jpg'}],
-            'upload_date': '20220102',
-            'description': 'Une autre vidéo de démonstration...'
-        }
+    """
+    Résultats de démonstration, gardés dans la session : leurs IDs (« demo-N »)
+    ne peuvent pas écraser les métadonnées d'une vraie vidéo du stockage partagé
+    """
+    demo_records = [
+        VideoRecord(
+            id='demo-1',
+            title=f'Demo: {query} - Résultat 1',
+            link='https://www.youtube.com/watch?v=dQw4w9WgXcQ',  # Correction: ajout de https:
+            channel='Chaîne Démo',
+            duration=225,
+            view_count=1234567,
+            thumbnail='https://i.ytimg.com/vi/dQw4w9WgXcQ/hqdefault.jpg',
+            upload_date='20220101',
+            description='Ceci est une vidéo de démonstration...'
+        ),
+        VideoRecord(
+            id='demo-2',
+            title=f'Demo: {query} - Résultat 2',
+            link='https://www.youtube.com/watch?v=kJQP7kiw5Fk',  # Correction: ajout de https:
+            channel='Chaîne Test',
+            duration=260,
+            view_count=987654,
+            thumbnail='https://i.ytimg.com/vi/kJQP7kiw5Fk/hqdefault.jpg',
+            upload_date='20220102',
+            description='Une autre vidéo de démonstration...'
+        )
     ]
+    st.session_state.demo_records = {record.id: record for record in demo_records}
+    return [record.id for record in demo_records]
+
+def get_session_videos(video_ids):
+    """
+    Vidéos référencées par la session, dans l'ordre : démos de la session, puis
+    stockage partagé. Les IDs évincés du stockage (LRU) sont récupérés à nouveau
+    au lieu de disparaître des résultats ou de la sélection.
+    """
+    store = get_video_store()
+    demo_records = st.session_state.demo_records
+    records = {video_id: demo_records.get(video_id) or store.get(video_id) for video_id in video_ids}
+    missing = [video_id for video_id, record in records.items()
+               if record is None and video_id not in st.session_state.unavailable_ids]
+    if missing:
+        try:
+            for record in core.iter_video_info(missing):
+                store.put(record)
+                records[record.id] = record
+        except CyberStreamError as e:
+            show_debug('debug', f"Récupération des vidéos évincées impossible: {e}")
+        st.session_state.unavailable_ids.update(video_id for video_id in missing if records[video_id] is None)
+    return [records[video_id] for video_id in video_ids if records.get(video_id) is not None]
 
 def get_video_info(url):
     """Récupère les informations détaillées d'une vidéo"""
     try:
-        clean_url = clean_youtube_url(url)
-        
-        command = [
-            'yt-dlp',
-            '--dump-json',
-            '--no-download',  # Correction: --no-download au lieu de --no-download
-            '--ignore-errors',
-            '--no-warnings',
-            '--quiet',
-            clean_url
-        ]
-        
-        result = subprocess.run(command, capture_output=True, text=True, timeout=30)
-        
-        if result.returncode == 0 and result.stdout.strip():
-            video_data = json.loads(result.stdout)
-            duration = video_data.get('duration')
-            duration_text = format_duration(duration) if duration else 'N/A'
-            view_count = video_data.get('view_count', 0)
-            
-            return {
-                'id': video_data.get('id'),
-                'title': video_data.get('title', 'Titre non disponible'),
-                'link': clean_url,
-                'channel': {'name': video_data.get('uploader', 'Chaîne inconnue')},
-                'duration': {'text': duration_text},
-                'viewCount': {'text': format_views(view_count)},
-                'viewCount_raw': view_count,
-                'thumbnail': [{'url': video_data.get('thumbnail')}],
-                'upload_date': video_data.get('upload_date', ''),
-                'description': video_data.get('description', '')
-            }
-        else:
-            return None
-            
+        record = core.get_video_info(url)
+        if record:
+            get_video_store().put(record)
+        return record
     except Exception as e:
         st.error(f"Erreur lors de la récupération des infos: {str(e)}")
         return None
 
-# --- Fonctions de Téléchargement ---
-def download_media(url, format_choice):
-    """Téléchargement avec support FFmpeg complet et gestion d'erreurs"""
+def get_video_formats(url):
+    """Formats de la vidéo (depuis le cache partagé si possible)"""
     try:
-        clean_url = clean_youtube_url(url)
-        temp_dir = tempfile.mkdtemp()
-        
-        ffmpeg_path = get_ffmpeg_path()
-        if not ffmpeg_path:
-            st.error("❌ Erreur Critique: FFmpeg introuvable.")
-            st.error("yt-dlp a besoin des programmes 'ffmpeg' et 'ffprobe' pour convertir les fichiers.")
-            st.markdown("""
-            **Solution:**
-            1.  Installez FFmpeg sur votre système (recommandé) :
-                - **Windows**: `choco install ffmpeg` ou téléchargez depuis [ffmpeg.org](https://ffmpeg.org/download.html) et ajoutez au PATH.
-                - **macOS**: `brew install ffmpeg`
-                - **Linux**: `sudo apt install ffmpeg` (Ubuntu/Debian) ou `sudo dnf install ffmpeg` (Fedora)
-            2.  Redémarrez cette application après l'installation.
-            """)
-            return None, None, None
-
-        st.info("🔄 Configuration du téléchargement...")
-        
-        if format_choice == "MP4 (Vidéo)":
-            output_template = os.path.join(temp_dir, "%(title).100s.%(ext)s")
-            command = [
-                'yt-dlp', 
-                '-f', 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best',
-                '--merge-output-format', 'mp4',
-                '--ignore-errors',
-                '--no-warnings',
-                '-o', output_template,
-                '--ffmpeg-location', ffmpeg_path,
-                clean_url
-            ]
-        else:  # MP3
-            output_template = os.path.join(temp_dir, "%(title).100s.%(ext)s")
-            command = [
-                'yt-dlp',
-                '-x', '--audio-format', 'mp3',
-                '--audio-quality', '192K',
-                '--ignore-errors',
-                '--no-warnings',
-                '-o', output_template,
-                '--ffmpeg-location', ffmpeg_path,
-                clean_url
-            ]
-            st.success(f"🎵 Conversion MP3 avec FFmpeg activée!")
-        
-        st.info("📥 Téléchargement en cours...")
-        
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-        
-        process = subprocess.Popen(
-            command, 
-            stdout=subprocess.PIPE, 
-            stderr=subprocess.PIPE, 
-            text=True,
-            universal_newlines=True
-        )
-        
-        while True:
-            output = process.stdout.readline()
-            if output == '' and process.poll() is not None:
-                break
-            if output:
-                if '[download]' in output:
-                    progress = min(0.9, float(st.session_state.get('download_progress', 0)) + 0.05)
-                    progress_bar.progress(progress)
-                    st.session_state.download_progress = progress
-        
-        process.wait()
-        
-        if process.returncode == 0:
-            progress_bar.progress(1.0)
-            status_text.text("✅ Téléchargement terminé!")
-            time.sleep(1)
-            progress_bar.empty()
-            status_text.empty()
-            
-            downloaded_file = None
-            for file in os.listdir(temp_dir):
-                file_lower = file.lower()
-                if format_choice == "MP4 (Vidéo)":
-                    if file_lower.endswith(('.mp4', '.webm', '.mkv')):
-                        downloaded_file = os.path.join(temp_dir, file)
-                        if not downloaded_file.endswith('.mp4'):
-                            new_file = os.path.splitext(downloaded_file)[0] + '.mp4'
-                            os.rename(downloaded_file, new_file)
-                            downloaded_file = new_file
-                        mime_type = "video/mp4"
-                        break
-                else:  # MP3
-                    if file_lower.endswith('.mp3'):
-                        downloaded_file = os.path.join(temp_dir, file)
-                        mime_type = "audio/mpeg"
-                        st.success("🎵 Fichier MP3 converti avec succès!")
-                        break
-                    elif file_lower.endswith(('.m4a', '.ogg', '.opus', '.wav')):
-                        downloaded_file = os.path.join(temp_dir, file)
-                        new_file = os.path.splitext(downloaded_file)[0] + '.mp3'
-                        os.rename(downloaded_file, new_file)
-                        downloaded_file = new_file
-                        mime_type = "audio/mpeg"
-                        st.warning("🔸 Fichier audio natif renommé.")
-                        break
-            
-            if downloaded_file:
-                file_name = os.path.basename(downloaded_file)
-                
-                history_entry = {
-                    'title': st.session_state.selected_video_data.get('title', 'Inconnu'),
-                    'format': format_choice,
-                    'date': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    'file_name': file_name
-                }
-                st.session_state.download_history.insert(0, history_entry)
-                if len(st.session_state.download_history) > 10:
-                    st.session_state.download_history = st.session_state.download_history[:10]
-                
-                return downloaded_file, file_name, mime_type
-            else:
-                raise Exception("Aucun fichier trouvé après téléchargement")
-        else:
-            error_output = process.stderr.read()
-            raise Exception(f"Échec du téléchargement: {error_output}")
-            
-    except subprocess.TimeoutExpired:
-        st.error("⏱️ Timeout lors du téléchargement")
-        return None, None, None
+        return core.get_video_formats(url)
     except Exception as e:
-        st.error(f"❌ Erreur: {str(e)}")
+        st.error(f"Erreur lors de la récupération des formats: {str(e)}")
+        return ()
+
+# --- Fonctions de Téléchargement ---
+def notify_streamlit(level, message):
+    """Relaie les messages du cœur vers l'interface"""
+    if level == 'success':
+        st.success(message)
+    elif level == 'warning':
+        st.warning(message)
+
+def download_media(url, format_choice, section=None, precise_cuts=False, format_selector=None):
+    """Téléchargement avec support FFmpeg complet et gestion d'erreurs"""
+    format_key = FORMAT_LABELS[format_choice]
+    
+    if not get_ffmpeg_path():
+        st.error("❌ Erreur Critique: FFmpeg introuvable.")
+        st.error("yt-dlp a besoin des programmes 'ffmpeg' et 'ffprobe' pour convertir les fichiers.")
+        st.markdown("""
+        **Solution:**
+        1.  Installez FFmpeg sur votre système (recommandé) :
+            - **Windows**: `choco install ffmpeg` ou téléchargez depuis [ffmpeg.org](https://ffmpeg.org/download.html) et ajoutez au PATH.
+            - **macOS**: `brew install ffmpeg`
+            - **Linux**: `sudo apt install ffmpeg` (Ubuntu/Debian) ou `sudo dnf install ffmpeg` (Fedora)
+        2.  Redémarrez cette application après l'installation.
+        """)
         return None, None, None
+
+    if uses_shared_queue(precise_cuts):
+        return download_shared(url, format_key, section, format_selector)
+
+    st.info("🔄 Configuration du téléchargement...")
+    if format_key == core.FORMAT_MP3:
+        st.success(f"🎵 Conversion MP3 avec FFmpeg activée!")
+    st.info("📥 Téléchargement en cours...")
+
+    # yt-dlp tourne dans un worker du réplica : l'interface ne fait que surveiller
+    # la tâche, donc « Annuler » agit même si le téléchargement est bloqué
+    manager = get_job_manager(shared=False)
+    job = manager.submit(url, format_key, section=section, format_selector=format_selector,
+                         precise_cuts=precise_cuts)
+    st.session_state.job_ids.append(job.id)
+    st.button("⛔ Annuler", key="cancel_download", on_click=cancel_download,
+              args=(job.id, False))
+    return wait_for_job(manager, job, cancel_on_exit=True)
+
+def cancel_download(job_id=None, shared=True):
+    """Mémorise l'annulation pour l'afficher après la relance du script"""
+    st.session_state.download_cancelled = True
+    if job_id:
+        get_job_manager(shared).cancel(job_id)
+
+def wait_for_job(manager, job, cancel_on_exit=False):
+    """
+    Suit une tâche jusqu'à sa fin (progression, file d'attente) et retourne
+    (chemin, nom, type MIME). Avec cancel_on_exit, une relance du script
+    (clic sur un autre bouton, onglet fermé) annule la tâche.
+    """
+    progress_bar = st.progress(0)
+    status_text = st.empty()
+    try:
+        while not job.finished:
+            progress_bar.progress(min(job.progress, 1.0))
+            status_text.text("⏳ En file d'attente..." if job.status == JOB_QUEUED else "📥 Téléchargement en cours...")
+            time.sleep(0.5)
+            job = manager.get(job.id)
+            if job is None:
+                st.error("❌ Tâche introuvable dans la file")
+                return None, None, None
+    except BaseException:
+        if cancel_on_exit:
+            manager.cancel(job.id)
+        raise
     finally:
-        if 'progress_bar' in locals():
-            progress_bar.empty()
-        if 'status_text' in locals():
-            status_text.empty()
+        progress_bar.empty()
+        status_text.empty()
+
+    for level, message in job.notices:
+        notify_streamlit(level, message)
+    if job.status == JOB_DONE and job.file_path:
+        return job.file_path, job.file_name, job.mime_type
+    if job.status == JOB_CANCELLED:
+        st.warning("⛔ Téléchargement annulé.")
+    else:
+        st.error(f"❌ Erreur: {job.error or 'fichier indisponible'}")
+    return None, None, None
+
+# --- File partagée entre réplicas ---
+@st.cache_resource
+def get_job_manager(shared=True):
+    """
+    Workers du réplica : reliés à la file commune (CYBERSTREAM_BACKEND), ou
+    locaux pour les découpes précises et le mode sans file partagée
+    """
+    return JobManager(workers=2, backend=get_shared_backend() if shared else None)
+
+def uses_shared_queue(precise_cuts=False):
+    """Les découpes précises restent locales : la file partagée ne les gère pas"""
+    return get_shared_backend() is not None and not precise_cuts
+
+def download_shared(url, format_key, section, format_selector):
+    """
+    Téléchargement via la file commune : un téléchargement identique déjà
+    demandé sur un autre réplica est réutilisé, et n'importe quel réplica
+    libre peut le traiter. Le fichier reste dans le magasin partagé.
+    """
+    manager = get_job_manager()
+    job = manager.submit(url, format_key, section=section, format_selector=format_selector)
+    st.session_state.job_ids.append(job.id)
+    if job.reused:
+        st.info("🔁 Ce fichier est déjà demandé par une autre session : le résultat est partagé.")
+    # Une tâche réutilisée n'est pas annulée : d'autres sessions l'attendent
+    st.button("⛔ Annuler", key="cancel_download", on_click=cancel_download,
+              args=(None if job.reused else job.id,))
+    return wait_for_job(manager, job)
 
 # --- Interface Utilisateur ---
-def display_metadata(video_data):
+def format_age(seconds):
+    """Formate une ancienneté en secondes ("il y a 5 min")"""
+    if seconds < 60:
+        return "à l'instant"
+    if seconds < 3600:
+        return f"il y a {int(seconds // 60)} min"
+    if seconds < 86400:
+        return f"il y a {int(seconds // 3600)} h"
+    return f"il y a {int(seconds // 86400)} j"
+
+def display_metadata(video):
     """Affiche les métadonnées d'une vidéo"""
     col1, col2 = st.columns([1, 3])
     with col1:
-        thumbnail_list = video_data.get('thumbnail', [])
-        if thumbnail_list: 
-            st.image(thumbnail_list[0]['url'], width=200, use_container_width=False)
+        if video.thumbnail: 
+            st.image(video.thumbnail, width=200, use_container_width=False)
     with col2:
-        title = video_data.get('title', 'Titre non disponible')
-        channel_name = video_data.get('channel', {}).get('name', 'Chaîne inconnue')
-        view_text = video_data.get('viewCount', {}).get('text', 'N/A vues')
-        duration_text = video_data.get('duration', {}).get('text', 'N/A')
-        upload_date = video_data.get('upload_date', '')
-        description = video_data.get('description', '')
+        title = video.title or 'Titre non disponible'
+        channel_name = video.channel or 'Chaîne inconnue'
+        view_text = format_views(video.view_count)
+        duration_text = format_duration(video.duration) if video.duration else 'N/A'
+        upload_date = video.upload_date
+        description = video.description
         
         st.markdown(f"""
         <div class='metadata-card'>
@@ -706,39 +564,178 @@ def display_video_card(video, index):
         
         col_img, col_info, col_button = st.columns([1, 3, 1])
         with col_img:
-            thumbnail_list = video.get('thumbnail', [])
-            if thumbnail_list: 
-                st.image(thumbnail_list[0]['url'], width=120, use_container_width=False)
+            if video.thumbnail: 
+                st.image(video.thumbnail, width=120, use_container_width=False)
         with col_info:
-            title = video.get('title', 'Sans titre')
-            channel_name = video.get('channel', {}).get('name', 'Chaîne inconnue')
-            view_text = video.get('viewCount', {}).get('text', 'N/A vues')
-            duration_text = video.get('duration', {}).get('text', 'N/A')
+            title = video.title or 'Sans titre'
+            channel_name = video.channel or 'Chaîne inconnue'
+            view_text = format_views(video.view_count)
+            duration_text = format_duration(video.duration) if video.duration else 'N/A'
             
             st.markdown(f"**{title}**")
             st.caption(f"👤 {channel_name} | 👁️ {view_text} | ⏱️ {duration_text}")
         with col_button:
-            if st.button("▶️ Sélectionner", key=f"select_{video['id']}_{index}"):
-                st.session_state.selected_video_url = video['link']
-                st.session_state.selected_video_data = video
+            if st.button("▶️ Sélectionner", key=f"select_{video.id}_{index}"):
+                st.session_state.selected_video_url = video.link
+                st.session_state.selected_video_id = video.id
                 st.rerun()
         
         st.markdown("</div>", unsafe_allow_html=True)
         st.markdown("---")
 
+def render_format_panel(url, format_choice):
+    """Panneau de formats : tailles estimées et politique de sélection"""
+    audio_only = FORMAT_LABELS[format_choice] == core.FORMAT_MP3
+    policies = {
+        "Meilleure qualité": POLICY_BEST,
+        "Résolution max": POLICY_MAX_HEIGHT,
+        "Taille max": POLICY_MAX_SIZE,
+        "Manuel": None,
+    }
+    if audio_only:
+        del policies["Résolution max"]
+
+    with st.expander("🎚️ Qualité et formats"):
+        policy_label = st.radio("Politique", list(policies), horizontal=True, key="format_policy")
+        policy = policies[policy_label]
+        # Le contenu d'un expander s'exécute même replié : yt-dlp n'est interrogé
+        # qu'à la demande, puis une seule fois par vidéo sélectionnée
+        if st.session_state.get('formats_url') != url:
+            if policy == POLICY_BEST and not st.button("📋 Afficher les formats", key="load_formats"):
+                st.caption("Sélection par défaut de yt-dlp")
+                return None
+            st.session_state.formats_url = url
+        formats = get_video_formats(url)
+        if not formats:
+            st.caption("Formats indisponibles, sélection automatique par yt-dlp")
+            return None
+
+        rows = [{
+            'ID': f.format_id,
+            'Ext': f.ext,
+            'Résolution': f"{f.height}p" if f.height else "audio",
+            'Codec vidéo': f.vcodec if f.has_video else "",
+            'Codec audio': f.acodec if f.has_audio else "",
+            'Débit (kb/s)': int(f.tbr) if f.tbr else None,
+            'Taille': ("~" if f.size_estimated else "") + format_size(f.filesize),
+        } for f in formats]
+        st.dataframe(rows, use_container_width=True, hide_index=True)
+
+        choice = None
+        if policy == POLICY_BEST:
+            # Sélecteur par défaut de yt-dlp, comme avant
+            st.caption("Sélection par défaut de yt-dlp")
+            return None
+        elif policy == POLICY_MAX_HEIGHT:
+            max_height = st.selectbox("Hauteur max", [2160, 1440, 1080, 720, 480, 360, 240, 144],
+                                      index=3, key="format_max_height")
+            choice = select_format(formats, policy, max_height=max_height)
+        elif policy == POLICY_MAX_SIZE:
+            max_size_mb = st.number_input("Taille max (Mo)", min_value=1, value=50, key="format_max_size")
+            choice = select_format(formats, policy, max_size_mb=max_size_mb, audio_only=audio_only)
+        else:
+            choices = build_choices(formats, audio_only=audio_only)
+            if choices:
+                choice = st.selectbox(
+                    "Format", choices, key="format_manual",
+                    format_func=lambda c: f"{c.label} — {format_size(c.filesize)}"
+                )
+
+        if choice:
+            st.success(f"👉 {choice.label} — taille estimée {format_size(choice.filesize)}")
+            return choice.selector
+        st.warning("Aucun format ne respecte cette contrainte, sélection automatique")
+        return None
+
 def display_download_history():
-    """Affiche l'historique des téléchargements"""
-    if st.session_state.download_history:
-        st.subheader("📜 Historique des téléchargements")
-        for i, entry in enumerate(st.session_state.download_history):
-            col1, col2, col3 = st.columns([3, 1, 1])
-            with col1:
-                st.write(f"📹 {entry['title']}")
-            with col2:
-                st.write(f"🎵 {entry['format']}")
-            with col3:
-                st.write(f"📅 {entry['date']}")
-        st.markdown("---")
+    """Affiche l'historique de la session, filtrable et paginé"""
+    history = get_history_store()
+    job_ids = st.session_state.job_ids
+    if not history.count(job_ids=job_ids):
+        return
+    
+    st.subheader("📜 Historique des téléchargements")
+    col_title, col_format, col_status = st.columns([2, 1, 1])
+    with col_title:
+        title_filter = st.text_input("Titre contient", key="history_title")
+    with col_format:
+        format_filter = st.selectbox("Format", ["Tous", *FORMAT_LABELS], key="history_format")
+    with col_status:
+        status_filter = st.selectbox("Statut", ["Tous", "Réussis", "Échecs", "Annulés"], key="history_status")
+    
+    filters = {
+        'title': title_filter.strip() or None,
+        'format_key': FORMAT_LABELS.get(format_filter),
+        'status': {"Réussis": STATUS_DONE, "Échecs": STATUS_ERROR,
+                   "Annulés": STATUS_CANCELLED}.get(status_filter),
+        'job_ids': job_ids,
+    }
+    # Nouveaux filtres : retour à la première page
+    signature = (filters['title'], filters['format_key'], filters['status'])
+    if st.session_state.history_filters != signature:
+        st.session_state.history_filters = signature
+        st.session_state.history_cursors = []
+    
+    cursors = st.session_state.history_cursors
+    page_size = 10
+    rows = history.page(limit=page_size, before_id=cursors[-1] if cursors else None, **filters)
+    total = history.count(**filters)
+    format_names = {key: label for label, key in FORMAT_LABELS.items()}
+    
+    for entry in rows:
+        col1, col2, col3, col4 = st.columns([3, 1, 1, 1])
+        with col1:
+            status_icon = {STATUS_DONE: "✅", STATUS_CANCELLED: "⛔"}.get(entry['status'], "❌")
+            section_text = f" ✂️ {entry['section']}" if entry['section'] else ""
+            st.write(f"{status_icon} {entry['title'] or 'Inconnu'}{section_text}")
+        with col2:
+            st.write(f"🎵 {format_names.get(entry['format'], entry['format'])}")
+        with col3:
+            st.write(f"📅 {datetime.fromtimestamp(entry['started_at']).strftime('%Y-%m-%d %H:%M:%S')}")
+        with col4:
+            if entry['throughput']:
+                st.write(f"⚡ {format_size(entry['throughput'])}/s")
+            elif entry['total_seconds']:
+                st.write(f"⏱️ {entry['total_seconds']:.1f}s")
+    
+    total_pages = max(1, math.ceil(total / page_size))
+    col_prev, col_info, col_next = st.columns([1, 2, 1])
+    with col_prev:
+        if st.button("⬅️ Plus récents", key="history_prev", disabled=not cursors):
+            cursors.pop()
+            st.rerun()
+    with col_info:
+        st.caption(f"Page {len(cursors) + 1} / {total_pages} — {total} entrées")
+    with col_next:
+        if st.button("Plus anciens ➡️", key="history_next", disabled=len(rows) < page_size or len(cursors) + 1 >= total_pages):
+            cursors.append(rows[-1]['id'])
+            st.rerun()
+    
+    display_throughput_analytics(history)
+    st.markdown("---")
+
+def display_throughput_analytics(history):
+    """Débits p50/p95 par jour sur les 30 derniers jours, toutes sessions confondues"""
+    with st.expander("📈 Analytique des débits (tous les utilisateurs)"):
+        series = history.throughput_percentiles()
+        if not series:
+            st.caption("Pas encore de téléchargement mesuré")
+            return
+        chart_rows = [{
+            'Jour': datetime.fromtimestamp(point['period_start']).strftime('%Y-%m-%d'),
+            'p50 (Mo/s)': point['throughput_p50'] / (1024 * 1024),
+            'p95 (Mo/s)': point['throughput_p95'] / (1024 * 1024),
+        } for point in series]
+        st.line_chart(chart_rows, x='Jour', y=['p50 (Mo/s)', 'p95 (Mo/s)'])
+        
+        latest = series[-1]
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Téléchargements (dernier jour)", latest['count'])
+        col2.metric("Débit p50 / p95", f"{format_size(latest['throughput_p50'])}/s",
+                    f"p95 {format_size(latest['throughput_p95'])}/s", delta_color="off")
+        if latest['postprocess_p50'] is not None:
+            col3.metric("Conversion p50 / p95", f"{latest['postprocess_p50']:.1f}s",
+                        f"p95 {latest['postprocess_p95']:.1f}s", delta_color="off")
 
 # --- APPLICATION PRINCIPALE ---
 
@@ -746,6 +743,8 @@ def display_download_history():
 if not st.session_state.dependencies_checked:
     with st.spinner("Vérification des dépendances..."):
         check_ffmpeg_status()
+        # Amorce le cache yt-dlp une fois par processus, sans bloquer la page
+        start_cache_warmup()
         st.session_state.dependencies_checked = True
 
 # Configuration du thème
@@ -800,6 +799,55 @@ st.sidebar.markdown(f"""
 </div>
 """, unsafe_allow_html=True)
 
+# Cache yt-dlp (JS du lecteur et signatures)
+cache_status = get_cache_status()
+warmup = cache_status['warmup']
+if warmup['running']:
+    status_class, status_text = "status-warning", "🔥 Amorçage en cours..."
+elif cache_status['age'] is None:
+    status_class, status_text = "status-offline", "❄️ Vide"
+elif cache_status['age'] > CACHE_STALE_AFTER:
+    status_class, status_text = "status-warning", f"🕰️ Mis à jour {format_age(cache_status['age'])}"
+else:
+    status_class, status_text = "status-online", f"✅ Mis à jour {format_age(cache_status['age'])}"
+
+warmup_text = ""
+if warmup['last_run']:
+    warmup_result = "réussi" if warmup['ok'] else f"échec ({warmup['error']})"
+    warmup_text = f"Amorçage {format_age(time.time() - warmup['last_run'])} : {warmup_result} en {warmup['duration']:.1f}s"
+
+st.sidebar.markdown(f"""
+<div class='success-box'>
+<span class='status-indicator {status_class}'></span>
+<strong>Cache yt-dlp: {status_text}</strong><br>
+{cache_status['files']} fichiers, {format_size(cache_status['bytes'])}<br>
+{warmup_text}
+</div>
+""", unsafe_allow_html=True)
+
+if not warmup['running'] and st.sidebar.button("🔥 Réamorcer le cache", use_container_width=True):
+    with st.sidebar:
+        with st.spinner("Amorçage du cache yt-dlp..."):
+            warm_up_cache()
+    st.rerun()
+
+# Santé des extracteurs (recherche) : le plus rapide et sain est servi en premier
+extractor_lines = []
+for name, operations in get_extractor_router().status().items():
+    search_health = operations['search']
+    if not search_health['available']:
+        extractor_lines.append(f"{name} ⛔ (réessai dans {search_health['retry_in']:.0f}s)")
+    elif search_health['latency'] is not None:
+        extractor_lines.append(f"{name} ✅ {search_health['latency']:.1f}s")
+    else:
+        extractor_lines.append(f"{name} ⚪")
+st.sidebar.caption("🧭 Extracteurs : " + " | ".join(extractor_lines))
+
+# File partagée entre réplicas
+if get_shared_backend() is not None:
+    job_manager = get_job_manager()
+    st.sidebar.caption(f"🔗 File partagée ({type(job_manager.backend).__name__}) — réplica {job_manager.replica_id}")
+
 # Système Info
 system_info = get_system_info()
 with st.sidebar.expander("💻 Informations Système"):
@@ -839,12 +887,65 @@ if direct_url and validate_youtube_url(direct_url):
             video_data = get_video_info(direct_url)
             if video_data:
                 st.session_state.selected_video_url = direct_url
-                st.session_state.selected_video_data = video_data
+                st.session_state.selected_video_id = video_data.id
                 st.sidebar.success("✅ Vidéo chargée!")
                 st.rerun()
             else:
                 st.sidebar.error("❌ Erreur de chargement")
 
+# Import en masse
+st.sidebar.markdown("---")
+st.sidebar.subheader("📦 Import en masse")
+bulk_text = st.sidebar.text_area("Une URL ou un ID par ligne:", key="bulk_text", height=100)
+bulk_file = st.sidebar.file_uploader("...ou un fichier CSV/TXT", type=["csv", "txt"], key="bulk_file")
+
+if (bulk_text.strip() or bulk_file) and st.sidebar.button("📦 Importer", use_container_width=True):
+    import_text = bulk_text
+    if bulk_file is not None:
+        import_text += "\n" + bulk_file.getvalue().decode('utf-8', errors='replace')
+    
+    downloaded_ids = get_history_store().downloaded_video_ids(job_ids=st.session_state.job_ids)
+    plan = plan_bulk_import(import_text, downloaded_ids=downloaded_ids)
+    st.sidebar.info(
+        f"🔎 {len(plan.to_fetch)} à récupérer | {len(plan.known)} en cache | "
+        f"{len(plan.downloaded)} déjà téléchargées | {plan.duplicates} doublons | "
+        f"{len(plan.invalid)} lignes invalides"
+    )
+    
+    fetched_ids = []
+    if plan.to_fetch:
+        bulk_progress = st.sidebar.progress(0)
+        bulk_status = st.sidebar.empty()
+        
+        def on_bulk_progress(fetched, requested, rate):
+            bulk_progress.progress(fetched / requested)
+            bulk_status.text(f"📦 {fetched}/{requested} — {rate:.1f} vidéos/s")
+        
+        try:
+            fetched_ids, bulk_stats = fetch_bulk(plan.to_fetch, progress=on_bulk_progress)
+            st.session_state.bulk_stats = bulk_stats.to_dict()
+        except CyberStreamError as e:
+            st.sidebar.error(f"❌ {e}")
+        bulk_progress.empty()
+        bulk_status.empty()
+    
+    imported_ids = plan.known + fetched_ids
+    if imported_ids:
+        st.session_state.search_results = imported_ids
+        st.session_state.total_pages = max(1, math.ceil(len(imported_ids) / 3))
+        st.session_state.current_page = 1
+        st.session_state.selected_video_url = None
+        st.rerun()
+    else:
+        st.sidebar.warning("⚠️ Aucune nouvelle vidéo à importer")
+
+if st.session_state.bulk_stats:
+    stats = st.session_state.bulk_stats
+    st.sidebar.caption(
+        f"Dernier import : {stats['fetched']}/{stats['requested']} vidéos en "
+        f"{stats['elapsed']:.1f}s ({stats['items_per_second']:.1f} vidéos/s)"
+    )
+
 # Bouton de recherche
 if st.sidebar.button("🚀 Lancer la recherche", use_container_width=True):
     if search_query.strip():
@@ -874,16 +975,21 @@ if st.session_state.search_results:
     results_per_page = 3
     start_index = (st.session_state.current_page - 1) * results_per_page
     end_index = start_index + results_per_page
-    page_results = st.session_state.search_results[start_index:end_index]
+    page_ids = st.session_state.search_results[start_index:end_index]
+    page_results = get_session_videos(page_ids)
     
     for i, video in enumerate(page_results):
         display_video_card(video, i)
     
     render_pagination()
 
-if st.session_state.selected_video_url and st.session_state.selected_video_data:
+selected_video = next(iter(get_session_videos(
+    [st.session_state.selected_video_id] if st.session_state.selected_video_id else []
+)), None)
+
+if st.session_state.selected_video_url and selected_video:
     st.subheader("🎬 Vidéo Sélectionnée")
-    display_metadata(st.session_state.selected_video_data)
+    display_metadata(selected_video)
     
     video_id = get_video_id(st.session_state.selected_video_url)
     if video_id:
@@ -896,11 +1002,59 @@ if st.session_state.selected_video_url and st.session_state.selected_video_data:
             if is_download_disabled:
                 st.warning("Le téléchargement MP3 est désactivé car FFmpeg est requis.")
             
+            format_selector = render_format_panel(st.session_state.selected_video_url, download_format)
+            
+            section = None
+            with st.expander("✂️ Extrait (optionnel)"):
+                col_start, col_end = st.columns(2)
+                with col_start:
+                    section_start = st.text_input("Début (mm:ss)", key="section_start", placeholder="0:00")
+                with col_end:
+                    section_end = st.text_input("Fin (mm:ss)", key="section_end", placeholder="fin")
+                precise_cuts = st.checkbox(
+                    "Découpe exacte (ré-encodage aux points de coupe)", key="precise_cuts"
+                )
+                try:
+                    section = parse_section(section_start, section_end)
+                except ValueError as e:
+                    st.error(f"❌ {e}")
+                    is_download_disabled = True
+                if section and selected_video.duration and section[0] >= selected_video.duration:
+                    st.error("❌ Le début de l'extrait dépasse la durée de la vidéo")
+                    is_download_disabled = True
+                elif section:
+                    end_text = format_duration(section[1]) if section[1] is not None else "fin"
+                    st.caption(f"Seul l'extrait {format_duration(section[0])} → {end_text} sera téléchargé")
+            
+            if API_URL:
+                stream_params = {'url': st.session_state.selected_video_url,
+                                 'format': FORMAT_LABELS[download_format]}
+                if st.session_state.get('format_policy') == "Résolution max":
+                    stream_params['max_height'] = st.session_state.get('format_max_height')
+                if section:
+                    stream_params['start'] = f"{section[0]:g}"
+                    if section[1] is not None:
+                        stream_params['end'] = f"{section[1]:g}"
+                st.link_button(
+                    "⚡ Flux direct (sans disque)",
+                    f"{API_URL}/stream?{urlencode(stream_params)}",
+                    use_container_width=True,
+                    disabled=is_download_disabled
+                )
+                st.caption("Les octets arrivent au navigateur dès le début du téléchargement.")
+            
+            if st.session_state.download_cancelled:
+                st.session_state.download_cancelled = False
+                st.warning("⛔ Téléchargement annulé, fichiers temporaires supprimés.")
+
             if st.button("⬇️ Télécharger", use_container_width=True, disabled=is_download_disabled):
                 with st.spinner("Téléchargement en cours..."):
                     file_path, file_name, mime_type = download_media(
                         st.session_state.selected_video_url, 
-                        download_format
+                        download_format,
+                        section=section,
+                        precise_cuts=precise_cuts,
+                        format_selector=format_selector
                     )
                     if file_path:
                         st.success(f"✅ {file_name} prêt!")
@@ -916,18 +1070,20 @@ if st.session_state.selected_video_url and st.session_state.selected_video_data:
                             use_container_width=True
                         )
                         
-                        try:
-                            if os.path.exists(file_path):
-                                os.unlink(file_path)
-                            if os.path.exists(os.path.dirname(file_path)):
-                                os.rmdir(os.path.dirname(file_path))
-                        except:
-                            pass
+                        # Les fichiers de la file partagée servent aux autres sessions
+                        if not uses_shared_queue(precise_cuts):
+                            try:
+                                if os.path.exists(file_path):
+                                    os.unlink(file_path)
+                                if os.path.exists(os.path.dirname(file_path)):
+                                    os.rmdir(os.path.dirname(file_path))
+                            except:
+                                pass
         
         with col2:
             if st.button("🗑️ Effacer", use_container_width=True):
                 st.session_state.selected_video_url = None
-                st.session_state.selected_video_data = None
+                st.session_state.selected_video_id = None
                 st.rerun()
 
 elif not st.session_state.search_results:
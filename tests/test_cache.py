@@ -0,0 +1,140 @@
+import threading
+import traceback
+import time
+
+import pytest
+
+from cyberstream.cache import SearchCache
+from cyberstream.core import SearchError
+
+class Interrupted(BaseException):
+    """Équivalent des RerunException/StopException de Streamlit"""
+
+def test_normalized_queries_share_one_search():
+    calls = []
+
+    def fetch(query, limit=15, notify=None):
+        calls.append(query)
+        return [query]
+
+    cache = SearchCache(fetch=fetch)
+    for query in ("Musique", "musique ", "musique!"):
+        assert cache.get(query) == ["musique"]
+    assert calls == ["musique"]
+
+def test_failure_is_cached_briefly():
+    calls = []
+
+    def fetch(query, limit=15, notify=None):
+        calls.append(query)
+        raise SearchError("panne")
+
+    cache = SearchCache(fetch=fetch, failure_ttl=0.2)
+    for _ in range(2):
+        with pytest.raises(SearchError):
+            cache.get("musique")
+    assert len(calls) == 1
+    time.sleep(0.25)
+    with pytest.raises(SearchError):
+        cache.get("musique")
+    assert len(calls) == 2
+
+def test_interrupted_leader_does_not_block_waiters():
+    leader_started = threading.Event()
+    release = threading.Event()
+
+    def fetch(query, limit=15, notify=None):
+        if threading.current_thread().name == "leader":
+            leader_started.set()
+            release.wait(5)
+            raise Interrupted()
+        return ["direct"]
+
+    cache = SearchCache(fetch=fetch, coalesce_wait=5)
+    errors, results = [], []
+
+    def lead():
+        try:
+            cache.get("musique")
+        except Interrupted as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=lead, name="leader")
+    leader.start()
+    assert leader_started.wait(5)
+    waiter = threading.Thread(target=lambda: results.append(cache.get("musique")))
+    waiter.start()
+    time.sleep(0.1)
+    release.set()
+    leader.join(5)
+    waiter.join(5)
+
+    assert len(errors) == 1
+    assert results == [["direct"]]
+    assert not cache._flights
+    # L'interruption n'est pas mise en cache : l'appel suivant relance la recherche
+    assert cache.get("musique") == ["direct"]
+
+def test_stuck_leader_times_out_to_direct_fetch():
+    release = threading.Event()
+
+    def fetch(query, limit=15, notify=None):
+        if threading.current_thread().name == "leader":
+            release.wait(5)
+            return ["leader"]
+        return ["direct"]
+
+    cache = SearchCache(fetch=fetch, coalesce_wait=0.2)
+    leader = threading.Thread(target=cache.get, args=("musique",), name="leader")
+    leader.start()
+    time.sleep(0.05)
+    assert cache.get("musique") == ["direct"]
+    release.set()
+    leader.join(5)
+
+def test_cached_failure_is_raised_as_a_new_instance_per_caller():
+    def fetch(query, limit=15, notify=None):
+        raise SearchError("panne")
+
+    cache = SearchCache(fetch=fetch)
+    raised = []
+    for _ in range(3):
+        with pytest.raises(SearchError, match="panne") as info:
+            cache.get("musique")
+        raised.append(info.value)
+    assert len({id(error) for error in raised}) == 3
+    # La pile d'un appel ne s'accumule pas sur celle des précédents
+    assert len(traceback.extract_tb(raised[2].__traceback__)) <= len(traceback.extract_tb(raised[1].__traceback__))
+
+def test_coalesced_waiters_get_their_own_error():
+    leader_started = threading.Event()
+    release = threading.Event()
+
+    def fetch(query, limit=15, notify=None):
+        leader_started.set()
+        release.wait(5)
+        raise SearchError("panne")
+
+    cache = SearchCache(fetch=fetch, coalesce_wait=5)
+    errors = []
+
+    def call():
+        try:
+            cache.get("musique")
+        except SearchError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call)]
+    threads[0].start()
+    assert leader_started.wait(5)
+    threads += [threading.Thread(target=call) for _ in range(3)]
+    for thread in threads[1:]:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(errors) == 4
+    assert len({id(error) for error in errors}) == 4
+    assert cache.stats()['coalesced'] == 3
@@ -0,0 +1,61 @@
+import time
+
+from cyberstream.formats import (
+    MediaFormat, FormatCache, select_format,
+    POLICY_BEST, POLICY_MAX_HEIGHT, POLICY_MAX_SIZE,
+)
+
+MB = 1024 * 1024
+
+def video(format_id, height, size, tbr):
+    return MediaFormat(format_id, 'mp4', height=height, vcodec='avc1', acodec='none',
+                       tbr=tbr, filesize=size)
+
+FORMATS = [
+    video('137', 1080, 80 * MB, 4000),
+    video('136', 720, 40 * MB, 2000),
+    video('135', 480, 20 * MB, 1000),
+    MediaFormat('18', 'mp4', height=360, vcodec='avc1', acodec='mp4a', tbr=600, filesize=12 * MB),
+    MediaFormat('140', 'm4a', vcodec='none', acodec='mp4a', tbr=128, filesize=4 * MB),
+    MediaFormat('251', 'webm', vcodec='none', acodec='opus', tbr=160, filesize=5 * MB),
+]
+
+def test_best_picks_highest_quality_with_m4a_audio():
+    choice = select_format(FORMATS, POLICY_BEST)
+    assert choice.selector == '137+140'
+    assert choice.filesize == 84 * MB
+
+def test_max_height_keeps_best_under_limit():
+    assert select_format(FORMATS, POLICY_MAX_HEIGHT, max_height=720).selector == '136+140'
+    assert select_format(FORMATS, POLICY_MAX_HEIGHT, max_height=400).selector == '18'
+    assert select_format(FORMATS, POLICY_MAX_HEIGHT, max_height=144) is None
+
+def test_max_size_keeps_best_within_budget():
+    assert select_format(FORMATS, POLICY_MAX_SIZE, max_size_mb=50).selector == '136+140'
+    assert select_format(FORMATS, POLICY_MAX_SIZE, max_size_mb=25).selector == '135+140'
+
+def test_max_size_falls_back_to_smallest_known():
+    assert select_format(FORMATS, POLICY_MAX_SIZE, max_size_mb=1).selector == '18'
+
+def test_max_size_ignores_unknown_sizes():
+    formats = [video('137', 1080, None, 4000), *FORMATS[1:]]
+    assert select_format(formats, POLICY_MAX_SIZE, max_size_mb=500).selector == '136+140'
+
+def test_audio_only_ignores_max_height():
+    choice = select_format(FORMATS, POLICY_MAX_HEIGHT, max_height=144, audio_only=True)
+    assert choice.selector == '251'
+    assert select_format(FORMATS, POLICY_MAX_SIZE, max_size_mb=4.5, audio_only=True).selector == '140'
+
+def test_no_formats_lets_yt_dlp_choose():
+    assert select_format([], POLICY_BEST) is None
+
+def test_format_cache_remembers_failures_briefly():
+    cache = FormatCache(failure_ttl=0.1)
+    assert cache.get('abc') is None
+    cache.put_failure('abc')
+    assert cache.get('abc') == ()
+    time.sleep(0.15)
+    assert cache.get('abc') is None
+    cache.put('abc', FORMATS)
+    cache.put_failure('abc')
+    assert cache.get('abc') == tuple(FORMATS)
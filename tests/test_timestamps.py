@@ -0,0 +1,50 @@
+import math
+
+import pytest
+
+from cyberstream.utils import parse_timestamp, parse_section
+
+@pytest.mark.parametrize("value, expected", [
+    ("90", 90.0),
+    ("1:30", 90.0),
+    ("01:02:03", 3723.0),
+    (" 2.5 ", 2.5),
+    (45, 45.0),
+    (1.5, 1.5),
+])
+def test_valid_timestamps(value, expected):
+    assert parse_timestamp(value) == expected
+
+@pytest.mark.parametrize("value", [None, "", "   "])
+def test_empty_timestamp_is_none(value):
+    assert parse_timestamp(value) is None
+
+@pytest.mark.parametrize("value", [
+    "nan", "inf", "-inf", "1:nan", "infinity",
+    math.nan, math.inf, -math.inf,
+])
+def test_non_finite_timestamps_are_rejected(value):
+    with pytest.raises(ValueError):
+        parse_timestamp(value)
+
+@pytest.mark.parametrize("value", ["-5", "-1:00", -3])
+def test_negative_timestamps_are_rejected(value):
+    with pytest.raises(ValueError):
+        parse_timestamp(value)
+
+@pytest.mark.parametrize("value", ["1:2:3:4", "abc", "1:", "1::2"])
+def test_malformed_timestamps_are_rejected(value):
+    with pytest.raises(ValueError):
+        parse_timestamp(value)
+
+def test_section_bounds():
+    assert parse_section(None, None) is None
+    assert parse_section("", "") is None
+    assert parse_section(None, "1:00") == (0.0, 60.0)
+    # Fin ouverte : jusqu'au bout de la vidéo
+    assert parse_section("30", None) == (30.0, None)
+
+@pytest.mark.parametrize("start, end", [("1:00", "30"), ("10", "10"), ("nan", "10"), ("0", "inf")])
+def test_invalid_sections_are_rejected(start, end):
+    with pytest.raises(ValueError):
+        parse_section(start, end)
@@ -0,0 +1,65 @@
+import pytest
+
+from cyberstream.utils import extract_video_ids, get_video_id, validate_youtube_url
+
+VIDEO_ID = "dQw4w9WgXcQ"
+
+@pytest.mark.parametrize("url", [
+    f"https://www.youtube.com/watch?v={VIDEO_ID}",
+    f"https://youtube.com/watch?feature=share&v={VIDEO_ID}",
+    f"https://m.youtube.com/watch?v={VIDEO_ID}",
+    f"https://music.youtube.com/watch?v={VIDEO_ID}&list=RD",
+    f"https://youtu.be/{VIDEO_ID}?t=42",
+    f"https://www.youtube.com/shorts/{VIDEO_ID}",
+    f"https://www.youtube-nocookie.com/embed/{VIDEO_ID}",
+    f"youtube.com/live/{VIDEO_ID}",
+])
+def test_youtube_urls(url):
+    assert get_video_id(url) == VIDEO_ID
+    assert validate_youtube_url(url)
+
+@pytest.mark.parametrize("url", [
+    f"https://notyoutube.com/watch?v={VIDEO_ID}",
+    f"https://evil.com/youtube.com/watch?v={VIDEO_ID}",
+    f"https://fakeyoutu.be/{VIDEO_ID}",
+    f"https://www.youtube.com/watch?v={VIDEO_ID}x",
+])
+def test_lookalike_urls_are_rejected(url):
+    assert get_video_id(url) is None
+    assert not validate_youtube_url(url)
+
+def test_bare_ids_one_per_line():
+    ids, duplicates, invalid = extract_video_ids(f"{VIDEO_ID}\n9bZkp7q19f0\n{VIDEO_ID}\n")
+    assert ids == [VIDEO_ID, "9bZkp7q19f0"]
+    assert duplicates == 1
+    assert invalid == []
+
+def test_words_are_not_bare_ids():
+    # 11 caractères sans chiffre ni majuscule : des mots, pas des IDs
+    ids, _, invalid = extract_video_ids(f"{VIDEO_ID}\ndescription\nhello_world")
+    assert ids == [VIDEO_ID]
+    assert invalid == ["description", "hello_world"]
+
+def test_csv_header_is_skipped():
+    text = f"title,video_id\nRick,{VIDEO_ID}\nGangnam,9bZkp7q19f0\n"
+    ids, _, invalid = extract_video_ids(text)
+    assert ids == [VIDEO_ID, "9bZkp7q19f0"]
+    assert invalid == []
+
+def test_single_word_header_is_skipped():
+    ids, _, invalid = extract_video_ids(f"videos\n{VIDEO_ID}")
+    assert ids == [VIDEO_ID]
+    assert invalid == []
+
+def test_urls_disable_bare_ids_in_other_columns():
+    # Une liste d'URLs : la colonne « code » n'est pas prise pour un ID
+    text = f"url,code\nhttps://youtu.be/{VIDEO_ID},ABCDEFGHIJ1\nhttps://youtu.be/9bZkp7q19f0,KLMNOPQRST2\n"
+    ids, _, invalid = extract_video_ids(text)
+    assert ids == [VIDEO_ID, "9bZkp7q19f0"]
+    assert invalid == []
+
+def test_lookalike_url_lines_are_invalid():
+    text = f"https://youtu.be/{VIDEO_ID}\nhttps://notyoutube.com/watch?v=9bZkp7q19f0"
+    ids, _, invalid = extract_video_ids(text)
+    assert ids == [VIDEO_ID]
+    assert invalid == ["https://notyoutube.com/watch?v=9bZkp7q19f0"]